@@ -2,6 +2,7 @@
 # Name:           MultipleSelectionScroller
 #
 # File:           MultipleSelectionScroller.py
+#                 (the editor independent navigation logic is in MultipleSelectionScrollerCore.py)
 #
 # Requirements:   Plugin for Sublime Text v.2 and v.3
 #
@@ -28,16 +29,68 @@
 # Value:          next_sel      : Forwards to the next selection
 # Value:          first_sel     : To the first (top) selection
 # Value:          last_sel      : To the last (bottom) selection
+#                                 (previous_sel and next_sel take an optional count arg, a number
+#                                 of selections to move in one go, e.g. "count": 10)
+# Value:          next_page_sel     : Forwards to the first selection below the visible region
+# Value:          previous_page_sel : Backwards to the first selection above the visible region
+# Value:          index         : To the selection given by the index arg, e.g. 5, -1, "50%"
+#                                 (if there is no index arg an input panel asks for it)
+# Value:          drop_and_next     : Remove the selection nearest the middle line and scroll
+#                                     forwards to the next selection
+# Value:          drop_and_previous : Remove the selection nearest the middle line and scroll
+#                                     backwards to the previous selection
+# Value:          back          : To the previously visited selection (repeat to go further back)
+# Value:          next_match    : Forwards to the next match of the pattern arg (a regex)
+# Value:          previous_match: Backwards to the previous match of the pattern arg
+#                                 (the matches are found as needed, not made selections, and the
+#                                 match scrolled to is made the only selection)
 #
 # Arg:            clear_to      : Clear all selections, leaving a single cursor at:
 # ------------------------------------------------------------------------------------------
 # Value:          first_sel     : The first (top) selection
 # Value:          last_sel      : The last (bottom) selection
 # Value:          middle_sel    : The selection on, or nearest to, the visible middle line
+#                                 (of several on the middle line the one nearest its center)
+# Value:          last_visited  : The last selection scrolled to, or as middle_sel if none
 # Value:          visible_area  : The middle line of the visible region (ignores selections)
 #
+# Arg:            clear_to      : Clear some of the selections, keeping only those:
+# ------------------------------------------------------------------------------------------
+# Value:          visible_sels  : In (or partly in) the visible region
+# Value:          above_middle  : On or above the visible middle line
+# Value:          below_middle  : On or below the visible middle line
+#
+# Arg:            regions_key   : Optional, navigate the regions added to the view with this key
+#                                 (e.g. "bookmarks") instead of the selections. Can be used with
+#                                 the scroll_to ops, except drop_and_next, drop_and_previous,
+#                                 next_match, and previous_match, and the clear_to first_sel,
+#                                 last_sel, middle_sel, last_visited, and visible_area ops.
+#
+# Arg:            order         : Optional, the order the scroll_to next_sel, previous_sel,
+#                                 first_sel, last_sel, index, and back ops navigate in:
+# ------------------------------------------------------------------------------------------
+# Value:          document      : Document order, top to bottom (default)
+# Value:          column        : By column, then by row
+# Value:          length        : Longest selection first
+# Value:          text          : Lexical order of the selected text
+# Value:          reverse       : Reverse document order, bottom to top
+#                                 (other than document order the viewport position is ignored,
+#                                 next_sel steps on from the last selection scrolled to)
+#
+#
+# ST Command:     multiple_selection_scroller_outline
+#
+# Description:    Opens a quick panel listing every selection as "row: line preview", highlighting
+#                 an entry previews its selection, choosing an entry centers its selection.
+#
 #
-# Settings File:  There are two settings which can optionally be set in the
+# ST Command:     multiple_selection_scroller_stats
+#
+# Description:    Prints the aggregates of the recently recorded multiple_selection_scroller
+#                 invocations to the console (see the instrument setting below).
+#
+#
+# Settings File:  There are eight settings which can optionally be set in the
 #                 Preferences.sublime-settings settings file.
 # ------------------------------------------------------------------------------------------
 # Setting:        MultipleSelectionScroller.scroll_cycling
@@ -48,340 +101,2252 @@
 # Value:          true          : Do not display status messages
 # Value:          false         : Display status messages (default)
 #
+# Setting:        MultipleSelectionScroller.coalesce_window
+# Value:          0             : Do not coalesce key repeats (default)
+# Value:          N             : Coalesce next_sel/previous_sel requests arriving within N ms of
+#                                 each other, scrolling once when the key repeats stop
+#
+# Setting:        MultipleSelectionScroller.coalesce_immediate_first
+# Value:          true          : Scroll immediately on the first request of a burst (default)
+# Value:          false         : Also defer the first request of a burst
+#
+# Setting:        MultipleSelectionScroller.only_scroll_when_offscreen
+# Value:          true          : Only scroll to selections outside the visible region, outlining
+#                                 the current selection with a marker instead if it is visible
+# Value:          false         : Always center the selection scrolled to (default)
+#
+# Setting:        MultipleSelectionScroller.instrument
+# Value:          true          : Record the timings and API calls of each command invocation
+# Value:          false         : Do not record invocations (default)
+#
+# Setting:        MultipleSelectionScroller.profile
+# Value:          false         : Do not profile invocations (default)
+# Value:          "invocation"  : Write a cProfile .pstats file for each invocation (or true)
+# Value:          "session"     : Write one .pstats file accumulating every invocation
+#
+# Setting:        MultipleSelectionScroller.profile_dir
+# Value:          "path"        : The directory to write the .pstats files to (default a
+#                                 "MultipleSelectionScroller" directory in the temp directory)
+#
 
 
+import bisect
+import collections
+import os
+import tempfile
+import time
 import sublime
 import sublime_plugin
 
+# The navigation core is a module of this package in Sublime Text v.3, a top level module in v.2
+# (and when the plugin is run outside of Sublime Text, e.g. by the benchmarks).
+try:
+    from .MultipleSelectionScrollerCore import NavigationCore, Viewport
+except (ValueError, SystemError, ImportError):
+    from MultipleSelectionScrollerCore import NavigationCore, Viewport
 
-class MultipleSelectionScrollerCommand(sublime_plugin.TextCommand):
+# cProfile is only needed by the optional profile setting, it is missing from some embedded Python
+# builds.
+try:
+    import cProfile
+except ImportError:
+    cProfile = None
+
+
+class ScrollerSettings(object):
+    """
+    The ScrollerSettings class holds the plugin's settings for a view, resolved and type checked
+    once when first needed rather than on every keystroke. They are cached per view, keyed by
+    view.id(), and refreshed only when the view's settings change (via settings().add_on_change).
+
+    The settings are read from view.settings(), which Sublime Text merges from the user's
+    Preferences.sublime-settings file, any syntax specific settings file, and the "settings" of
+    the project file, so per-syntax and per-project overrides are merged when the settings are
+    loaded, not per command.
     """
-    The MultipleSelectionScrollerCommand class is a Sublime Text plugin which provides commands to
-    allow scrolling forwards and backwards through the current selections, by moving the visible
-    region so that the next/previous selection is centered on the middle line. Cycling from the last
-    selection up to the first and visa-versa is automatic. Commands to scroll straight to the first
-    and to the last selection complete its scrolling functionality.
 
-    The plugin also provides commands to clear the selections whilst leaving a single cursor at the
-    first selection, at the last selection, or at the selection on, or nearest to, the middle line,
-    and moving the visible region so that the single cursor is centered on the middle line. It also
-    has a command to clear the selections whilst leaving a single cursor at the end of the middle
-    line of the visible region (this ignores selections and does not move the visible region).
+    # Holds the cached ScrollerSettings objects - keyed by view.id().
+    cache = {}
 
-    User feedback is given in the form of status messages, informing the user which selection has
-    just been placed on the middle line if scrolling (e.g. "scroll at selection: 5 of 11"), or at
-    which selection the cursor has been left if clearing (e.g. "cleared at selection: 5 of 11").
+    # Holds the tag used to register (and clear) the on change callbacks.
+    ON_CHANGE_TAG                   = "MultipleSelectionScroller"
 
-    The plugin has settings to disable user feedback status messages and scroll cycling.
 
-    There is a known design limitation of this plugin. To move selections to the middle line the
-    plugin uses the Sublime View class method show_at_center(). There are some circumstances when
-    that method will not move the visible region to center a selection on the middle line. Any
-    selections above the middle line on the first page of the buffer can not be moved to the middle
-    line, Sublime Text has no 'scroll_above_beginning' setting. If the 'scroll_past_end' setting is
-    set to true, which it is by default, then the first selection below the middle line on the last
-    page of the buffer can be moved to the middle line, but any subsequent selections can not be. In
-    both cases any remaining selections either above or below the middle line will be in the visible
-    region on the screen and so easy to spot. Note that this limitation does not interfere with
-    scroll cycling which continues to work correctly. [In real-world usage I have not found this
-    design limitation inconvenient when it occurs, which is rarely.]
-    """
+    def __init__(self, view_settings):
+        """
+        __init__() loads the settings.
+        """
 
-    # Definitions of the various class constants:
+        self.load(view_settings)
 
-    # For: control mode - assigned to the control_mode instance variable.
+    # End of def __init__()
 
-    SCROLL_TO                  = 100
-    CLEAR_TO                   = 110
 
-    # For: scrolling to selections - assigned to the scroll_to instance variable.
+    def load(self, view_settings):
+        """
+        load() sets the attributes from the view's settings, using the defaults for any settings
+        which are not set or which are not correctly set.
+        """
 
-    SCROLL_TO_PREVIOUS_SEL     = 120
-    SCROLL_TO_NEXT_SEL         = 130
-    SCROLL_TO_FIRST_SEL        = 140
-    SCROLL_TO_LAST_SEL         = 150
+        get_bool = ScrollerSettings.get_bool
+        get_int = ScrollerSettings.get_int
+        prefix = "MultipleSelectionScroller."
 
-    # For: cursor position after clearing selections - assigned to the clear_to instance variable.
+        # Holds whether to perform scroll cycling (default true).
+        self.scroll_cycling = get_bool(view_settings, prefix + "scroll_cycling", True)
 
-    CLEAR_TO_FIRST_SEL         = 160
-    CLEAR_TO_LAST_SEL          = 170
-    CLEAR_TO_MIDDLE_SEL        = 180
-    CLEAR_TO_VISIBLE_AREA      = 190
+        # Holds whether to not display user feedback status messages (default false).
+        self.quiet = get_bool(view_settings, prefix + "quiet", False)
 
-    # For: scroll cycling - assigned to the scroll_cycling instance variable.
+        # Holds whether to record the command invocations (default false).
+        self.instrument = get_bool(view_settings, prefix + "instrument", False)
 
-    SCROLL_CYCLING_ON          = 200
-    SCROLL_CYCLING_OFF         = 210
+        # Holds the key repeat coalescing window in milliseconds (default 0, coalescing is off).
+        self.coalesce_window = get_int(view_settings, prefix + "coalesce_window", 0)
 
-    # For: user feedback status messages - assigned to the user_feedback instance variable.
+        # Holds whether the first scroll of a burst of key repeats is immediate (default true).
+        self.coalesce_immediate_first = get_bool(view_settings,
+                                                 prefix + "coalesce_immediate_first", True)
 
-    FEEDBACK_VERBOSE           = 220
-    FEEDBACK_QUIET             = 230
+        # Holds how to profile the command invocations, "invocation" (true is the same), "session",
+        # or None (default false, no profiling).
+        profile = view_settings.get(prefix + "profile", False)
 
-    # For: Operational status - values are checked for in operational_status().
+        if profile is True:
+            profile = "invocation"
 
-    MIN_NUM_SELECTIONS         = 1
-    MIN_NUM_VISIBLE_LINES      = 3
+        if str(profile).lower() in ("invocation", "session"):
+            self.profile = str(profile).lower()
+        else:
+            self.profile = None
 
+        # Holds whether to scroll only to selections outside the visible region, marking the current
+        # selection instead of centering it if it is already visible (default false).
+        self.only_scroll_when_offscreen = get_bool(view_settings,
+                                                   prefix + "only_scroll_when_offscreen", False)
 
-    def run(self, edit, **kwargs):
+        # Holds the directory which the profiles are written to (default a directory in the system's
+        # temporary directory).
+        profile_dir = view_settings.get(prefix + "profile_dir", None)
+
+        if profile_dir:
+            self.profile_dir = os.path.expanduser(profile_dir)
+        else:
+            self.profile_dir = os.path.join(tempfile.gettempdir(), "MultipleSelectionScroller")
+
+        # Holds Sublime Text's own 'scroll_past_end' setting (default true).
+        self.scroll_past_end = bool(view_settings.get("scroll_past_end", True))
+
+    # End of def load()
+
+
+    @staticmethod
+    def get_bool(view_settings, setting_name, default):
         """
-        run() is called when the command is run - it controls the plugin's flow of execution.
+        get_bool() returns the value of a boolean setting, or the default if it is not set or is
+        not a boolean.
         """
 
-        # Define the 7 instance variables (no other instance variables are used).
+        setting_val = view_settings.get(setting_name, None)
 
-        # Holds the control mode - set by either: set_scroll_to() or set_clear_to()
-        self.control_mode = None
+        if isinstance(setting_val, bool):
+            return setting_val
 
-        # Holds which scroll operation to perform (if any) - set by: set_scroll_to()
-        self.scroll_to = None
+        return default
 
-        # Holds which clear operation to perform (if any) - set by: set_clear_to()
-        self.clear_to = None
+    # End of def get_bool()
 
-        # Holds whether to perform scroll cycling - set by: set_scroll_cycling()
-        self.scroll_cycling = None
 
-        # Holds whether to display user feedback status messages - set by: set_user_feedback()
-        self.user_feedback = None
+    @staticmethod
+    def get_int(view_settings, setting_name, default):
+        """
+        get_int() returns the value of a whole number setting of 0 or more, or the default if it is
+        not set or is not such a number.
+        """
 
-        # Holds the current selections.
-        self.sels = self.view.sel()
+        setting_val = view_settings.get(setting_name, None)
 
-        # Holds the length of the current selections.
-        self.sels_len = len(self.sels)
+        # A bool is an int in Python, but is clearly not a number setting.
+        if isinstance(setting_val, bool) or not isinstance(setting_val, (int, float)):
+            return default
 
-        # Handle command args and settings, and check them.
+        if setting_val < 0:
+            return default
 
-        # Set the scroll_to instance variable if the command was called using the scroll_to arg,
-        # if so then it will also set the control_mode instance variable.
-        self.set_scroll_to(**kwargs)
+        return int(setting_val)
 
-        # Set the clear_to instance variable if the command was called using the clear_to arg,
-        # if so then it will also set the control_mode instance variable.
-        self.set_clear_to(**kwargs)
+    # End of def get_int()
 
-        # Set the scroll_cycling instance variable. Either according to the value in the user's
-        # settings file or to the default.
-        self.set_scroll_cycling()
 
-        # Set the user_feedback instance variable. Either according to the value in the user's
-        # settings file or to the default.
-        self.set_user_feedback()
+    @classmethod
+    def get(cls, view):
+        """
+        get() returns the cached ScrollerSettings of the view, loading them (and registering the on
+        change callback which refreshes them) if they are not cached.
+        """
 
-        # Check to make sure that control_mode has been set and that there are both selections and
-        # visible lines.
-        if not self.operational_status():
-            return
+        view_id = view.id()
+        scroller_settings = cls.cache.get(view_id)
 
-        # All present and correct - proceed to...
+        if scroller_settings is None:
 
-        # Perform the required scrolling operation.
-        if self.control_mode == MultipleSelectionScrollerCommand.SCROLL_TO:
-            self.control_scrolling()
+            view_settings = view.settings()
+            scroller_settings = ScrollerSettings(view_settings)
+            cls.cache[view_id] = scroller_settings
 
-        # Perform the required clearing operation.
-        elif self.control_mode == MultipleSelectionScrollerCommand.CLEAR_TO:
-            self.control_clearing()
+            # The callback outlives the command, it must not hold an InstrumentedView.
+            plain_view = InstrumentedView.unwrap(view)
+            view_settings.add_on_change(ScrollerSettings.ON_CHANGE_TAG,
+                                        lambda: ScrollerSettings.refresh(plain_view,
+                                                                         scroller_settings))
 
-    # End of def run()
+        return scroller_settings
 
+    # End of def get()
 
-    def operational_status(self):
+
+    @staticmethod
+    def refresh(view, scroller_settings):
         """
-        operational_status() checks that everything is in place to proceed with the selection
-        scrolling or clearing. It displays a status warning message and returns false if there's a
-        problem, otherwise it returns true. It checks that control_mode has been set, and that the
-        number of selections and the number of visible lines are greater than the required minimum.
+        refresh() reloads the view's settings after they have changed, erasing the view's selection
+        marker if the only_scroll_when_offscreen setting is now off.
         """
 
-        # Return false if control_mode has not been set, invalid command args were used.
-        # In this case also output msg to the console - to aid user investigation.
+        scroller_settings.load(view.settings())
 
-        if self.control_mode is None:
-            msg = "multiple_selection_scroller: invalid or missing command args"
-            print(msg)
-            sublime.status_message(msg)
-            return False
+        if not scroller_settings.only_scroll_when_offscreen:
+            SelectionMarker.erase(view)
 
-        # Return false if there are no selections, clearly there is nothing for this plugin to do.
+    # End of def refresh()
 
-        if self.sels_len < MultipleSelectionScrollerCommand.MIN_NUM_SELECTIONS:
-            msg = "multiple_selection_scroller: there are no selections"
-            sublime.status_message(msg)
-            return False
 
-        # Return false if the number of visible lines is fewer than the minimum.
-        # Note: There are design reasons for this check (calculating the middle line).
-        # This check also prevents the plugin from running in a panel or the command palette.
+    @classmethod
+    def discard(cls, view):
+        """
+        discard() discards the cached ScrollerSettings of the view (if any).
+        """
 
-        visible_region = self.view.visible_region()
-        visible_lines_len = len(self.view.lines(visible_region))
+        if cls.cache.pop(view.id(), None) is not None:
+            view.settings().clear_on_change(ScrollerSettings.ON_CHANGE_TAG)
 
-        if visible_lines_len < MultipleSelectionScrollerCommand.MIN_NUM_VISIBLE_LINES:
-            msg = "multiple_selection_scroller: too few visible lines"
-            sublime.status_message(msg)
-            return False
+    # End of def discard()
 
-        # All OK.
-        return True
+# End of class ScrollerSettings()
 
-    # End of def operational_status()
 
+class SelectionIndex(object):
+    """
+    The SelectionIndex class holds an ordered snapshot of a view's selections, the lists of the
+    selection begin and end offsets and a line table which memoises the rows looked up. Snapshots
+    are cached per view, keyed by view.id(), so that repeated scroll commands on an unchanged set of
+    selections do not rescan them.
+
+    A cached snapshot is used only if the view's change_count() and a cheap selection signature
+    (the number of selections plus the first and last regions) are unchanged since it was taken.
+    The MultipleSelectionScrollerListener class discards the snapshot whenever the selections are
+    modified, which catches changes that the signature can not see (e.g. a middle selection moved).
+    """
+
+    # Holds the cached SelectionIndex objects - keyed by view.id().
+    cache = {}
 
-    def set_scroll_to(self, **kwargs):
+
+    def __init__(self, view, sels, sels_len, signature, sel_offsets=None):
         """
-        set_scroll_to() sets the scroll_to instance variable according to the value held by
-        "scroll_to" in the kwargs dictionary and sets the control_mode instance variable.
+        __init__() takes the snapshot of the selections, noting the view's change count and the
+        selection signature that the snapshot is valid for. If the lists of the selection begin and
+        end offsets have already been made (by the SelectionIndexBuilder class) they are passed in
+        sel_offsets and the selections are not accessed.
         """
 
-        # Set the scroll_to arg name.
-        scroll_to_arg_name = "scroll_to"
+        self.change_count = view.change_count()
+        self.signature = signature
 
-        # If available get the command's scroll_to arg from the kwargs dictionary.
-        if scroll_to_arg_name in kwargs:
-            scroll_to_arg_val = kwargs.get(scroll_to_arg_name)
+        # Sublime Text keeps the selections sorted and merges any that overlap, so both the begin
+        # and the end offsets are in ascending order and can be binary searched. Each access of
+        # sels[i] is a call into the plugin host, the snapshot makes exactly one pass.
+
+        if sel_offsets is not None:
+            self.sel_begins, self.sel_ends = sel_offsets
 
-        # The scroll_to arg is not in the dictionary.
         else:
-            return
+            self.sel_begins = []
+            self.sel_ends = []
 
-        # Convert to a string in case some other type was used in error and to lowercase.
-        scroll_to_arg_val = str(scroll_to_arg_val)
-        scroll_to_arg_val = scroll_to_arg_val.lower()
+            for sel in sels:
+                self.sel_begins.append(sel.begin())
+                self.sel_ends.append(sel.end())
 
-        # Set the scroll_to instance variable.
+        # Holds the view's line table, which memoises the rows looked up, and the NavigationCore
+        # which makes the navigation decisions from the offsets (sharing the lists).
+        self.line_table = ViewLineTable(view)
+        self.core = NavigationCore(self.sel_begins, self.sel_ends, self.line_table)
 
-        if scroll_to_arg_val == "next_sel":
-            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_SEL
+        # Holds the view's navigation cursor, the selections visited while this snapshot is valid.
+        self.nav_cursor = NavigationCursor()
 
-        elif scroll_to_arg_val == "previous_sel":
-            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_SEL
+        # Holds the permutations of the selection indexes for the navigation orders used so far,
+        # and their inverses - keyed by order, see get_order().
+        self.orders = {}
 
-        elif scroll_to_arg_val == "first_sel":
-            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_FIRST_SEL
+        # Holds whether the selections have been modified by the plugin itself, with the snapshot
+        # updated to match, so that the listener keeps the snapshot on the notification of the
+        # modification - set by: drop_selection(), cleared by: selection_modified().
+        self.own_modification = False
 
-        elif scroll_to_arg_val == "last_sel":
-            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_LAST_SEL
+    # End of def __init__()
 
-        # "scroll_to" is set to an invalid value.
-        else:
-            return
 
-        # All OK - Set the control_mode instance variable.
-        self.control_mode = MultipleSelectionScrollerCommand.SCROLL_TO
+    @staticmethod
+    def get_signature(sels, sels_len):
+        """
+        get_signature() returns the cheap signature of the selections; the number of selections and
+        the first and last regions.
+        """
 
-    # End of def set_scroll_to()
+        if sels_len == 0:
+            return (0,)
 
+        first_sel = sels[0]
+        last_sel = sels[sels_len - 1]
 
-    def set_clear_to(self, **kwargs):
+        return (sels_len, first_sel.a, first_sel.b, last_sel.a, last_sel.b)
+
+    # End of def get_signature()
+
+
+    @classmethod
+    def get(cls, view, sels, sels_len):
         """
-        set_clear_to() sets the clear_to instance variable according to the value held by
-        "clear_to" in the kwargs dictionary and sets the control_mode instance variable.
+        get() returns the cached SelectionIndex of the view if it is still valid, otherwise a new
+        snapshot is taken, cached, and returned.
         """
 
-        # Set the clear_to arg name.
-        clear_to_arg_name = "clear_to"
+        signature = SelectionIndex.get_signature(sels, sels_len)
+        selection_index = SelectionIndex.get_cached(view, signature)
 
-        # If available get the command's clear_to arg from the kwargs dictionary.
-        if clear_to_arg_name in kwargs:
-            clear_to_arg_val = kwargs.get(clear_to_arg_name)
+        if selection_index is not None:
+            return selection_index
 
-        # The clear_to arg is not in the dictionary.
-        else:
-            return
+        selection_index = SelectionIndex(view, sels, sels_len, signature)
+        cls.cache[view.id()] = selection_index
 
-        # Convert to a string in case some other type was used in error and to lowercase.
-        clear_to_arg_val = str(clear_to_arg_val)
-        clear_to_arg_val = clear_to_arg_val.lower()
+        return selection_index
 
-        # Set the clear_to instance variable.
+    # End of def get()
 
-        if clear_to_arg_val == "first_sel":
-            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_FIRST_SEL
 
-        elif clear_to_arg_val == "last_sel":
-            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_LAST_SEL
+    @classmethod
+    def get_cached(cls, view, signature):
+        """
+        get_cached() returns the cached SelectionIndex of the view if it is still valid for the
+        selections with the given signature, otherwise None (no snapshot is taken).
+        """
 
-        elif clear_to_arg_val == "middle_sel":
-            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_MIDDLE_SEL
+        selection_index = cls.cache.get(view.id())
 
-        elif clear_to_arg_val == "visible_area":
-            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_AREA
+        if (selection_index is not None and selection_index.signature == signature and
+                selection_index.change_count == view.change_count()):
+            return selection_index
 
-        # "clear_to" is set to an invalid value.
-        else:
-            return
+        return None
 
-        # All OK - Set the control_mode instance variable.
-        self.control_mode = MultipleSelectionScrollerCommand.CLEAR_TO
+    # End of def get_cached()
 
-    # End of def set_clear_to()
 
+    @classmethod
+    def invalidate(cls, view_id):
+        """
+        invalidate() discards the cached SelectionIndex of the view (if any).
+        """
+
+        cls.cache.pop(view_id, None)
 
-    def set_scroll_cycling(self):
+    # End of def invalidate()
+
+
+    @classmethod
+    def selection_modified(cls, view):
         """
-        set_scroll_cycling() sets the scroll_cycling instance variable according to the value of the
-        "MultipleSelectionScroller.scroll_cycling" setting in the user's settings file, or to the
-        default.
+        selection_modified() discards the cached SelectionIndex of the view when its selections have
+        been modified, unless the modification was made (and accounted for) by the plugin itself.
+        Only the first notification after the plugin's modification can be for it, and only if the
+        selections have the signature the snapshot expects, any other modification discards the
+        snapshot as usual.
         """
 
-        # Set scroll_cycling to the default.
-        self.scroll_cycling = MultipleSelectionScrollerCommand.SCROLL_CYCLING_ON
+        view_id = view.id()
+        selection_index = cls.cache.get(view_id)
 
-        # Set the name of the scroll cycling setting.
-        scroll_cycling_setting_name = "MultipleSelectionScroller.scroll_cycling"
+        if selection_index is not None and selection_index.own_modification:
 
-        # Get the user's scroll cycling setting, if not in settings then set to None.
-        scroll_cycling_setting_val = self.view.settings().get(scroll_cycling_setting_name, None)
+            selection_index.own_modification = False
 
-        # If correctly used in the settings then scroll_cycling_setting_val will be boolean.
+            sels = view.sel()
+            if SelectionIndex.get_signature(sels, len(sels)) == selection_index.signature:
+                return
 
-        if isinstance(scroll_cycling_setting_val, bool):
+        cls.cache.pop(view_id, None)
 
-            if scroll_cycling_setting_val:
-                self.scroll_cycling = MultipleSelectionScrollerCommand.SCROLL_CYCLING_ON
-            else:
-                self.scroll_cycling = MultipleSelectionScrollerCommand.SCROLL_CYCLING_OFF
+    # End of def selection_modified()
 
-    # End of def set_scroll_cycling()
 
+    def drop_selection(self, view, sels, sel_index):
+        """
+        drop_selection() removes the selection specified by sel_index from the view's selections and
+        updates the snapshot to match, rather than discarding it and rescanning every selection. It
+        returns true if the snapshot was updated, or false if the selections did not change as
+        expected (the snapshot is then discarded). There must be at least two selections.
+
+        Finding the region takes a binary search of the selection set, but removing it from the
+        snapshot's offset lists moves the offsets after it, which is O(n). That is
+        a memory move, well under a millisecond per 100k selections, unlike rescanning them.
+        """
 
-    def set_user_feedback(self):
+        sels_len = len(self.sel_begins)
+
+        # Note the signature the selections will have without the selection, by which the listener
+        # recognises the notification of this modification (which may be sent during subtract(), or
+        # when the command has returned).
+
+        first_sel = sels[1 if sel_index == 0 else 0]
+        last_sel = sels[sels_len - 2 if sel_index == sels_len - 1 else sels_len - 1]
+
+        self.signature = (sels_len - 1, first_sel.a, first_sel.b, last_sel.a, last_sel.b)
+        self.own_modification = True
+
+        sels.subtract(sels[sel_index])
+
+        new_sels_len = len(sels)
+
+        if new_sels_len != sels_len - 1 or \
+           SelectionIndex.get_signature(sels, new_sels_len) != self.signature:
+            self.own_modification = False
+            SelectionIndex.invalidate(view.id())
+            return False
+
+        self.core.drop_selection(sel_index)
+        self.orders = {}
+
+        self.nav_cursor.drop_selection(sel_index)
+
+        return True
+
+    # End of def drop_selection()
+
+
+    def get_order(self, view, order):
         """
-        set_user_feedback() sets the user_feedback instance variable according to the value of the
-        "MultipleSelectionScroller.quiet" setting in the user's settings file, or to the default.
+        get_order() returns the permutation of the selection indexes which lists the selections in
+        the navigation order (one of the MultipleSelectionScrollerCommand ORDER_ constants, other
+        than ORDER_DOCUMENT), and its inverse, the rank of each selection in the order. They are
+        computed when first needed and cached with the snapshot, so stepping through the selections
+        in the order is an index lookup, the selections are not sorted again on each key press.
         """
 
-        # Set user_feedback to the default.
-        self.user_feedback = MultipleSelectionScrollerCommand.FEEDBACK_VERBOSE
+        if order in self.orders:
+            return self.orders[order]
+
+        sel_begins = self.sel_begins
+        sel_ends = self.sel_ends
+        sels_len = len(sel_begins)
 
-        # Set the name of the quiet setting.
-        quiet_setting_name = "MultipleSelectionScroller.quiet"
+        # Python's sort is stable, selections with the same sort key stay in document order. So
+        # sorting by column alone orders the selections by column, then by row.
 
-        # Get the user's quiet setting, if not in settings then set to None.
-        quiet_setting_val = self.view.settings().get(quiet_setting_name, None)
+        if order == MultipleSelectionScrollerCommand.ORDER_REVERSE:
+            permutation = list(range(sels_len - 1, -1, -1))
 
-        # If correctly used in the settings then quiet_setting_val will be boolean.
+        else:
+            if order == MultipleSelectionScrollerCommand.ORDER_COLUMN:
+                sort_keys = [view.rowcol(sel_begin)[1] for sel_begin in sel_begins]
 
-        if isinstance(quiet_setting_val, bool):
+            # Longest first, the negated length sorts in ascending order.
+            elif order == MultipleSelectionScrollerCommand.ORDER_LENGTH:
+                sort_keys = [sel_begin - sel_end
+                             for sel_begin, sel_end in zip(sel_begins, sel_ends)]
 
-            if quiet_setting_val:
-                self.user_feedback = MultipleSelectionScrollerCommand.FEEDBACK_QUIET
             else:
-                self.user_feedback = MultipleSelectionScrollerCommand.FEEDBACK_VERBOSE
+                sort_keys = [view.substr(sublime.Region(sel_begin, sel_end))
+                             for sel_begin, sel_end in zip(sel_begins, sel_ends)]
 
-    # End of def set_user_feedback()
+            permutation = sorted(range(sels_len), key=sort_keys.__getitem__)
 
+        ranks = [0] * sels_len
 
-    def control_scrolling(self):
-        """
-        control_scrolling() controls scrolling by calling the appropriate method depending on what
-        value the scroll_to instance variable has been set to.
+        for rank, sel_index in enumerate(permutation):
+            ranks[sel_index] = rank
 
-        This method also provides detailed notes about how this plugin handles the scrolling.
-        """
+        self.orders[order] = (permutation, ranks)
+
+        return self.orders[order]
+
+    # End of def get_order()
+
+
+# End of class SelectionIndex()
+
+
+class RegionSetIndex(object):
+    """
+    The RegionSetIndex class caches, per view and region key, a SelectionIndex of the regions
+    returned by view.get_regions(key) (e.g. bookmarks, lint marks, or search hits), which the
+    regions_key arg navigates instead of the selections. Each view.get_regions() call copies the
+    whole region set, so the index is only refreshed when the key is re-added, not per command.
+
+    Sublime Text has no event for view.add_regions(), so a key counts as re-added when the text has
+    changed (the view's change_count(), the regions move with the text), when the regions are added
+    through RegionSetIndex.add_regions(), or when one of the commands in REGION_COMMANDS, which
+    re-add a known key, has been run.
+    """
+
+    # Holds the cached SelectionIndex objects - keyed by (view.id(), regions key).
+    cache = {}
+
+    # Holds the built-in commands which re-add a region key, and the key they re-add.
+    REGION_COMMANDS                 = {"toggle_bookmark": "bookmarks",
+                                       "clear_bookmarks": "bookmarks"}
+
+
+    @classmethod
+    def get(cls, view, regions_key):
+        """
+        get() returns the cached SelectionIndex of the regions of the key if it is still valid,
+        otherwise the regions are read, indexed, cached, and the index returned.
+        """
+
+        cache_key = (view.id(), regions_key)
+
+        selection_index = cls.cache.get(cache_key)
+
+        if selection_index is not None and selection_index.change_count == view.change_count():
+            return selection_index
+
+        # Unlike the selections, regions added by other plugins may be unsorted or overlap. They
+        # are sorted by their begin offsets, the navigation assumes they do not overlap.
+
+        regions = view.get_regions(regions_key)
+        regions_len = len(regions)
+
+        sel_offsets = sorted((region.begin(), region.end()) for region in regions)
+        sel_begins = [sel_begin for sel_begin, sel_end in sel_offsets]
+        sel_ends = [sel_end for sel_begin, sel_end in sel_offsets]
+
+        signature = SelectionIndex.get_signature(regions, regions_len)
+
+        selection_index = SelectionIndex(view, regions, regions_len, signature,
+                                         (sel_begins, sel_ends))
+        cls.cache[cache_key] = selection_index
+
+        return selection_index
+
+    # End of def get()
+
+
+    @classmethod
+    def add_regions(cls, view, regions_key, regions, *args, **kwargs):
+        """
+        add_regions() adds the regions to the view with view.add_regions(), taking the same args,
+        and discards the cached index of the key. Other plugins can use it to (re-)add a region set
+        which is navigated with the regions_key arg.
+        """
+
+        view.add_regions(regions_key, regions, *args, **kwargs)
+        cls.invalidate(view.id(), regions_key)
+
+    # End of def add_regions()
+
+
+    @classmethod
+    def invalidate(cls, view_id, regions_key=None):
+        """
+        invalidate() discards the cached index of the regions key of the view, or of all its keys
+        if regions_key is None.
+        """
+
+        if regions_key is not None:
+            cls.cache.pop((view_id, regions_key), None)
+            return
+
+        for cache_key in list(cls.cache.keys()):
+            if cache_key[0] == view_id:
+                del cls.cache[cache_key]
+
+    # End of def invalidate()
+
+# End of class RegionSetIndex()
+
+
+class ViewLineTable(object):
+    """
+    The ViewLineTable class is the line start table of a view, as used by the NavigationCore class
+    (see MultipleSelectionScrollerCore.LineTable). Rather than making a table of every line, which
+    is costly for big buffers, each lookup is a call into the plugin host and the rows looked up
+    are memoised. It is only valid while the buffer is unchanged, each SelectionIndex holds one.
+
+    The line table is cached, so it holds the unwrapped view. An instrumented command lends it its
+    InstrumentedView while it runs, see set_selection_offsets() and run_instrumented(), so that
+    the lookups are counted against that command alone.
+    """
+
+    def __init__(self, view):
+        """
+        __init__() sets up the (empty) memo of the rows of text points.
+        """
+
+        self.view = InstrumentedView.unwrap(view)
+
+        # Holds the rows of the text points which have been looked up - keyed by text point.
+        self.rows = {}
+
+    # End of def __init__()
+
+
+    def get_row(self, point):
+        """
+        get_row() returns the row of the line that the text point is on.
+        """
+
+        if point not in self.rows:
+            row_index = 0
+            self.rows[point] = self.view.rowcol(point)[row_index]
+
+        return self.rows[point]
+
+    # End of def get_row()
+
+
+    def get_line(self, row):
+        """
+        get_line() returns the line at row as a (begin, end) tuple, not including the newline. The
+        row is a row of the layout, so with word wrap on a line spanning several rows is the line
+        of each of them.
+        """
+
+        horizontal_pos = 0.0
+        line = self.view.line(self.view.layout_to_text((horizontal_pos,
+                                                        row * self.view.line_height())))
+
+        return (line.begin(), line.end())
+
+    # End of def get_line()
+
+# End of class ViewLineTable()
+
+
+class SelectionIndexBuilder(object):
+    """
+    The SelectionIndexBuilder class takes the snapshot of a view's selections on Sublime Text's
+    async worker thread (Sublime Text v.3 only) after the selections or the buffer have changed, so
+    that the first command after e.g. a big Find All does not pay for it on the UI thread. Builds
+    are debounced, each change bumps the view's build generation and a build only runs, and is only
+    published, if no newer change has happened. The finished SelectionIndex is published to the
+    cache on the UI thread, where the commands pick it up via SelectionIndex.get() which still
+    takes the snapshot synchronously if none is current.
+    """
+
+    # Holds the delay (ms) between a change and the start of the build, if no newer change occurs.
+    BUILD_DELAY                     = 150
+
+    # Holds the minimum number of selections worth snapshotting in the background.
+    MIN_NUM_SELECTIONS              = 1000
+
+    # Holds the number of selections snapshotted between checks for a newer change.
+    CHUNK_SIZE                      = 5000
+
+    # Holds the generation number of the latest change of each view - keyed by view.id().
+    generations = {}
+
+    # Holds the function used to schedule the builds - set_timeout_async() is not available in
+    # Sublime Text v.2 (which has no async event hooks either).
+    set_timeout_build = getattr(sublime, "set_timeout_async", sublime.set_timeout)
+
+
+    @classmethod
+    def cancel(cls, view_id):
+        """
+        cancel() bumps the view's build generation, making any pending or running build stale.
+        """
+
+        cls.generations[view_id] = cls.generations.get(view_id, 0) + 1
+
+    # End of def cancel()
+
+
+    @classmethod
+    def schedule(cls, view):
+        """
+        schedule() cancels any pending build for the view and schedules a new one.
+        """
+
+        view_id = view.id()
+        cls.cancel(view_id)
+        generation = cls.generations[view_id]
+
+        cls.set_timeout_build(lambda: cls.build(view, generation), cls.BUILD_DELAY)
+
+    # End of def schedule()
+
+
+    @classmethod
+    def is_stale(cls, view, generation):
+        """
+        is_stale() returns true if a newer change has happened since the build was scheduled.
+        """
+
+        return cls.generations.get(view.id()) != generation
+
+    # End of def is_stale()
+
+
+    @classmethod
+    def has_current_index(cls, view):
+        """
+        has_current_index() returns true if the view's cached SelectionIndex is current. Any change
+        of the selections since it was taken has already discarded it, so only the buffer's change
+        count is checked.
+        """
+
+        selection_index = SelectionIndex.cache.get(view.id())
+
+        return selection_index is not None and selection_index.change_count == view.change_count()
+
+    # End of def has_current_index()
+
+
+    @classmethod
+    def build(cls, view, generation):
+        """
+        build() makes the lists of the selection begin and end offsets, in chunks so that it stops
+        soon after a newer change, and schedules their publication on the UI thread.
+        """
+
+        if cls.is_stale(view, generation) or cls.has_current_index(view):
+            return
+
+        sels = view.sel()
+        sels_len = len(sels)
+
+        if sels_len < cls.MIN_NUM_SELECTIONS:
+            return
+
+        change_count = view.change_count()
+        signature = SelectionIndex.get_signature(sels, sels_len)
+
+        sel_begins = []
+        sel_ends = []
+
+        for chunk_begin in range(0, sels_len, cls.CHUNK_SIZE):
+
+            if cls.is_stale(view, generation):
+                return
+
+            chunk_end = min(chunk_begin + cls.CHUNK_SIZE, sels_len)
+
+            # The selections may change on the UI thread part way through.
+            try:
+                for sel_index in range(chunk_begin, chunk_end):
+                    sel = sels[sel_index]
+                    sel_begins.append(sel.begin())
+                    sel_ends.append(sel.end())
+
+            except IndexError:
+                return
+
+        sel_offsets = (sel_begins, sel_ends)
+
+        sublime.set_timeout(lambda: cls.publish(view, generation, change_count, sels_len,
+                                                signature, sel_offsets), 0)
+
+    # End of def build()
+
+
+    @classmethod
+    def publish(cls, view, generation, change_count, sels_len, signature, sel_offsets):
+        """
+        publish() caches the built SelectionIndex of the view, unless a newer change has happened
+        or a command has already taken a snapshot of the same selections.
+        """
+
+        if cls.is_stale(view, generation) or view.change_count() != change_count:
+            return
+
+        if cls.has_current_index(view):
+            return
+
+        SelectionIndex.cache[view.id()] = SelectionIndex(view, None, sels_len, signature,
+                                                         sel_offsets)
+
+    # End of def publish()
+
+# End of class SelectionIndexBuilder()
+
+
+class NavigationCursor(object):
+    """
+    The NavigationCursor class remembers the last selection a view was scrolled to, together with
+    the viewport positions from before and after centering it, plus a history of the selections
+    visited before it. Each SelectionIndex holds one, so the cursor is valid only while the
+    selections are unchanged. If the viewport is still where centering the last selection left it
+    then the next/previous selection is found by stepping the cursor's index, with no lookup of the
+    middle line. If the user has scrolled the viewport the middle line is searched as usual.
+    """
+
+    # Holds the maximum number of selections kept in the history for the scroll_to back op.
+    MAX_HISTORY                     = 100
+
+
+    def __init__(self):
+        """
+        __init__() sets up a cursor which has not visited any selection yet.
+        """
+
+        # Holds the index of the last visited selection, or None.
+        self.sel_index = None
+
+        # Holds the viewport positions from before and after centering the last visited selection.
+        self.viewport_before = None
+        self.viewport_after = None
+
+        # Holds the indexes of the selections visited before the last, the most recent last.
+        self.history = collections.deque(maxlen=NavigationCursor.MAX_HISTORY)
+
+    # End of def __init__()
+
+
+    def visit(self, sel_index, viewport_before, viewport_after, going_back=False):
+        """
+        visit() moves the cursor to the selection specified by sel_index, noting the viewport
+        positions. The previously visited selection is added to the history, unless going back.
+        """
+
+        if not going_back and self.sel_index is not None and self.sel_index != sel_index:
+            self.history.append(self.sel_index)
+
+        self.sel_index = sel_index
+        self.viewport_before = viewport_before
+        self.viewport_after = viewport_after
+
+    # End of def visit()
+
+
+    def get_sel_index(self, viewport_pos):
+        """
+        get_sel_index() returns the index of the last visited selection if the viewport is still in
+        the position that centering it produced, otherwise None.
+        """
+
+        if self.sel_index is None or viewport_pos != self.viewport_after:
+            return None
+
+        return self.sel_index
+
+    # End of def get_sel_index()
+
+
+    def drop_selection(self, sel_index):
+        """
+        drop_selection() updates the cursor when the selection specified by sel_index is dropped,
+        the indexes of the selections after it move down by one.
+        """
+
+        history = [index if index < sel_index else index - 1
+                   for index in self.history if index != sel_index]
+
+        self.history.clear()
+        self.history.extend(history)
+
+        self.sel_index = None
+        self.viewport_before = None
+        self.viewport_after = None
+
+    # End of def drop_selection()
+
+# End of class NavigationCursor()
+
+
+class SelectionMarker(object):
+    """
+    The SelectionMarker class highlights the selection last scrolled to, when the
+    "MultipleSelectionScroller.only_scroll_when_offscreen" setting is true. The viewport is then not
+    moved to a selection which is already fully visible, so the marker shows which of the visible
+    selections is the current one. The marker is a single keyed region which is replaced in place
+    by view.add_regions() on each scroll, and erased when the selections are modified (other than
+    by the plugin itself) since it then no longer marks the navigation position, when a region set
+    is navigated instead, and when the setting is turned off.
+    """
+
+    # Holds the ids of the views which have a marker.
+    marked = set()
+
+    # Holds the key, scope, and flags of the marker's region. The region is outlined, not filled,
+    # so that the selection highlighting can still be seen, and a cursor is outlined too.
+    REGIONS_KEY                     = "MultipleSelectionScroller.marker"
+    SCOPE                           = "comment"
+    FLAGS                           = (getattr(sublime, "DRAW_NO_FILL",
+                                               getattr(sublime, "DRAW_OUTLINED", 0)) |
+                                       sublime.DRAW_EMPTY)
+
+
+    @classmethod
+    def mark(cls, view, sel_begin, sel_end):
+        """
+        mark() moves the view's marker to the region from sel_begin to sel_end.
+        """
+
+        view.add_regions(SelectionMarker.REGIONS_KEY, [sublime.Region(sel_begin, sel_end)],
+                         SelectionMarker.SCOPE, "", SelectionMarker.FLAGS)
+        cls.marked.add(view.id())
+
+    # End of def mark()
+
+
+    @classmethod
+    def erase(cls, view):
+        """
+        erase() erases the view's marker (if any).
+        """
+
+        if view.id() in cls.marked:
+            view.erase_regions(SelectionMarker.REGIONS_KEY)
+            cls.marked.discard(view.id())
+
+    # End of def erase()
+
+
+    @classmethod
+    def selection_modified(cls, view):
+        """
+        selection_modified() erases the view's marker when its selections have been modified, unless
+        the modification was made by the plugin itself (the view's SelectionIndex is then kept, see
+        SelectionIndex.selection_modified(), which must be called first).
+        """
+
+        if view.id() in cls.marked and view.id() not in SelectionIndex.cache:
+            cls.erase(view)
+
+    # End of def selection_modified()
+
+# End of class SelectionMarker()
+
+
+class ScrollCoalescer(object):
+    """
+    The ScrollCoalescer class holds the key repeat coalescing state of a view, keyed by view.id().
+    When the "MultipleSelectionScroller.coalesce_window" setting is greater than 0, a burst of
+    next_sel/previous_sel requests, each arriving within the window of the one before, only updates
+    a logical target selection index. The actual view.show_at_center() call and status message are
+    made once, on the trailing edge of the burst (when the window has passed without a request).
+    The first request of a burst scrolls immediately, unless the
+    "MultipleSelectionScroller.coalesce_immediate_first" setting is false.
+    """
+
+    # Holds the ScrollCoalescer objects - keyed by view.id().
+    cache = {}
+
+    # Holds the timer - time.perf_counter() is not available in Python 2 (Sublime Text v.2).
+    timer = getattr(time, "perf_counter", time.time)
+
+
+    def __init__(self, view):
+        """
+        __init__() sets up the (idle) coalescing state of the view.
+        """
+
+        # The coalescer is cached and flushes after the command has returned, it must not hold an
+        # InstrumentedView.
+        self.view = InstrumentedView.unwrap(view)
+
+        # Holds the SelectionIndex, and its signature, that the burst's target index refers to.
+        self.selection_index = None
+        self.signature = None
+
+        # Holds the target selection index of the burst, or None if there is no burst.
+        self.target = None
+
+        # Holds the time of the most recent request of the burst.
+        self.last_request = None
+
+        # Holds whether scrolling to the target is deferred to the trailing edge.
+        self.defer = False
+
+        # Holds whether the trailing edge flush has been scheduled.
+        self.flush_scheduled = False
+
+    # End of def __init__()
+
+
+    @classmethod
+    def get(cls, view):
+        """
+        get() returns the ScrollCoalescer of the view, creating it if necessary.
+        """
+
+        view_id = view.id()
+
+        if view_id not in cls.cache:
+            cls.cache[view_id] = ScrollCoalescer(view)
+
+        return cls.cache[view_id]
+
+    # End of def get()
+
+
+    def continues_burst(self, selection_index, now, coalesce_window):
+        """
+        continues_burst() returns true if a request made now, on the selections of selection_index,
+        is part of the current burst.
+        """
+
+        if self.target is None or not self.refers_to(selection_index):
+            return False
+
+        return (now - self.last_request) * 1000.0 <= coalesce_window
+
+    # End of def continues_burst()
+
+
+    def start_burst(self, selection_index, now, defer):
+        """
+        start_burst() starts a new burst, its target is set when the first request is handled.
+        """
+
+        self.selection_index = selection_index
+        self.signature = selection_index.signature
+        self.target = None
+        self.last_request = now
+        self.defer = defer
+
+    # End of def start_burst()
+
+
+    def refers_to(self, selection_index):
+        """
+        refers_to() returns true if the burst's target index refers to the selections of
+        selection_index, i.e. they have not changed (or had one dropped) since the burst started.
+        """
+
+        return (selection_index is self.selection_index and
+                selection_index.signature == self.signature)
+
+    # End of def refers_to()
+
+
+    def schedule_flush(self, coalesce_window):
+        """
+        schedule_flush() schedules the trailing edge flush, if it has not already been scheduled.
+        """
+
+        if self.flush_scheduled:
+            return
+
+        self.flush_scheduled = True
+        sublime.set_timeout(lambda: self.flush(coalesce_window), coalesce_window)
+
+    # End of def schedule_flush()
+
+
+    def flush(self, coalesce_window):
+        """
+        flush() scrolls to the target of the burst once the window has passed without a request,
+        otherwise it reschedules itself for when the window will have passed.
+        """
+
+        elapsed = (ScrollCoalescer.timer() - self.last_request) * 1000.0
+
+        if elapsed < coalesce_window:
+            delay = int(coalesce_window - elapsed) + 1
+            sublime.set_timeout(lambda: self.flush(coalesce_window), delay)
+            return
+
+        self.flush_scheduled = False
+
+        target = self.target
+        self.target = None
+
+        # Don't scroll if the selections have changed since the target was set.
+        if target is None or not self.refers_to(SelectionIndex.cache.get(self.view.id())):
+            return
+
+        # The scroll_to index op scrolls and gives the user feedback, its index arg counts from 1.
+        self.view.run_command("multiple_selection_scroller",
+                              {"scroll_to": "index", "index": target + 1})
+
+    # End of def flush()
+
+# End of class ScrollCoalescer()
+
+
+class MatchCache(object):
+    """
+    The MatchCache class holds the matches of the pattern of the scroll_to next_match and
+    previous_match ops found so far in a view, keyed by view.id(), so that the matches never have to
+    be found all at once (or be made selections with Find All). The matches which begin in a
+    contiguous span of the text are kept in ordered lists. Searching forwards past the span finds
+    up to LOOKAHEAD_MATCHES more with view.find(). Sublime Text has no reverse find, so searching
+    backwards before the span rescans a window of the text before the point, doubling the window
+    until a match is found. The cache is discarded when the pattern or view.change_count() changes.
+
+    The match last scrolled to is remembered, together with the viewport position centering it
+    produced, so that while the viewport is unchanged next_match/previous_match step on from that
+    match rather than from the middle line (as the NavigationCursor class does for selections).
+    """
+
+    # Holds the MatchCache objects - keyed by view.id().
+    cache = {}
+
+    # Holds the number of matches found by each forward search past the span.
+    LOOKAHEAD_MATCHES               = 100
+
+    # Holds the maximum number of matches kept, the earliest are discarded beyond it.
+    MAX_MATCHES                     = 5000
+
+    # Holds the initial size (in characters) of the window rescanned by a backward search.
+    BACKWARD_WINDOW                 = 4096
+
+
+    def __init__(self, pattern, change_count):
+        """
+        __init__() sets up an empty cache of the matches of the pattern.
+        """
+
+        self.pattern = pattern
+        self.change_count = change_count
+
+        # Holds the ordered lists of the begin and end offsets of the known matches.
+        self.match_begins = []
+        self.match_ends = []
+
+        # Holds the span of the text in which every match is known, from span_begin up to (but not
+        # including) scan_point, where the next forward search starts, or up to the end of the text
+        # if scan_done is true.
+        self.span_begin = 0
+        self.scan_point = 0
+        self.scan_done = False
+
+        # Holds the match last scrolled to as a (begin, end) tuple, and the viewport position
+        # centering it produced.
+        self.cursor = None
+        self.cursor_viewport = None
+
+    # End of def __init__()
+
+
+    @classmethod
+    def get(cls, view, pattern):
+        """
+        get() returns the MatchCache of the view for the pattern, creating a new one if there is
+        none, or if the pattern or the text has changed.
+        """
+
+        view_id = view.id()
+        change_count = view.change_count()
+        match_cache = cls.cache.get(view_id)
+
+        if (match_cache is None or match_cache.pattern != pattern or
+                match_cache.change_count != change_count):
+            match_cache = MatchCache(pattern, change_count)
+            cls.cache[view_id] = match_cache
+
+        return match_cache
+
+    # End of def get()
+
+
+    def reset(self, point):
+        """
+        reset() discards the known matches, the span starts again (empty) at point.
+        """
+
+        del self.match_begins[:]
+        del self.match_ends[:]
+
+        self.span_begin = point
+        self.scan_point = point
+        self.scan_done = False
+
+    # End of def reset()
+
+
+    def scan(self, view, max_matches):
+        """
+        scan() extends the span by finding up to max_matches more matches from the scan point.
+        """
+
+        text_len = view.size()
+
+        for _ in range(max_matches):
+
+            region = None
+            if self.scan_point <= text_len:
+                region = view.find(self.pattern, self.scan_point)
+
+            # Sublime Text v.2 returns None if there is no match, v.3 returns Region(-1, -1).
+            if region is None or region.begin() < 0:
+                self.scan_done = True
+                break
+
+            self.match_begins.append(region.begin())
+            self.match_ends.append(region.end())
+
+            # An empty match would be found again, the next search starts after it.
+            if region.empty():
+                self.scan_point = region.end() + 1
+            else:
+                self.scan_point = region.end()
+
+        # Discard the earliest matches beyond the maximum, the span then begins at the first kept.
+
+        num_excess = len(self.match_begins) - MatchCache.MAX_MATCHES
+
+        if num_excess > 0:
+            del self.match_begins[:num_excess]
+            del self.match_ends[:num_excess]
+            self.span_begin = self.match_begins[0]
+
+    # End of def scan()
+
+
+    def get_next_match(self, view, point):
+        """
+        get_next_match() returns the first match which begins at or after point as a (begin, end)
+        tuple, or None if there is no such match.
+        """
+
+        # A point outside the span starts a new span there.
+        if point < self.span_begin or (point > self.scan_point and not self.scan_done):
+            self.reset(point)
+
+        while True:
+
+            match_index = bisect.bisect_left(self.match_begins, point)
+
+            if match_index < len(self.match_begins):
+                return (self.match_begins[match_index], self.match_ends[match_index])
+
+            if self.scan_done:
+                return None
+
+            # The known matches all begin before the point, discarding them makes room for those
+            # found, so no more may be found than can be kept.
+            self.scan(view, min(MatchCache.LOOKAHEAD_MATCHES, MatchCache.MAX_MATCHES))
+
+    # End of def get_next_match()
+
+
+    def get_previous_match(self, view, point):
+        """
+        get_previous_match() returns the last match which begins before, and ends at or before,
+        point as a (begin, end) tuple, or None if there is no such match.
+        """
+
+        if point <= 0:
+            return None
+
+        window = MatchCache.BACKWARD_WINDOW
+
+        # A point outside the span starts a new span, a window before the point.
+        if point < self.span_begin or (point > self.scan_point and not self.scan_done):
+            self.reset(max(0, point - window))
+
+        while True:
+
+            # Every match which begins before the point must be known, there is no lookahead past
+            # the point (the matches nearest the point must not be discarded as the earliest).
+            while not self.scan_done and self.scan_point <= point:
+                self.scan(view, 1)
+
+            # Matches do not overlap, so their end offsets are in order too.
+            match_index = min(bisect.bisect_left(self.match_begins, point),
+                              bisect.bisect_right(self.match_ends, point)) - 1
+
+            if match_index >= 0:
+                return (self.match_begins[match_index], self.match_ends[match_index])
+
+            if self.span_begin == 0:
+                return None
+
+            # No match in the span before the point, rescan a window twice the size.
+            window *= 2
+            self.reset(max(0, point - window))
+
+    # End of def get_previous_match()
+
+
+    def get_cursor(self, viewport_pos):
+        """
+        get_cursor() returns the match last scrolled to if the viewport is still in the position
+        that centering it produced, otherwise None.
+        """
+
+        if self.cursor is None or viewport_pos != self.cursor_viewport:
+            return None
+
+        return self.cursor
+
+    # End of def get_cursor()
+
+# End of class MatchCache()
+
+
+class CommandInstrument(object):
+    """
+    The CommandInstrument class records, for a single invocation of the multiple_selection_scroller
+    command, the wall time spent in each phase of the command (argument parsing, the operational
+    status check, the selection lookup, and view.show_at_center()), the number of view.sel(),
+    view.lines(), and view.rowcol() calls made, and the number of selections. It is only used if the
+    "MultipleSelectionScroller.instrument" setting is true. The records of the most recent
+    invocations are kept for the multiple_selection_scroller_stats command.
+    """
+
+    # Holds the names of the phases in the order that they occur.
+    PHASES                     = ("args", "status", "lookup", "show_at_center")
+
+    # Holds the names of the counted API calls.
+    API_CALLS                  = ("sel", "lines", "rowcol")
+
+    # Holds the maximum number of invocation records kept.
+    MAX_RECORDS                = 500
+
+    # Holds the records of the most recent invocations (the oldest are dropped first).
+    records = collections.deque(maxlen=MAX_RECORDS)
+
+    # Holds the timer - time.perf_counter() is not available in Python 2 (Sublime Text v.2).
+    timer = getattr(time, "perf_counter", time.time)
+
+
+    def __init__(self):
+        """
+        __init__() starts timing the first phase.
+        """
+
+        self.phase_times = dict((phase, 0.0) for phase in CommandInstrument.PHASES)
+        self.api_calls = dict((api_call, 0) for api_call in CommandInstrument.API_CALLS)
+        self.phase_start = CommandInstrument.timer()
+
+    # End of def __init__()
+
+
+    @staticmethod
+    def create(view):
+        """
+        create() returns a new CommandInstrument if the "MultipleSelectionScroller.instrument"
+        setting is true, otherwise it returns None.
+        """
+
+        if ScrollerSettings.get(view).instrument:
+            return CommandInstrument()
+
+        return None
+
+    # End of def create()
+
+
+    def end_phase(self, phase):
+        """
+        end_phase() adds the time since the previous phase ended to the given phase.
+        """
+
+        now = CommandInstrument.timer()
+        self.phase_times[phase] += now - self.phase_start
+        self.phase_start = now
+
+    # End of def end_phase()
+
+
+    def finish(self, command_label, sels_len):
+        """
+        finish() adds the record of this invocation to the records.
+        """
+
+        # The time spent in show_at_center() was also counted in the lookup phase.
+        self.phase_times["lookup"] = max(0.0, self.phase_times["lookup"] -
+                                              self.phase_times["show_at_center"])
+
+        record = {"command": command_label, "sels_len": sels_len}
+        record.update(self.phase_times)
+        record.update(self.api_calls)
+
+        CommandInstrument.records.append(record)
+
+    # End of def finish()
+
+# End of class CommandInstrument()
+
+
+class CommandProfiler(object):
+    """
+    The CommandProfiler class captures a cProfile profile of an invocation of the
+    multiple_selection_scroller command. It is only used if the "MultipleSelectionScroller.profile"
+    setting is "invocation" (or true), when a .pstats file is written for every invocation, or
+    "session", when a single profile accumulates every invocation and is rewritten after each one.
+    The files are written to the "MultipleSelectionScroller.profile_dir" directory. Each file name
+    is tagged with the command's scroll_to/clear_to value, the number of selections, and the number
+    of visible lines, e.g. "20150315-120000-7_scroll_to-next_sel_50000sels_40lines.pstats"; in the
+    session mode these tags are listed, one line per invocation, in a .log file alongside.
+    The files can be loaded with pstats.Stats() alongside those of benchmarks/bench_scroller.py.
+    """
+
+    # Holds the number of invocations profiled, used to keep the file names unique.
+    invocation_count = 0
+
+    # Holds the profile which accumulates the invocations of the session mode, and the path it is
+    # written to (without the extension).
+    session_profile = None
+    session_path = None
+
+
+    def __init__(self, mode, profile_dir):
+        """
+        __init__() sets up the profile of the invocation, in the session mode the session's profile.
+        """
+
+        self.mode = mode
+        self.profile_dir = profile_dir
+
+        if mode == "session":
+
+            if CommandProfiler.session_profile is None:
+                CommandProfiler.session_profile = cProfile.Profile()
+                session_name = "session-{0}-{1}".format(time.strftime("%Y%m%d-%H%M%S"),
+                                                        os.getpid())
+                CommandProfiler.session_path = os.path.join(profile_dir, session_name)
+
+            self.profile = CommandProfiler.session_profile
+
+        else:
+            self.profile = cProfile.Profile()
+
+    # End of def __init__()
+
+
+    @staticmethod
+    def create(view):
+        """
+        create() returns a new CommandProfiler if the "MultipleSelectionScroller.profile" setting is
+        set, otherwise (or if cProfile is not available) it returns None.
+        """
+
+        scroller_settings = ScrollerSettings.get(view)
+
+        if scroller_settings.profile is None:
+            return None
+
+        if cProfile is None:
+            print("multiple_selection_scroller: profile setting ignored, cProfile not available")
+            return None
+
+        return CommandProfiler(scroller_settings.profile, scroller_settings.profile_dir)
+
+    # End of def create()
+
+
+    def start(self):
+        """
+        start() starts profiling.
+        """
+
+        self.profile.enable()
+
+    # End of def start()
+
+
+    def finish(self, view, command_label, sels_len):
+        """
+        finish() stops profiling and writes the profile, tagged with the command label, the number
+        of selections, and the number of visible lines.
+        """
+
+        self.profile.disable()
+
+        CommandProfiler.invocation_count += 1
+
+        vertical_axis_index = 1
+        visible_lines_len = int(view.viewport_extent()[vertical_axis_index] / view.line_height())
+
+        # e.g. "scroll_to: next_sel" becomes "scroll_to-next_sel".
+        command_tag = "".join(char if char.isalnum() or char == "_" else "-"
+                              for char in command_label.replace(": ", "-"))
+
+        tags = "{0}_{1}sels_{2}lines".format(command_tag, sels_len, visible_lines_len)
+
+        try:
+            if not os.path.isdir(self.profile_dir):
+                os.makedirs(self.profile_dir)
+
+            if self.mode == "session":
+                self.profile.dump_stats(CommandProfiler.session_path + ".pstats")
+
+                with open(CommandProfiler.session_path + ".log", "a") as log_file:
+                    log_file.write("{0} {1}\n".format(CommandProfiler.invocation_count, tags))
+
+            else:
+                file_name = "{0}-{1}_{2}.pstats".format(time.strftime("%Y%m%d-%H%M%S"),
+                                                        CommandProfiler.invocation_count, tags)
+                self.profile.dump_stats(os.path.join(self.profile_dir, file_name))
+
+        except (IOError, OSError) as err:
+            print("multiple_selection_scroller: could not write profile - {0}".format(err))
+
+    # End of def finish()
+
+# End of class CommandProfiler()
+
+
+class InstrumentedView(object):
+    """
+    The InstrumentedView class wraps a Sublime View, counting the view.sel(), view.lines(), and
+    view.rowcol() calls and timing the view.show_at_center() calls for a CommandInstrument. All
+    other attribute access is passed straight through to the wrapped view. A wrapper only lives as
+    long as the command it was made for, see unwrap().
+    """
+
+    def __init__(self, view, instrument):
+        self.view = view
+        self.instrument = instrument
+
+    def __getattr__(self, name):
+        return getattr(self.view, name)
+
+    def sel(self):
+        self.instrument.api_calls["sel"] += 1
+        return self.view.sel()
+
+    def lines(self, region):
+        self.instrument.api_calls["lines"] += 1
+        return self.view.lines(region)
+
+    def rowcol(self, point):
+        self.instrument.api_calls["rowcol"] += 1
+        return self.view.rowcol(point)
+
+    def show_at_center(self, x):
+        start = CommandInstrument.timer()
+        self.view.show_at_center(x)
+        self.instrument.phase_times["show_at_center"] += CommandInstrument.timer() - start
+
+    # Objects which outlive the command (those which are cached) must hold the unwrapped view,
+    # otherwise later commands would count their API calls against this finished instrument.
+    @staticmethod
+    def unwrap(view):
+        if isinstance(view, InstrumentedView):
+            return view.view
+        return view
+
+# End of class InstrumentedView()
+
+
+class MultipleSelectionScrollerCommand(sublime_plugin.TextCommand):
+    """
+    The MultipleSelectionScrollerCommand class is a Sublime Text plugin which provides commands to
+    allow scrolling forwards and backwards through the current selections, by moving the visible
+    region so that the next/previous selection is centered on the middle line. Cycling from the last
+    selection up to the first and visa-versa is automatic. Commands to scroll straight to the first
+    and to the last selection complete its scrolling functionality.
+
+    The plugin also provides commands to clear the selections whilst leaving a single cursor at the
+    first selection, at the last selection, or at the selection on, or nearest to, the middle line,
+    and moving the visible region so that the single cursor is centered on the middle line. It also
+    has a command to clear the selections whilst leaving a single cursor at the end of the middle
+    line of the visible region (this ignores selections and does not move the visible region).
+
+    User feedback is given in the form of status messages, informing the user which selection has
+    just been placed on the middle line if scrolling (e.g. "scroll at selection: 5 of 11"), or at
+    which selection the cursor has been left if clearing (e.g. "cleared at selection: 5 of 11").
+
+    The plugin has settings to disable user feedback status messages and scroll cycling.
+
+    There is a known design limitation of this plugin. To move selections to the middle line the
+    plugin uses the Sublime View class method show_at_center(). There are some circumstances when
+    that method will not move the visible region to center a selection on the middle line. Any
+    selections above the middle line on the first page of the buffer can not be moved to the middle
+    line, Sublime Text has no 'scroll_above_beginning' setting. If the 'scroll_past_end' setting is
+    set to true, which it is by default, then the first selection below the middle line on the last
+    page of the buffer can be moved to the middle line, but any subsequent selections can not be. In
+    both cases any remaining selections either above or below the middle line will be in the visible
+    region on the screen and so easy to spot. Note that this limitation does not interfere with
+    scroll cycling which continues to work correctly. [In real-world usage I have not found this
+    design limitation inconvenient when it occurs, which is rarely.]
+    """
+
+    # Definitions of the various class constants:
+
+    # For: control mode - assigned to the control_mode instance variable.
+
+    SCROLL_TO                  = 100
+    CLEAR_TO                   = 110
+
+    # For: scrolling to selections - assigned to the scroll_to instance variable.
+
+    SCROLL_TO_PREVIOUS_SEL     = 120
+    SCROLL_TO_NEXT_SEL         = 130
+    SCROLL_TO_FIRST_SEL        = 140
+    SCROLL_TO_LAST_SEL         = 150
+    SCROLL_TO_PREVIOUS_PAGE    = 151
+    SCROLL_TO_NEXT_PAGE        = 152
+    SCROLL_TO_INDEX            = 153
+    SCROLL_TO_DROP_NEXT        = 154
+    SCROLL_TO_DROP_PREVIOUS    = 155
+    SCROLL_TO_BACK             = 156
+    SCROLL_TO_NEXT_MATCH       = 157
+    SCROLL_TO_PREVIOUS_MATCH   = 158
+
+    # For: cursor position after clearing selections - assigned to the clear_to instance variable.
+
+    CLEAR_TO_FIRST_SEL         = 160
+    CLEAR_TO_LAST_SEL          = 170
+    CLEAR_TO_MIDDLE_SEL        = 180
+    CLEAR_TO_VISIBLE_AREA      = 190
+    CLEAR_TO_VISIBLE_SELS      = 192
+    CLEAR_TO_ABOVE_MIDDLE      = 194
+    CLEAR_TO_BELOW_MIDDLE      = 196
+    CLEAR_TO_LAST_VISITED      = 198
+
+    # For: scroll cycling - assigned to the scroll_cycling instance variable.
+
+    SCROLL_CYCLING_ON          = 200
+    SCROLL_CYCLING_OFF         = 210
+
+    # For: user feedback status messages - assigned to the user_feedback instance variable.
+
+    FEEDBACK_VERBOSE           = 220
+    FEEDBACK_QUIET             = 230
+
+    # For: navigation order - assigned to the order instance variable.
+
+    ORDER_DOCUMENT             = 240
+    ORDER_COLUMN               = 250
+    ORDER_LENGTH               = 260
+    ORDER_TEXT                 = 270
+    ORDER_REVERSE              = 280
+
+    # For: Operational status - values are checked for in operational_status().
+
+    MIN_NUM_SELECTIONS         = 1
+    MIN_NUM_VISIBLE_LINES      = 3
+
+
+    def run(self, edit, **kwargs):
+        """
+        run() is called when the command is run - it sets up the optional profiling and then calls
+        run_instrumented() to perform the command.
+        """
+
+        profiler = CommandProfiler.create(self.view)
+
+        if profiler is None:
+            self.run_instrumented(**kwargs)
+            return
+
+        profiler.start()
+
+        try:
+            self.run_instrumented(**kwargs)
+
+        finally:
+            profiler.finish(self.view, self.get_command_label(**kwargs),
+                            getattr(self, "sels_len", 0))
+
+    # End of def run()
+
+
+    def run_instrumented(self, **kwargs):
+        """
+        run_instrumented() sets up the optional instrumentation and then calls control_command() to
+        perform the command.
+        """
+
+        # Holds the CommandInstrument recording this invocation, or None if instrumentation is off.
+        self.instrument = CommandInstrument.create(self.view)
+
+        if self.instrument is None:
+            self.control_command(**kwargs)
+            return
+
+        # Instrumentation is on, wrap the view so that API calls are counted and timed.
+
+        view = self.view
+        self.view = InstrumentedView(view, self.instrument)
+
+        try:
+            self.control_command(**kwargs)
+
+        finally:
+            self.view = view
+
+            # Take back the wrapper lent to the snapshot's line table, see set_selection_offsets().
+            if getattr(self, "selection_index", None) is not None:
+                self.selection_index.line_table.view = view
+
+            self.instrument.finish(self.get_command_label(**kwargs), getattr(self, "sels_len", 0))
+
+    # End of def run_instrumented()
+
+
+    def control_command(self, **kwargs):
+        """
+        control_command() controls the plugin's flow of execution.
+        """
+
+        # Define the 21 instance variables used to perform the command (self.instrument is set by
+        # run_instrumented(), no other instance variables are used).
+
+        # Holds the control mode - set by either: set_scroll_to() or set_clear_to()
+        self.control_mode = None
+
+        # Holds which scroll operation to perform (if any) - set by: set_scroll_to()
+        self.scroll_to = None
+
+        # Holds the value of the index arg, used by the scroll_to index op - set by: set_scroll_to()
+        self.index_arg = None
+
+        # Holds how many selections the scroll_to next_sel and previous_sel ops move by - set by:
+        # set_scroll_to()
+        self.count = 1
+
+        # Holds the value of the pattern arg, used by the scroll_to next_match and previous_match
+        # ops - set by: set_scroll_to()
+        self.pattern = None
+
+        # Holds the value of the regions_key arg, the key of the region set to navigate instead of
+        # the selections (if any) - set by: set_regions_key()
+        self.regions_key = None
+
+        # Holds the navigation order of the scroll_to ops - set by: set_order()
+        self.order = MultipleSelectionScrollerCommand.ORDER_DOCUMENT
+
+        # Holds which clear operation to perform (if any) - set by: set_clear_to()
+        self.clear_to = None
+
+        # Holds the view's cached ScrollerSettings.
+        self.scroller_settings = ScrollerSettings.get(self.view)
+
+        # Holds whether to perform scroll cycling - set by: set_scroll_cycling()
+        self.scroll_cycling = None
+
+        # Holds whether to display user feedback status messages - set by: set_user_feedback()
+        self.user_feedback = None
+
+        # Holds the current selections.
+        self.sels = self.view.sel()
+
+        # Holds the length of the current selections (or the number of regions navigated if the
+        # regions_key arg is used - set by: set_regions_key()).
+        self.sels_len = len(self.sels)
+
+        # Holds the view's ScrollCoalescer, if key repeats are being coalesced - set by:
+        # coalesce_scrolling()
+        self.coalescer = None
+
+        # Holds the region of the middle line of the visible region - set by: get_middle_line()
+        # [computed on first use, then shared by all the methods which need it].
+        self.middle_line = None
+
+        # Holds the (possibly cached) SelectionIndex of the selections (or of the regions of the
+        # regions_key arg), and its ordered lists of the selection begin and end offsets - set by:
+        # set_selection_offsets() [only when needed, the clear_to visible_area op doesn't use them].
+        self.selection_index = None
+        self.sel_begins = None
+        self.sel_ends = None
+
+        # Holds the NavigationCore, which makes the navigation decisions from the offsets - set by:
+        # set_selection_offsets().
+        self.navigation_core = None
+
+        # Holds the permutation of the selection indexes into the navigation order, and its inverse
+        # (the rank of each selection in the order), if the order is not document order - set by:
+        # set_selection_offsets().
+        self.order_permutation = None
+        self.order_ranks = None
+
+        # Handle command args and settings, and check them.
+
+        # Set the scroll_to instance variable if the command was called using the scroll_to arg,
+        # if so then it will also set the control_mode instance variable.
+        self.set_scroll_to(**kwargs)
+
+        # Set the clear_to instance variable if the command was called using the clear_to arg,
+        # if so then it will also set the control_mode instance variable.
+        self.set_clear_to(**kwargs)
+
+        # Set the regions_key instance variable if the command was called using the regions_key
+        # arg, if so then the region set is navigated instead of the selections.
+        self.set_regions_key(**kwargs)
+
+        # Set the order instance variable if the command was called using the order arg.
+        self.set_order(**kwargs)
+
+        # Set the scroll_cycling instance variable. Either according to the value in the user's
+        # settings file or to the default.
+        self.set_scroll_cycling()
+
+        # Set the user_feedback instance variable. Either according to the value in the user's
+        # settings file or to the default.
+        self.set_user_feedback()
+
+        self.end_phase("args")
+
+        # Check to make sure that control_mode has been set and that there are both selections and
+        # visible lines.
+        operational = self.operational_status()
+
+        self.end_phase("status")
+
+        if not operational:
+            return
+
+        # All present and correct - proceed to...
+
+        # Perform the required scrolling operation.
+        # The scroll_to index op on the selections in document order needs a single indexed access
+        # of the selections, not a snapshot of them all, but if the cached snapshot is still valid
+        # it is used so that the navigation cursor records the visit (for the scroll_to back op).
+        if self.control_mode == MultipleSelectionScrollerCommand.SCROLL_TO:
+            if self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_INDEX and \
+               self.regions_key is None and not self.is_ordered():
+                signature = SelectionIndex.get_signature(self.sels, self.sels_len)
+                self.selection_index = SelectionIndex.get_cached(self.view, signature)
+                if self.selection_index is not None:
+                    self.set_selection_offsets()
+            elif not self.is_match_scrolling():
+                self.set_selection_offsets()
+            self.control_scrolling()
+
+        # Perform the required clearing operation. The clear_to first_sel and last_sel ops need a
+        # single indexed access of the selections, not a snapshot of them all (clearing discards
+        # the snapshot, so it would be taken every time).
+        elif self.control_mode == MultipleSelectionScrollerCommand.CLEAR_TO:
+            if self.clear_to not in (MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_AREA,
+                                     MultipleSelectionScrollerCommand.CLEAR_TO_FIRST_SEL,
+                                     MultipleSelectionScrollerCommand.CLEAR_TO_LAST_SEL) or \
+               self.regions_key is not None:
+                self.set_selection_offsets()
+            self.control_clearing()
+
+        self.end_phase("lookup")
+
+    # End of def control_command()
+
+
+    def end_phase(self, phase):
+        """
+        end_phase() ends the timing of the given phase of the command, if instrumentation is on.
+        """
+
+        if self.instrument is not None:
+            self.instrument.end_phase(phase)
+
+    # End of def end_phase()
+
+
+    def get_command_label(self, **kwargs):
+        """
+        get_command_label() returns a label for the command args, e.g. "scroll_to: next_sel".
+        """
+
+        for arg_name in ("scroll_to", "clear_to"):
+            if arg_name in kwargs:
+                return "{0}: {1}".format(arg_name, str(kwargs.get(arg_name)).lower())
+
+        return "invalid args"
+
+    # End of def get_command_label()
+
+
+    def operational_status(self):
+        """
+        operational_status() checks that everything is in place to proceed with the selection
+        scrolling or clearing. It displays a status warning message and returns false if there's a
+        problem, otherwise it returns true. It checks that control_mode has been set, and that the
+        number of selections and the number of visible lines are greater than the required minimum.
+        """
+
+        # Return false if control_mode has not been set, invalid command args were used.
+        # In this case also output msg to the console - to aid user investigation.
+
+        if self.control_mode is None:
+            msg = "multiple_selection_scroller: invalid or missing command args"
+            print(msg)
+            sublime.status_message(msg)
+            return False
+
+        # Return false if there are no selections, clearly there is nothing for this plugin to do
+        # (unless scrolling to the matches of a pattern, which does not use the selections).
+
+        if self.sels_len < MultipleSelectionScrollerCommand.MIN_NUM_SELECTIONS and \
+           not self.is_match_scrolling():
+            if self.regions_key is None:
+                msg = "multiple_selection_scroller: there are no selections"
+            else:
+                msg = "multiple_selection_scroller: there are no regions: {0}"
+                msg = msg.format(self.regions_key)
+            sublime.status_message(msg)
+            return False
+
+        # Return false if the number of visible lines is fewer than the minimum.
+        # Note: There are design reasons for this check (calculating the middle line).
+        # This check also prevents the plugin from running in a panel or the command palette.
+
+        # The number of visible lines is the number of screen rows which fit in the viewport, there
+        # is no need to enumerate the lines of the visible region just to count them.
+        vertical_axis_index = 1
+        viewport_height = self.view.viewport_extent()[vertical_axis_index]
+        visible_lines_len = int(viewport_height / self.view.line_height())
+
+        if visible_lines_len < MultipleSelectionScrollerCommand.MIN_NUM_VISIBLE_LINES:
+            msg = "multiple_selection_scroller: too few visible lines"
+            sublime.status_message(msg)
+            return False
+
+        # All OK.
+        return True
+
+    # End of def operational_status()
+
+
+    def is_match_scrolling(self):
+        """
+        is_match_scrolling() returns true if the command is the scroll_to next_match or
+        previous_match op, which scroll to the matches of the pattern arg, not to the selections.
+        """
+
+        return self.scroll_to in (MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_MATCH,
+                                  MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_MATCH)
+
+    # End of def is_match_scrolling()
+
+
+    def is_ordered(self):
+        """
+        is_ordered() returns true if the selections are navigated in an order other than document
+        order, see set_order().
+        """
+
+        return self.order != MultipleSelectionScrollerCommand.ORDER_DOCUMENT
+
+    # End of def is_ordered()
+
+
+    def set_selection_offsets(self):
+        """
+        set_selection_offsets() sets the sel_begins and sel_ends instance variables to ordered lists
+        of the begin and end offsets of the selections, and the navigation_core instance variable to
+        the NavigationCore which searches them. The lists are searched with the bisect module so
+        that finding a selection relative to the middle line is an O(log n) operation. They are
+        taken from the view's cached SelectionIndex, if it is still valid.
+        """
+
+        # With the regions_key arg the index of the region set was set by set_regions_key(), and
+        # the scroll_to index op may have found the cached snapshot already.
+        if self.selection_index is None:
+            self.selection_index = SelectionIndex.get(self.view, self.sels, self.sels_len)
+
+        self.sel_begins = self.selection_index.sel_begins
+        self.sel_ends = self.selection_index.sel_ends
+
+        # Lend the command's view to the cached line table, so that an instrumented command counts
+        # its row lookups (run_instrumented() takes the wrapper back).
+        self.selection_index.line_table.view = self.view
+
+        # The NavigationCore is cached with the offsets, only the scroll cycling setting is set per
+        # command.
+        self.navigation_core = self.selection_index.core
+        self.navigation_core.scroll_cycling = (self.scroll_cycling ==
+                                               MultipleSelectionScrollerCommand.SCROLL_CYCLING_ON)
+
+        # The permutation into the navigation order is cached with the offsets too.
+        if self.is_ordered():
+            self.order_permutation, self.order_ranks = self.selection_index.get_order(self.view,
+                                                                                      self.order)
+
+    # End of def set_selection_offsets()
+
+
+    def set_scroll_to(self, **kwargs):
+        """
+        set_scroll_to() sets the scroll_to instance variable according to the value held by
+        "scroll_to" in the kwargs dictionary and sets the control_mode instance variable.
+        """
+
+        # Set the scroll_to arg name.
+        scroll_to_arg_name = "scroll_to"
+
+        # If available get the command's scroll_to arg from the kwargs dictionary.
+        if scroll_to_arg_name in kwargs:
+            scroll_to_arg_val = kwargs.get(scroll_to_arg_name)
+
+        # The scroll_to arg is not in the dictionary.
+        else:
+            return
+
+        # Convert to a string in case some other type was used in error and to lowercase.
+        scroll_to_arg_val = str(scroll_to_arg_val)
+        scroll_to_arg_val = scroll_to_arg_val.lower()
+
+        # Set the scroll_to instance variable.
+
+        if scroll_to_arg_val == "next_sel":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_SEL
+
+        elif scroll_to_arg_val == "previous_sel":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_SEL
+
+        elif scroll_to_arg_val == "first_sel":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_FIRST_SEL
+
+        elif scroll_to_arg_val == "last_sel":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_LAST_SEL
+
+        elif scroll_to_arg_val == "next_page_sel":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_PAGE
+
+        elif scroll_to_arg_val == "previous_page_sel":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_PAGE
+
+        elif scroll_to_arg_val == "index":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_INDEX
+            self.index_arg = kwargs.get("index", None)
+
+        elif scroll_to_arg_val == "drop_and_next":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_DROP_NEXT
+
+        elif scroll_to_arg_val == "drop_and_previous":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_DROP_PREVIOUS
+
+        elif scroll_to_arg_val == "back":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_BACK
+
+        elif scroll_to_arg_val == "next_match":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_MATCH
+
+        elif scroll_to_arg_val == "previous_match":
+            self.scroll_to = MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_MATCH
+
+        # "scroll_to" is set to an invalid value.
+        else:
+            return
+
+        # The next_match and previous_match ops require the pattern arg, a non-empty string.
+
+        if self.is_match_scrolling():
+
+            self.pattern = kwargs.get("pattern", None)
+
+            if not isinstance(self.pattern, type(u"")) and not isinstance(self.pattern, str):
+                return
+
+            if len(self.pattern) == 0:
+                return
+
+        # If available get the command's count arg, it must be a whole number of at least 1.
+
+        count_arg_name = "count"
+
+        if count_arg_name in kwargs:
+
+            count_arg_val = kwargs.get(count_arg_name)
+
+            # A bool is an int in Python, but is clearly not a count.
+            if isinstance(count_arg_val, bool):
+                return
+
+            try:
+                self.count = int(str(count_arg_val))
+            except ValueError:
+                return
+
+            if self.count < 1:
+                return
+
+        # All OK - Set the control_mode instance variable.
+        self.control_mode = MultipleSelectionScrollerCommand.SCROLL_TO
+
+    # End of def set_scroll_to()
+
+
+    def set_clear_to(self, **kwargs):
+        """
+        set_clear_to() sets the clear_to instance variable according to the value held by
+        "clear_to" in the kwargs dictionary and sets the control_mode instance variable.
+        """
+
+        # Set the clear_to arg name.
+        clear_to_arg_name = "clear_to"
+
+        # If available get the command's clear_to arg from the kwargs dictionary.
+        if clear_to_arg_name in kwargs:
+            clear_to_arg_val = kwargs.get(clear_to_arg_name)
+
+        # The clear_to arg is not in the dictionary.
+        else:
+            return
+
+        # Convert to a string in case some other type was used in error and to lowercase.
+        clear_to_arg_val = str(clear_to_arg_val)
+        clear_to_arg_val = clear_to_arg_val.lower()
+
+        # Set the clear_to instance variable.
+
+        if clear_to_arg_val == "first_sel":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_FIRST_SEL
+
+        elif clear_to_arg_val == "last_sel":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_LAST_SEL
+
+        elif clear_to_arg_val == "middle_sel":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_MIDDLE_SEL
+
+        elif clear_to_arg_val == "visible_area":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_AREA
+
+        elif clear_to_arg_val == "visible_sels":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_SELS
+
+        elif clear_to_arg_val == "above_middle":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_ABOVE_MIDDLE
+
+        elif clear_to_arg_val == "below_middle":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_BELOW_MIDDLE
+
+        elif clear_to_arg_val == "last_visited":
+            self.clear_to = MultipleSelectionScrollerCommand.CLEAR_TO_LAST_VISITED
+
+        # "clear_to" is set to an invalid value.
+        else:
+            return
+
+        # All OK - Set the control_mode instance variable.
+        self.control_mode = MultipleSelectionScrollerCommand.CLEAR_TO
+
+    # End of def set_clear_to()
+
+
+    def set_regions_key(self, **kwargs):
+        """
+        set_regions_key() sets the regions_key instance variable to the value of the "regions_key"
+        arg in the kwargs dictionary, if there is one, and sets the selection_index and sels_len
+        instance variables to the (cached) index of the region set and its number of regions. The
+        ops which modify the selections they navigate, the drop_and_next, drop_and_previous,
+        next_match and previous_match scroll_to ops and the partial clear_to ops, can not be used
+        with a region set, for which it resets the control_mode instance variable.
+        """
+
+        regions_key_arg_name = "regions_key"
+
+        if regions_key_arg_name not in kwargs or self.control_mode is None:
+            return
+
+        regions_key = kwargs.get(regions_key_arg_name)
+
+        # The key must be a non-empty string.
+        if (not isinstance(regions_key, type(u"")) and not isinstance(regions_key, str)) or \
+           len(regions_key) == 0:
+            self.control_mode = None
+            return
+
+        if self.scroll_to in (MultipleSelectionScrollerCommand.SCROLL_TO_DROP_NEXT,
+                              MultipleSelectionScrollerCommand.SCROLL_TO_DROP_PREVIOUS,
+                              MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_MATCH,
+                              MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_MATCH) or \
+           self.clear_to in (MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_SELS,
+                             MultipleSelectionScrollerCommand.CLEAR_TO_ABOVE_MIDDLE,
+                             MultipleSelectionScrollerCommand.CLEAR_TO_BELOW_MIDDLE):
+            self.control_mode = None
+            return
+
+        self.regions_key = regions_key
+
+        self.selection_index = RegionSetIndex.get(self.view, regions_key)
+        self.sels_len = len(self.selection_index.sel_begins)
+
+    # End of def set_regions_key()
+
+
+    def set_order(self, **kwargs):
+        """
+        set_order() sets the order instance variable according to the value held by "order" in the
+        kwargs dictionary, if there is one. Only the scroll_to next_sel, previous_sel, first_sel,
+        last_sel, index, and back ops navigate in an order, for the other ops any order other than
+        document order resets the control_mode instance variable, as does an invalid value.
+        """
+
+        order_arg_name = "order"
+
+        if order_arg_name not in kwargs or self.control_mode is None:
+            return
+
+        # Convert to a string in case some other type was used in error and to lowercase.
+        order_arg_val = str(kwargs.get(order_arg_name)).lower()
+
+        if order_arg_val == "document":
+            self.order = MultipleSelectionScrollerCommand.ORDER_DOCUMENT
+            return
+
+        elif order_arg_val == "column":
+            self.order = MultipleSelectionScrollerCommand.ORDER_COLUMN
+
+        elif order_arg_val == "length":
+            self.order = MultipleSelectionScrollerCommand.ORDER_LENGTH
+
+        elif order_arg_val == "text":
+            self.order = MultipleSelectionScrollerCommand.ORDER_TEXT
+
+        elif order_arg_val == "reverse":
+            self.order = MultipleSelectionScrollerCommand.ORDER_REVERSE
+
+        # "order" is set to an invalid value.
+        else:
+            self.control_mode = None
+            return
+
+        if self.scroll_to not in (MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_SEL,
+                                  MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_SEL,
+                                  MultipleSelectionScrollerCommand.SCROLL_TO_FIRST_SEL,
+                                  MultipleSelectionScrollerCommand.SCROLL_TO_LAST_SEL,
+                                  MultipleSelectionScrollerCommand.SCROLL_TO_INDEX,
+                                  MultipleSelectionScrollerCommand.SCROLL_TO_BACK):
+            self.control_mode = None
+
+    # End of def set_order()
+
+
+    def set_scroll_cycling(self):
+        """
+        set_scroll_cycling() sets the scroll_cycling instance variable according to the value of the
+        "MultipleSelectionScroller.scroll_cycling" setting in the user's settings file, or to the
+        default (see the ScrollerSettings class).
+        """
+
+        if self.scroller_settings.scroll_cycling:
+            self.scroll_cycling = MultipleSelectionScrollerCommand.SCROLL_CYCLING_ON
+        else:
+            self.scroll_cycling = MultipleSelectionScrollerCommand.SCROLL_CYCLING_OFF
+
+    # End of def set_scroll_cycling()
+
+
+    def set_user_feedback(self):
+        """
+        set_user_feedback() sets the user_feedback instance variable according to the value of the
+        "MultipleSelectionScroller.quiet" setting in the user's settings file, or to the default
+        (see the ScrollerSettings class).
+        """
+
+        if self.scroller_settings.quiet:
+            self.user_feedback = MultipleSelectionScrollerCommand.FEEDBACK_QUIET
+        else:
+            self.user_feedback = MultipleSelectionScrollerCommand.FEEDBACK_VERBOSE
+
+    # End of def set_user_feedback()
+
+
+    def control_scrolling(self):
+        """
+        control_scrolling() controls scrolling by calling the appropriate method depending on what
+        value the scroll_to instance variable has been set to.
+
+        This method also provides detailed notes about how this plugin handles the scrolling.
+        """
 
         # Scrolling forwards - scroll_to_next_selection() - through the selections is done by moving
         # the first selection to occur below the middle line of the visible region to the middle
@@ -396,6 +2361,29 @@ class MultipleSelectionScrollerCommand(sublime_plugin.TextCommand):
         # Scrolling to the first and last selections simply moves the first or last selection to the
         # middle line of the visible region.
         #
+        # Scrolling to an index - scroll_to_index_arg() - moves the selection given by the index arg
+        # straight to the middle line, if there is no index arg the user is asked for one.
+        #
+        # Scrolling forwards/backwards by page - scroll_to_next_page_selection() and
+        # scroll_to_previous_page_selection() - moves the first selection to occur below/above the
+        # visible region to the middle line, skipping all the selections which are already on the
+        # screen. Cycling is performed if there is no selection below/above the visible region.
+        #
+        # The last selection scrolled to is remembered by the navigation cursor, see the
+        # NavigationCursor class. If the viewport has not been scrolled since, scrolling forwards
+        # or backwards simply steps the cursor's index, visiting every selection in turn (even
+        # those which can not be centered), and no middle line search is needed. Scrolling back -
+        # scroll_to_previously_visited_selection() - returns to the selections visited before.
+        #
+        # Dropping and scrolling - drop_and_scroll() - removes the selection on, or nearest to, the
+        # middle line and moves the selection after/before it to the middle line. This allows a set
+        # of selections (e.g. from Find All) to be reviewed and pruned with one key per selection.
+        #
+        # Scrolling to the next/previous match of the pattern arg - scroll_to_match() - does not use
+        # the selections, the matches are found as needed with view.find() and cached, see the
+        # MatchCache class. The match scrolled to is made the only selection, so there is no need to
+        # run Find All (and have the editor hold every match as a selection) first.
+        #
         # Repeated pressing of the command's keys allow scrolling backwards and forwards through all
         # the selections.
         #
@@ -416,515 +2404,1494 @@ class MultipleSelectionScrollerCommand(sublime_plugin.TextCommand):
         # in the visible region on the screen. The scroll to next/previous selection methods have
         # information about how scroll cycling is achieved in these cases.
 
-        # Perform the appropriate Scrolling.
+        # Key repeats of the scroll to next/previous selection ops can be coalesced, see the
+        # ScrollCoalescer class. If this request is part of a burst there is no scrolling to do now.
+
+        if self.coalesce_scrolling():
+            return
+
+        # Perform the appropriate Scrolling.
+
+        if self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_SEL:
+            self.scroll_to_next_selection()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_SEL:
+            self.scroll_to_previous_selection()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_FIRST_SEL:
+            self.scroll_to_first_selection()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_LAST_SEL:
+            self.scroll_to_last_selection()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_PAGE:
+            self.scroll_to_next_page_selection()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_PAGE:
+            self.scroll_to_previous_page_selection()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_INDEX:
+            self.scroll_to_index_arg()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_DROP_NEXT:
+            self.drop_and_scroll(forwards=True)
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_DROP_PREVIOUS:
+            self.drop_and_scroll(forwards=False)
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_BACK:
+            self.scroll_to_previously_visited_selection()
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_MATCH:
+            self.scroll_to_match(forwards=True)
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_MATCH:
+            self.scroll_to_match(forwards=False)
+
+    # End of def control_scrolling()
+
+
+    def coalesce_scrolling(self):
+        """
+        coalesce_scrolling() handles the key repeat coalescing of the scroll to next/previous
+        selection ops, if the user has enabled it. It returns true if the request is part of a burst
+        of requests and has been coalesced (only the burst's target index is updated), otherwise it
+        returns false and the request is handled as usual.
+        """
+
+        coalesce_window = self.scroller_settings.coalesce_window
+
+        # The trailing edge scroll is made on the view's selections in document order, region sets
+        # and the other navigation orders are not coalesced.
+        if coalesce_window <= 0 or self.regions_key is not None or self.is_ordered():
+            return False
+
+        if self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_SEL:
+            step = self.count
+
+        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_SEL:
+            step = -self.count
+
+        else:
+            return False
+
+        self.coalescer = ScrollCoalescer.get(self.view)
+        now = ScrollCoalescer.timer()
+
+        # Part of a burst - step the target index on from the previous target, since the viewport
+        # may not have been scrolled to it yet, and leave scrolling to the trailing edge.
+
+        if self.coalescer.continues_burst(self.selection_index, now, coalesce_window):
+
+            self.coalescer.target = self.navigation_core.get_stepped_index(self.coalescer.target,
+                                                                           step)
+            self.coalescer.last_request = now
+            self.coalescer.schedule_flush(coalesce_window)
+
+            return True
+
+        # The first request of a burst is handled as usual, scroll_to_selection_index() sets the
+        # target (and defers the scrolling if the first step is not to be immediate).
+
+        defer = not self.scroller_settings.coalesce_immediate_first
+        self.coalescer.start_burst(self.selection_index, now, defer)
+
+        return False
+
+    # End of def coalesce_scrolling()
+
+
+    def scroll_to_next_selection(self):
+        """
+        scroll_to_next_selection() moves the visible region to center on the first selection to
+        occur below the middle_line region. If there is no such selection it moves the visible
+        region to center on the first selection (i.e. cycles up to the first selection). If the
+        count arg is greater than 1 it moves forwards that many selections in one go.
+        """
+
+        # In a navigation order other than document order, step on in the order.
+        if self.is_ordered():
+            self.step_in_order(self.count)
+            return
+
+        # If the viewport is where the navigation cursor left it, step on from the cursor.
+        if self.step_navigation_cursor(self.count):
+            return
+
+        # Get the region of the middle line.
+        middle_line = self.get_middle_line()
+
+        # IMPORTANT NOTE: Checking to see if a selection was found below the middle line can not
+        # always be relied on for scroll cycling because selections below the middle line on the
+        # final page of the buffer may not be able to be centered. This is because of the way
+        # view.show_at_center() behaves; it will not move the viewport further down than the end of
+        # the buffer allows. Rather than scrolling and then checking whether the viewport moved,
+        # which needs a second scroll to cycle, whether centering the selection will move the
+        # viewport is predicted beforehand - see selection_index_can_be_centered().
+
+        # The NavigationCore binary searches the selection begin offsets for the first selection to
+        # occur below the middle line, i.e. the first selection which begins after the end of the
+        # middle line, and moves forwards by count. If no selection was found below the middle
+        # line, or centering it will not move the viewport, then with scroll cycling on the next
+        # selection is the first selection (i.e. cycle up to it), with it off there is none.
+
+        sel_index = self.navigation_core.get_next_index((middle_line.begin(), middle_line.end()),
+                                                        self.count,
+                                                        self.selection_index_can_be_centered)
+
+        if sel_index is not None:
+            self.scroll_to_selection_index(sel_index)
+
+    # End of def scroll_to_next_selection()
+
+
+    def scroll_to_previous_selection(self):
+        """
+        scroll_to_previous_selection() moves the visible region to center on the first selection to
+        occur above the middle_line region. If there is no such selection it moves the visible
+        region to center on the last selection (i.e. cycles down to the last selection). If the
+        count arg is greater than 1 it moves backwards that many selections in one go.
+        """
+
+        # In a navigation order other than document order, step back in the order.
+        if self.is_ordered():
+            self.step_in_order(-self.count)
+            return
+
+        # If the viewport is where the navigation cursor left it, step back from the cursor.
+        if self.step_navigation_cursor(-self.count):
+            return
+
+        # Get the region of the middle line.
+        middle_line = self.get_middle_line()
+
+        # IMPORTANT NOTE: Checking to see if a selection was found above the middle line can not
+        # always be relied on for scroll cycling because selections above the middle line on the
+        # first page of the buffer can not be centered; view.show_at_center() will not move the
+        # viewport above the beginning of the buffer. See the note in scroll_to_next_selection().
+
+        # The NavigationCore binary searches the selection end offsets for the last selection to
+        # occur above the middle line, i.e. the last selection which ends before the beginning of
+        # the middle line, and moves backwards by count. If no selection was found above the middle
+        # line, or centering it will not move the viewport, then with scroll cycling on the
+        # previous selection is the last selection (i.e. cycle down to it), with it off there is
+        # none.
+
+        sel_index = self.navigation_core.get_previous_index((middle_line.begin(),
+                                                             middle_line.end()),
+                                                            self.count,
+                                                            self.selection_index_can_be_centered)
+
+        if sel_index is not None:
+            self.scroll_to_selection_index(sel_index)
+
+    # End of def scroll_to_previous_selection()
+
+
+    def step_navigation_cursor(self, step):
+        """
+        step_navigation_cursor() moves the visible region to center on the selection step
+        selections on from the navigation cursor's selection, cycling if enabled, and returns true.
+        If the viewport has been scrolled since the cursor's selection was centered it does nothing
+        and returns false, the caller then searches from the middle line.
+        """
+
+        vertical_axis_index = 1
+        viewport_pos = self.view.viewport_position()
+        cursor_index = self.selection_index.nav_cursor.get_sel_index(viewport_pos)
+
+        if cursor_index is None:
+            return False
+
+        # Without scroll cycling there is nothing to do at the first/last selection.
+        if self.scroll_cycling == MultipleSelectionScrollerCommand.SCROLL_CYCLING_OFF:
+            if cursor_index == (self.sels_len - 1 if step > 0 else 0):
+                return True
+
+        sel_index = self.navigation_core.get_stepped_index(cursor_index, step)
+
+        self.scroll_to_selection_index(sel_index, viewport_pos[vertical_axis_index])
+
+        return True
+
+    # End of def step_navigation_cursor()
+
+
+    def step_in_order(self, step):
+        """
+        step_in_order() moves the visible region to center on the selection step selections on from
+        the navigation cursor's selection in the navigation order, cycling if enabled. The order has
+        nothing to do with the viewport, so the cursor is stepped on from even if the viewport has
+        been scrolled since. If no selection has been visited yet the first selection in the order
+        is the first step forwards, and the last selection the first step backwards.
+        """
+
+        cursor_index = self.selection_index.nav_cursor.sel_index
+
+        if cursor_index is None:
+            rank = -1 if step > 0 else self.sels_len
+
+        else:
+            rank = self.order_ranks[cursor_index]
+
+            # Without scroll cycling there is nothing to do at the first/last selection.
+            if self.scroll_cycling == MultipleSelectionScrollerCommand.SCROLL_CYCLING_OFF:
+                if rank == (self.sels_len - 1 if step > 0 else 0):
+                    return
+
+        rank = self.navigation_core.get_stepped_index(rank, step)
+
+        self.scroll_to_selection_index(self.order_permutation[rank])
+
+    # End of def step_in_order()
+
+
+    def get_ordered_index(self, rank):
+        """
+        get_ordered_index() returns the index of the selection at the given rank in the navigation
+        order, in document order that is the rank itself.
+        """
+
+        if self.is_ordered():
+            return self.order_permutation[rank]
+
+        return rank
+
+    # End of def get_ordered_index()
+
+
+    def scroll_to_previously_visited_selection(self):
+        """
+        scroll_to_previously_visited_selection() moves the visible region to center on the
+        selection visited before the navigation cursor's selection, going back through the history
+        of visited selections with each call.
+        """
+
+        history = self.selection_index.nav_cursor.history
+
+        if not history:
+            self.status_message_no_previously_visited_selection()
+            return
+
+        self.scroll_to_selection_index(history.pop(), going_back=True)
+
+    # End of def scroll_to_previously_visited_selection()
+
+
+    def scroll_to_match(self, forwards):
+        """
+        scroll_to_match() moves the visible region to center on the next (if forwards is true) or
+        previous match of the pattern arg, count matches on, and makes it the only selection. The
+        matches are searched for from the match last scrolled to if the viewport has not been
+        scrolled since, otherwise from the middle line, cycling if enabled.
+        """
+
+        match_cache = MatchCache.get(self.view, self.pattern)
+        match = match_cache.get_cursor(self.view.viewport_position())
+
+        # As with the selections, the next match is the first to begin below the middle line and
+        # the previous match the last to end above it.
+
+        if match is None:
+            middle_line = self.get_middle_line()
+            match = (middle_line.end(), middle_line.end()) if forwards else \
+                    (middle_line.begin(), middle_line.begin())
+
+        # Without scroll cycling, stepping count matches on stops at the last/first match.
+        found = False
+
+        for _ in range(self.count):
+
+            if forwards:
+                point = match[1] + 1 if match[0] == match[1] else match[1]
+                next_match = match_cache.get_next_match(self.view, point)
+
+            else:
+                next_match = match_cache.get_previous_match(self.view, match[0])
+
+            # No match after/before, with scroll cycling on cycle to the first/last match.
+            if next_match is None and \
+               self.scroll_cycling == MultipleSelectionScrollerCommand.SCROLL_CYCLING_ON:
+
+                if forwards:
+                    next_match = match_cache.get_next_match(self.view, 0)
+                else:
+                    next_match = match_cache.get_previous_match(self.view, self.view.size() + 1)
+
+            if next_match is None:
+                break
+
+            match = next_match
+            found = True
+
+        if not found:
+            self.status_message_no_match()
+            return
+
+        # Make the match the only selection and center it.
+
+        self.sels.clear()
+        self.sels.add(sublime.Region(match[0], match[1]))
+
+        self.view.show_at_center(match[0])
+
+        match_cache.cursor = match
+        match_cache.cursor_viewport = self.view.viewport_position()
+
+        self.status_message_scroll_to_match(match)
+
+    # End of def scroll_to_match()
+
+
+    def scroll_to_index_arg(self):
+        """
+        scroll_to_index_arg() moves the visible region to center on the selection specified by the
+        index arg. If there is no index arg an input panel is shown to ask the user for one, which
+        then runs the command again with the index arg set.
+        """
+
+        if self.index_arg is None:
+            self.show_index_input_panel()
+            return
+
+        # The index arg counts the selections in the navigation order.
+        rank = self.get_selection_index_from_arg(self.index_arg)
+
+        if rank is None:
+            msg = "multiple_selection_scroller: invalid index arg: {0}"
+            msg = msg.format(str(self.index_arg))
+            sublime.status_message(msg)
+            return
+
+        self.scroll_to_selection_index(self.get_ordered_index(rank))
+
+    # End of def scroll_to_index_arg()
+
+
+    def get_selection_index_from_arg(self, index_arg):
+        """
+        get_selection_index_from_arg() returns the selection index specified by index_arg, or None
+        if index_arg is invalid. index_arg can be a selection number counted from 1 (as used in the
+        status messages), a negative number counting back from the last selection (-1 is the last),
+        or a percentage position through the selections (e.g. "50%"). Numbers can be given as ints
+        or strings, numbers beyond the number of selections are clamped to it.
+        """
+
+        # A bool is an int in Python, but is clearly not an index.
+        if isinstance(index_arg, bool):
+            return None
+
+        # Convert to a string in case an int was used, then strip any whitespace.
+        index_arg_val = str(index_arg).strip()
+
+        # Percentage position: 0% is the first selection and 100% is the last.
+
+        if index_arg_val.endswith("%"):
+
+            try:
+                percentage = float(index_arg_val[:-1])
+            except ValueError:
+                return None
+
+            percentage = max(0.0, min(percentage, 100.0))
+
+            return int(round((self.sels_len - 1) * percentage / 100.0))
+
+        # Selection number, counted from 1 or, if negative, back from the last selection.
+
+        try:
+            sel_number = int(index_arg_val)
+        except ValueError:
+            return None
+
+        if sel_number > 0:
+            return min(sel_number, self.sels_len) - 1
+
+        if sel_number < 0:
+            return max(self.sels_len + sel_number, 0)
+
+        # Selection number 0 is invalid.
+        return None
+
+    # End of def get_selection_index_from_arg()
+
+
+    def show_index_input_panel(self):
+        """
+        show_index_input_panel() shows an input panel asking the user which selection to scroll to,
+        when it is entered the command is run again with the index arg set.
+        """
+
+        window = self.view.window()
+
+        if window is None:
+            return
+
+        # The view must be captured by the callback, the command's self.view may be replaced.
+        view = self.view
+
+        args = {"scroll_to": "index"}
+
+        if self.regions_key is not None:
+            args["regions_key"] = self.regions_key
+
+        if self.is_ordered():
+            args["order"] = self.get_order_name()
+
+        def on_done(index_arg):
+            args["index"] = index_arg
+            view.run_command("multiple_selection_scroller", args)
+
+        caption = "Scroll to {0} (N, -N, or N%) of {1}:".format(self.get_target_name(),
+                                                                str(self.sels_len))
+
+        window.show_input_panel(caption, "", on_done, None, None)
+
+    # End of def show_index_input_panel()
+
+
+    def scroll_to_next_page_selection(self):
+        """
+        scroll_to_next_page_selection() moves the visible region to center on the first selection
+        to occur below the visible region. If there is no such selection it moves the visible region
+        to center on the first selection (i.e. cycles up to the first selection).
+        """
+
+        visible_region = self.view.visible_region()
+
+        # The NavigationCore binary searches the selection begin offsets for the first selection
+        # which begins after the end of the visible region. Such a selection is off screen, so
+        # centering it will always move the viewport and there is no need to predict it.
+
+        sel_index = self.navigation_core.get_next_page_index((visible_region.begin(),
+                                                              visible_region.end()))
+
+        if sel_index is not None:
+            self.scroll_to_selection_index(sel_index)
+
+    # End of def scroll_to_next_page_selection()
+
+
+    def scroll_to_previous_page_selection(self):
+        """
+        scroll_to_previous_page_selection() moves the visible region to center on the first
+        selection to occur above the visible region. If there is no such selection it moves the
+        visible region to center on the last selection (i.e. cycles down to the last selection).
+        """
+
+        visible_region = self.view.visible_region()
+
+        # The NavigationCore binary searches the selection end offsets for the last selection which
+        # ends before the beginning of the visible region.
+
+        sel_index = self.navigation_core.get_previous_page_index((visible_region.begin(),
+                                                                  visible_region.end()))
+
+        if sel_index is not None:
+            self.scroll_to_selection_index(sel_index)
+
+    # End of def scroll_to_previous_page_selection()
+
+
+    def drop_and_scroll(self, forwards):
+        """
+        drop_and_scroll() removes the selection on, or nearest to, the middle line and scrolls to
+        the selection which followed it (forwards) or preceded it (backwards), cycling if enabled.
+        The only selection is never dropped, there must always be a cursor.
+        """
+
+        if self.sels_len < 2:
+            self.scroll_to_selection_index(0)
+            return
+
+        sel_index = self.get_selection_index_nearest_middle_line()
 
-        if self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_SEL:
-            self.scroll_to_next_selection()
+        if not self.selection_index.drop_selection(self.view, self.sels, sel_index):
+            self.status_message_drop_failed(sel_index)
+            return
 
-        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_PREVIOUS_SEL:
-            self.scroll_to_previous_selection()
+        self.sels_len -= 1
 
-        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_FIRST_SEL:
-            self.scroll_to_first_selection()
+        # The following selection has moved down into the dropped selection's index.
 
-        elif self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_LAST_SEL:
-            self.scroll_to_last_selection()
+        step = 0 if forwards else -1
+        sel_index = self.navigation_core.get_stepped_index(sel_index, step)
 
-    # End of def control_scrolling()
+        self.scroll_to_selection_index(sel_index)
 
+    # End of def drop_and_scroll()
 
-    def scroll_to_next_selection(self):
+
+    def selection_index_can_be_centered(self, sel_index):
         """
-        scroll_to_next_selection() moves the visible region to center on the first selection to
-        occur below the middle_line region. If there is no such selection it moves the visible
-        region to center on the first selection (i.e. cycles up to the first selection).
+        selection_index_can_be_centered() returns true if calling view.show_at_center() on the
+        selection specified by sel_index would move the viewport, otherwise it returns false. The
+        prediction is made from the layout so that the viewport is only ever scrolled once.
+        """
+
+        # show_at_center() sets the viewport's vertical position so that the selection's line is in
+        # the vertical center of the viewport, clamped between the top of the buffer and the lowest
+        # position that the buffer can be scrolled to. The lowest position depends on the setting
+        # 'scroll_past_end'; if true the buffer can be scrolled until its last line is at the top of
+        # the viewport, if false until its last line is at the bottom of the viewport. The Viewport
+        # class of the navigation core makes the prediction, in rows of the layout.
+
+        vertical_axis_index = 1
+        viewport_pos = self.view.viewport_position()[vertical_axis_index]
+
+        # Guard against a wrong prediction, if the previous command centered this selection from
+        # this very viewport position then the viewport did not move.
+
+        nav_cursor = self.selection_index.nav_cursor
+
+        if nav_cursor.sel_index == sel_index and nav_cursor.viewport_before == viewport_pos:
+            return False
+
+        # The selection's row of the layout, not its row in the text, which differ with word wrap.
+        sel_layout_pos = self.view.text_to_layout(self.sel_begins[sel_index])[vertical_axis_index]
+        sel_row = sel_layout_pos / self.view.line_height()
+
+        return self.get_viewport().can_be_centered(sel_row)
+
+    # End of def selection_index_can_be_centered()
+
+
+    def scroll_to_first_selection(self):
+        """
+        scroll_to_first_selection() moves the visible region to center on the first selection.
+        """
+
+        sel_index_first = self.get_ordered_index(self.navigation_core.get_first_index())
+        self.scroll_to_selection_index(sel_index_first)
+
+    # End of def scroll_to_first_selection()
+
+
+    def scroll_to_last_selection(self):
+        """
+        scroll_to_last_selection() moves the visible region to center on the last selection.
+        """
+
+        sel_index_last = self.get_ordered_index(self.navigation_core.get_last_index())
+        self.scroll_to_selection_index(sel_index_last)
+
+    # End of def scroll_to_last_selection()
+
+
+    def scroll_to_selection_index(self, sel_index, viewport_pos=None, going_back=False):
+        """
+        scroll_to_selection_index() moves the visible region to center on the selection specified
+        by sel_index and provides user feedback. The vertical viewport_pos is passed if the caller
+        already has it. The navigation cursor is moved to the selection, going_back is true if the
+        selection comes from the cursor's history.
+        """
+
+        # If key repeats are being coalesced the selection is the target of the burst, and if the
+        # first step of the burst is deferred, scrolling is left to the trailing edge.
+
+        if self.coalescer is not None:
+
+            self.coalescer.target = sel_index
+
+            if self.coalescer.defer:
+                self.coalescer.schedule_flush(self.scroller_settings.coalesce_window)
+                return
+
+        # If there is no snapshot of the selection offsets (the scroll_to index op doesn't take one)
+        # a single indexed access gets the selection, the visit can not be recorded without one.
+
+        if self.selection_index is None:
+            sel = self.sels[sel_index]
+            sel_begin = sel.begin()
+            sel_end = sel.end()
+
+        else:
+            sel_begin = self.sel_begins[sel_index]
+            sel_end = self.sel_ends[sel_index]
+
+            # Note the viewport position before centering, this is used to guard against a wrong
+            # prediction in selection_index_can_be_centered().
+            if viewport_pos is None:
+                vertical_axis_index = 1
+                viewport_pos = self.view.viewport_position()[vertical_axis_index]
+
+        # Scroll the visible region to the line the selection begins on. If the user only wants to
+        # scroll to selections which are off the screen, a fully visible selection is marked
+        # instead, so stepping through a dense cluster of selections does not make the whole
+        # viewport jump and repaint on every key press. A region set (the regions_key arg) is not
+        # marked, and an old marker is erased so it can not be taken for the current position.
+
+        if self.scroller_settings.only_scroll_when_offscreen and self.regions_key is None:
+            SelectionMarker.mark(self.view, sel_begin, sel_end)
+
+            if not self.is_point_fully_visible(sel_begin):
+                self.view.show_at_center(sel_begin)
+
+        else:
+            SelectionMarker.erase(self.view)
+            self.view.show_at_center(sel_begin)
+
+        # Move the navigation cursor to the selection, noting the viewport position it produced.
+        if self.selection_index is not None:
+            self.selection_index.nav_cursor.visit(sel_index, viewport_pos,
+                                                  self.view.viewport_position(), going_back)
+
+        # Give user feedback about the current selection scroll position.
+        self.status_message_scroll_to_selection_index(sel_index)
+
+    # End of def scroll_to_selection_index()
+
+
+    def is_point_fully_visible(self, point):
+        """
+        is_point_fully_visible() returns true if the line the text point is on is fully in the
+        viewport with at least a line to spare above and below it. view.visible_region() can not be
+        used, it includes the rows which are only partly visible at the top and the bottom.
+        """
+
+        vertical_axis_index = 1
+        line_height = self.view.line_height()
+        viewport_pos = self.view.viewport_position()[vertical_axis_index]
+        viewport_height = self.view.viewport_extent()[vertical_axis_index]
+        point_layout_pos = self.view.text_to_layout(point)[vertical_axis_index]
+
+        return (point_layout_pos >= viewport_pos + line_height and
+                point_layout_pos + (2 * line_height) <= viewport_pos + viewport_height)
+
+    # End of def is_point_fully_visible()
+
+
+    def control_clearing(self):
+        """
+        control_clearing() controls clearing the selections and leaving a single cursor at the
+        selection specified by the value of the clear_to instance variable, or keeping only the
+        range of selections specified by it.
+        """
+
+        # Clear selections, leave a cursor at the first selection.
+        if self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_FIRST_SEL:
+            sel_index_first = 0
+            self.clear_to_selection_index(sel_index_first)
+
+        # Clear selections, leave a cursor at the last selection.
+        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_LAST_SEL:
+            sel_index_last = self.sels_len - 1
+            self.clear_to_selection_index(sel_index_last)
+
+        # Clear selections, leave a cursor at the selection on/nearest to the middle visible line.
+        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_MIDDLE_SEL:
+            sel_index_nearest_middle_line = self.get_selection_index_nearest_middle_line()
+            self.clear_to_selection_index(sel_index_nearest_middle_line)
+
+        # Clear selections, leave a cursor at the selection last scrolled to (the navigation
+        # cursor's selection), or if none has been visited at the one nearest the middle line.
+        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_LAST_VISITED:
+            sel_index_last_visited = self.get_selection_index_last_visited()
+            self.clear_to_selection_index(sel_index_last_visited)
+
+        # Clear selections, leave a cursor at the end of the middle visible line. This ignores the
+        # position of selections and keeps the current viewport position.
+        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_AREA:
+            self.clear_to_visible_area()
+
+        # Clear the selections which are not (even partly) in the visible region.
+        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_SELS:
+            visible_region = self.view.visible_region()
+            sel_index_begin, sel_index_end = self.navigation_core.get_visible_range(
+                (visible_region.begin(), visible_region.end()))
+            self.clear_to_selection_range(sel_index_begin, sel_index_end, "in visible region")
+
+        # Clear the selections below the middle line, keep those on or above it.
+        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_ABOVE_MIDDLE:
+            middle_line = self.get_middle_line()
+            sel_index_begin, sel_index_end = self.navigation_core.get_above_middle_range(
+                (middle_line.begin(), middle_line.end()))
+            self.clear_to_selection_range(sel_index_begin, sel_index_end, "on/above middle line")
+
+        # Clear the selections above the middle line, keep those on or below it.
+        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_BELOW_MIDDLE:
+            middle_line = self.get_middle_line()
+            sel_index_begin, sel_index_end = self.navigation_core.get_below_middle_range(
+                (middle_line.begin(), middle_line.end()))
+            self.clear_to_selection_range(sel_index_begin, sel_index_end, "on/below middle line")
+
+    # End of def control_clearing()
+
+
+    def clear_to_selection_index(self, sel_index):
+        """
+        clear_to_selection_index() clears the selections and places a single cursor at the selection
+        specified by sel_index and scrolls the visible region to center on that selection.
+        """
+
+        # Get the cursor position of the chosen selection, or the beginning of the chosen region if
+        # the regions_key arg is used.
+        if self.regions_key is None:
+            sel = self.sels[sel_index]
+            cursor_pos = sel.b
+        else:
+            cursor_pos = self.sel_begins[sel_index]
+
+        # Clear the selections and discard the view's cached selection index.
+        self.sels.clear()
+        SelectionIndex.invalidate(self.view.id())
+
+        # Add a new selection at the cursor position.
+        self.sels.add(cursor_pos)
+
+        # Move the view to center on the cursor position.
+        self.view.show_at_center(cursor_pos)
+
+        # Give user feedback about the selection clearing position.
+        self.status_message_clear_to_selection_index(sel_index)
+
+    # End of def clear_to_selection_index()
+
+
+    def clear_to_selection_range(self, sel_index_begin, sel_index_end, range_name):
+        """
+        clear_to_selection_range() clears all the selections except those with an index from
+        sel_index_begin up to (but not including) sel_index_end. The current viewport position is
+        kept. If the range is empty the selections are left alone, since clearing them all would
+        leave no cursor at all.
+        """
+
+        num_kept = sel_index_end - sel_index_begin
+
+        if num_kept <= 0:
+            self.status_message_clear_to_selection_range(0, range_name)
+            return
+
+        # Nothing to clear if the range covers every selection.
+        if num_kept == self.sels_len:
+            self.status_message_clear_to_selection_range(num_kept, range_name)
+            return
+
+        # Get the kept selections, only these are fetched from the selection set.
+        kept_sels = [self.sels[sel_index] for sel_index in range(sel_index_begin, sel_index_end)]
+
+        # Rewrite the selection set in one bulk update, rather than removing each of the cleared
+        # selections with sels.subtract() which is very slow with many selections, and discard the
+        # view's cached selection index.
+
+        self.sels.clear()
+        SelectionIndex.invalidate(self.view.id())
+        self.sels.add_all(kept_sels)
+
+        # Give user feedback about the selections kept.
+        self.status_message_clear_to_selection_range(num_kept, range_name)
+
+    # End of def clear_to_selection_range()
+
+
+    def clear_to_visible_area(self):
+        """
+        clear_to_visible_area() clears the selections and places a single cursor at the end of the
+        middle line in the visible region. This ignores the position of selections and keeps the
+        current viewport position.
+        """
+
+        # Get the region of the middle line.
+        middle_line = self.get_middle_line()
+
+        # Get the row number of the middle line. Note: view.rowcol() returns a tuple.
+        row_index = 0
+        middle_line_row = self.view.rowcol(middle_line.begin())[row_index]
+
+        # Get the position at the end of the middle line (to use as the cursor position).
+        cursor_pos = middle_line.end()
+
+        # Clear the selections and discard the view's cached selection index.
+        self.sels.clear()
+        SelectionIndex.invalidate(self.view.id())
+
+        # Add a new selection at the end of the middle line.
+        self.sels.add(cursor_pos)
+
+        # Give user feedback about the selection clearing position.
+        self.status_message_clear_to_visible_area(middle_line_row)
+
+    # End of def clear_to_visible_area()
+
+
+    def get_selection_index_nearest_middle_line(self):
+        """
+        get_selection_index_nearest_middle_line() returns the index of the selection which is
+        nearest to the middle line of the visible lines. If several selections are on the middle
+        line the one nearest to the horizontal center of the viewport is chosen.
         """
 
         # Get the region of the middle line.
         middle_line = self.get_middle_line()
 
-        # Get the viewport position. [Note: This is used to help with scroll cycling.]
+        # The selection offsets are in (row, column) order, so the NavigationCore finds the
+        # selections which begin on the middle line as a contiguous range by binary search. If
+        # there are any, the nearest is the one nearest to the horizontal center, and no rows need
+        # to be looked up. Otherwise the nearer by rows of the first selection below and the first
+        # selection above the middle line is chosen (the first above if they are equidistant).
+
+        return self.navigation_core.get_nearest_index((middle_line.begin(), middle_line.end()),
+                                                      self.get_horizontal_center_point)
+
+    # End of def get_selection_index_nearest_middle_line()
+
+
+    def get_horizontal_center_point(self):
+        """
+        get_horizontal_center_point() returns the text point on the middle line at the horizontal
+        center of the viewport.
+        """
+
+        horizontal_axis_index = 0
         vertical_axis_index = 1
-        viewport_pos_before_centering = self.view.viewport_position()[vertical_axis_index]
+        viewport_pos = self.view.viewport_position()
+        viewport_extent = self.view.viewport_extent()
 
-        # Starting at the first selection, loop forwards through all the selections looking for the
-        # first selection to occur below the middle line - if found center on that selection.
+        center_layout_pos = (viewport_pos[horizontal_axis_index] +
+                             viewport_extent[horizontal_axis_index] / 2.0,
+                             viewport_pos[vertical_axis_index] +
+                             viewport_extent[vertical_axis_index] / 2.0)
 
-        sel_index = 0
-        found = False
+        return self.view.layout_to_text(center_layout_pos)
+
+    # End of def get_horizontal_center_point()
+
+
+    def get_selection_index_last_visited(self):
+        """
+        get_selection_index_last_visited() returns the index of the selection last scrolled to,
+        i.e. the navigation cursor's selection, even if the view has been scrolled since. If no
+        selection has been scrolled to since the selections last changed the selection nearest to
+        the middle line is returned.
+        """
+
+        sel_index = self.selection_index.nav_cursor.sel_index
+
+        if sel_index is None:
+            return self.get_selection_index_nearest_middle_line()
+
+        return sel_index
+
+    # End of def get_selection_index_last_visited()
+
+
+    def get_middle_line(self):
+        """
+        get_middle_line() returns the region of the middle line of the visible lines.
+        """
+
+        # The middle line is only calculated once per command, all callers share it.
+        if self.middle_line is not None:
+            return self.middle_line
+
+        # IMPORTANT NOTE: It is essential to the operation of this plugin that the middle line
+        # calculated below corresponds exactly, or at least very closely, with the position used by
+        # the Sublime View Class show_at_center() method when centering lines - if it does not then
+        # scrolling can get 'stuck' on a selection.
+        #
+        # show_at_center() places the given line so that it straddles the vertical center of the
+        # viewport, so the middle line is simply the line at that layout position. It is found
+        # directly with view.layout_to_text() which avoids building a list of every visible line
+        # (costly on tall displays), and which is also correct when word wrap is on and the logical
+        # lines of the visible region do not correspond to the rows on the screen - a wrapped line
+        # spanning the vertical center is the middle line whichever of its screen rows is centered.
+
+        # The Viewport class of the navigation core finds the row of the layout at the vertical
+        # center of the viewport, and the view's line table the line of that row.
+        line_table = ViewLineTable(self.view)
+        middle_line = self.get_viewport().get_middle_line(line_table)
+
+        # Set and return the region of the middle line.
+        self.middle_line = sublime.Region(middle_line[0], middle_line[1])
+
+        return self.middle_line
+
+    # End of def get_middle_line()
+
+
+    def get_viewport(self):
+        """
+        get_viewport() returns the navigation core's Viewport of the view, in rows of the layout.
+        """
+
+        vertical_axis_index = 1
+
+        return Viewport.from_layout(self.view.viewport_position()[vertical_axis_index],
+                                    self.view.viewport_extent()[vertical_axis_index],
+                                    self.view.layout_extent()[vertical_axis_index],
+                                    self.view.line_height(),
+                                    self.scroller_settings.scroll_past_end)
+
+    # End of def get_viewport()
+
+
+    def get_target_name(self):
+        """
+        get_target_name() returns what is navigated for the user feedback, "selection" or, if the
+        regions_key arg is used, "region".
+        """
+
+        if self.regions_key is None:
+            return "selection"
+
+        return "region"
+
+    # End of def get_target_name()
+
+
+    def get_order_name(self):
+        """
+        get_order_name() returns the value of the order arg for the navigation order, e.g. "length".
+        """
+
+        if self.order == MultipleSelectionScrollerCommand.ORDER_COLUMN:
+            return "column"
+
+        elif self.order == MultipleSelectionScrollerCommand.ORDER_LENGTH:
+            return "length"
+
+        elif self.order == MultipleSelectionScrollerCommand.ORDER_TEXT:
+            return "text"
+
+        elif self.order == MultipleSelectionScrollerCommand.ORDER_REVERSE:
+            return "reverse"
+
+        return "document"
+
+    # End of def get_order_name()
+
+
+    def status_message_scroll_to_selection_index(self, sel_index):
+        """
+        status_message_scroll_to_selection_index() displays a status message showing the scrolled
+        to selection index number.
+        """
+
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+            return
+
+        # In a navigation order the selection's number is its rank in the order.
+        if self.is_ordered():
+            sel_index = self.order_ranks[sel_index]
+
+        # sel_index is indexed from 0, add 1 for user readability.
+        sel_index += 1
 
-        while sel_index < self.sels_len and not found:
+        # Build and display the user feedback status message.
 
-            sel = self.sels[sel_index]
+        msg = "multiple_selection_scroller - scroll at {0}: {1} of {2}"
+        msg = msg.format(self.get_target_name(), str(sel_index), str(self.sels_len))
 
-            # If a selection is found below the middle line.
-            if sel.begin() > middle_line.end():
+        if self.is_ordered():
+            msg += " ({0} order)".format(self.get_order_name())
 
-                # Scroll the visible region to the line the selection begins on.
-                self.scroll_to_selection_index(sel_index)
+        sublime.status_message(msg)
 
-                # Quit loop.
-                found = True
+    # End of def status_message_scroll_to_selection_index()
 
-            sel_index += 1
 
-        # Don't perform scroll cycling if it has been set to off.
-        if self.scroll_cycling == MultipleSelectionScrollerCommand.SCROLL_CYCLING_OFF:
-            return
+    def status_message_scroll_to_match(self, match):
+        """
+        status_message_scroll_to_match() displays a status message showing the line number of the
+        scrolled to match.
+        """
 
-        # If no selection was found below the middle line, cycle up to the first selection.
-        if not found:
-            self.scroll_to_first_selection()
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
             return
 
-        # IMPORTANT NOTE: Checking to see if the found variable is False can not always be relied
-        # on for scroll cycling because selections below the middle line on the final page of the
-        # buffer do not trigger cycling up to the first selection. This is because of the way
-        # view.show_at_center() behaves; it sensibly centers the given region in the viewport but
-        # this means that selections can still exist below the middle visible line although only on
-        # the final page of the buffer. This is a known design limitation of the plugin, it can not
-        # scroll lower than the first selection below the middle line on the buffer's final page,
-        # but any such selections are guaranteed to be in the visible region, and scroll cycling
-        # can still be achieved by examining the viewport's vertical axis position, so this is a
-        # minor limitation.
-
-        # Check for scroll cycling for selections below the middle line on the last page.
+        # The row is indexed from 0, add 1 to correspond to displayed line numbers.
+        match_row = self.view.rowcol(match[0])[0] + 1
 
-        # Get the viewport position.
-        viewport_pos_after_centering = self.view.viewport_position()[vertical_axis_index]
+        msg = "multiple_selection_scroller - scroll at match on line number: {0}"
+        msg = msg.format(str(match_row))
 
-        # If the viewport's vertical axis position is unchanged, cycle up to the first selection.
-        # i.e. A selection was found below the middle line but the viewport position did not get
-        # changed, so view.show_at_center() did not move the selection's line to the center,
-        # therefore the selection must be below the middle line on the buffer's final page and it
-        # can not be scrolled to, so cycle up to the first selection.
-
-        if viewport_pos_before_centering == viewport_pos_after_centering:
-            self.scroll_to_first_selection()
+        sublime.status_message(msg)
 
-    # End of def scroll_to_next_selection()
+    # End of def status_message_scroll_to_match()
 
 
-    def scroll_to_previous_selection(self):
+    def status_message_no_match(self):
         """
-        scroll_to_previous_selection() moves the visible region to center on the first selection to
-        occur above the middle_line region. If there is no such selection it moves the visible
-        region to center on the last selection (i.e. cycles down to the last selection).
+        status_message_no_match() displays a status message saying that there is no match of the
+        pattern to scroll to.
         """
 
-        # Get the region of the middle line.
-        middle_line = self.get_middle_line()
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+            return
 
-        # Get the viewport position. [Note: This is used to help with scroll cycling.]
-        vertical_axis_index = 1
-        viewport_pos_before_centering = self.view.viewport_position()[vertical_axis_index]
+        if self.scroll_to == MultipleSelectionScrollerCommand.SCROLL_TO_NEXT_MATCH:
+            direction = "below"
+        else:
+            direction = "above"
 
-        # Starting at the last selection, loop backwards through all the selections looking for the
-        # first selection to occur above the middle line - if found center on that selection.
+        if self.scroll_cycling == MultipleSelectionScrollerCommand.SCROLL_CYCLING_ON:
+            msg = "multiple_selection_scroller - no match of: {0}"
+            msg = msg.format(self.pattern)
+        else:
+            msg = "multiple_selection_scroller - no match {0} of: {1}"
+            msg = msg.format(direction, self.pattern)
 
-        sel_index = self.sels_len - 1
-        found = False
+        sublime.status_message(msg)
 
-        while sel_index >= 0 and not found:
+    # End of def status_message_no_match()
 
-            sel = self.sels[sel_index]
 
-            # If a selection is found above the middle line.
-            if sel.end() < middle_line.begin():
+    def status_message_no_previously_visited_selection(self):
+        """
+        status_message_no_previously_visited_selection() displays a status message saying that
+        there is no selection to go back to.
+        """
 
-                # Scroll the visible region to the line the selection begins on.
-                self.scroll_to_selection_index(sel_index)
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+            return
 
-                # Quit loop.
-                found = True
+        msg = "multiple_selection_scroller - no previously visited selection to go back to"
 
-            sel_index -= 1
+        sublime.status_message(msg)
 
-        # Don't perform scroll cycling if it has been set to off.
-        if self.scroll_cycling == MultipleSelectionScrollerCommand.SCROLL_CYCLING_OFF:
-            return
+    # End of def status_message_no_previously_visited_selection()
 
-        # If no selection was found above the middle line, cycle down to the last selection.
-        if not found:
-            self.scroll_to_last_selection()
-            return
 
-        # IMPORTANT NOTE: Checking to see if the found variable is False can not always be relied on
-        # for scroll cycling because selections above the middle line on the first page of the
-        # buffer do not trigger cycling down to the last selection. This is because of the way
-        # view.show_at_center() behaves; it sensibly centers the given region in the viewport but
-        # this means that selections can still exist above the middle visible line although only on
-        # the first page of the buffer. This is a known design limitation of the plugin, it can not
-        # scroll higher than selections on or below the middle line on the buffer's first page, but
-        # any such selections are guaranteed to be in the visible region, and scroll cycling can
-        # still be achieved by examining the viewport's vertical axis position, so this is a minor
-        # limitation.
+    def status_message_drop_failed(self, sel_index):
+        """
+        status_message_drop_failed() displays a status message saying that the selection specified
+        by sel_index could not be dropped.
+        """
 
-        # Check for scroll cycling for selections above the middle line on the first page.
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+            return
 
-        # Get the viewport position.
-        viewport_pos_after_centering = self.view.viewport_position()[vertical_axis_index]
+        # sel_index is indexed from 0, add 1 for user readability.
+        sel_index += 1
 
-        # If the viewport's vertical axis position is unchanged, cycle down to the last selection.
-        # i.e. A selection was found above the middle line but the viewport position did not get
-        # changed, so view.show_at_center() did not move the selection's line to the center,
-        # therefore the selection must be above the middle line on the buffer's first page and it
-        # can not be scrolled to, so cycle down to the last selection.
+        msg = "multiple_selection_scroller - could not drop selection: {0} of {1}"
+        msg = msg.format(str(sel_index), str(self.sels_len))
 
-        if viewport_pos_before_centering == viewport_pos_after_centering:
-            self.scroll_to_last_selection()
+        sublime.status_message(msg)
 
-    # End of def scroll_to_previous_selection()
+    # End of def status_message_drop_failed()
 
 
-    def scroll_to_first_selection(self):
+    def status_message_clear_to_selection_index(self, sel_index):
         """
-        scroll_to_first_selection() moves the visible region to center on the first selection.
+        status_message_clear_to_selection_index() displays a status message showing the cleared at
+        selection index number.
         """
 
-        sel_index_first = 0
-        self.scroll_to_selection_index(sel_index_first)
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+            return
 
-    # End of def scroll_to_first_selection()
+        # sel_index is indexed from 0, add 1 for user readability.
+        sel_index += 1
 
+        # Build and display the user feedback status message.
 
-    def scroll_to_last_selection(self):
-        """
-        scroll_to_last_selection() moves the visible region to center on the last selection.
-        """
+        msg = "multiple_selection_scroller - cleared at {0}: {1} of {2}"
+        msg = msg.format(self.get_target_name(), str(sel_index), str(self.sels_len))
 
-        sel_index_last = self.sels_len - 1
-        self.scroll_to_selection_index(sel_index_last)
+        sublime.status_message(msg)
 
-    # End of def scroll_to_last_selection()
+    # End of def status_message_clear_to_selection_index()
 
 
-    def scroll_to_selection_index(self, sel_index):
+    def status_message_clear_to_visible_area(self, middle_line_row):
         """
-        scroll_to_selection_index() moves the visible region to center on the selection specified
-        by sel_index and provides user feedback.
+        status_message_clear_to_visible_area() displays a status message showing the cleared at
+        line number.
         """
 
-        # Scroll the visible region to the line the selection begins on.
-        sel = self.sels[sel_index]
-        self.view.show_at_center(sel.begin())
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+            return
+
+        # middle_line_row is indexed from 0, add 1 to correspond to displayed line numbers.
+        middle_line_row += 1
 
-        # Give user feedback about the current selection scroll position.
-        self.status_message_scroll_to_selection_index(sel_index)
+        # Build and display the user feedback status message.
 
-    # End of def scroll_to_selection_index()
+        msg = "multiple_selection_scroller - cleared at visible area, line number: {0}"
+        msg = msg.format(str(middle_line_row))
+
+        sublime.status_message(msg)
+
+    # End of def status_message_clear_to_visible_area()
 
 
-    def control_clearing(self):
+    def status_message_clear_to_selection_range(self, num_kept, range_name):
         """
-        control_clearing() controls clearing the selections and leaving a single cursor at the
-        selection specified by the value of the clear_to instance variable.
+        status_message_clear_to_selection_range() displays a status message showing the number of
+        selections kept in the named range.
         """
 
-        # Clear selections, leave a cursor at the first selection.
-        if self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_FIRST_SEL:
-            sel_index_first = 0
-            self.clear_to_selection_index(sel_index_first)
+        # Don't display the status message if the user doesn't want feedback.
+        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+            return
 
-        # Clear selections, leave a cursor at the last selection.
-        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_LAST_SEL:
-            sel_index_last = self.sels_len - 1
-            self.clear_to_selection_index(sel_index_last)
+        # Build and display the user feedback status message.
 
-        # Clear selections, leave a cursor at the selection on/nearest to the middle visible line.
-        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_MIDDLE_SEL:
-            sel_index_nearest_middle_line = self.get_selection_index_nearest_middle_line()
-            self.clear_to_selection_index(sel_index_nearest_middle_line)
+        if num_kept == 0:
+            msg = "multiple_selection_scroller - no selections {0}, none cleared"
+            msg = msg.format(range_name)
 
-        # Clear selections, leave a cursor at the end of the middle visible line. This ignores the
-        # position of selections and keeps the current viewport position.
-        elif self.clear_to == MultipleSelectionScrollerCommand.CLEAR_TO_VISIBLE_AREA:
-            self.clear_to_visible_area()
+        else:
+            msg = "multiple_selection_scroller - kept {0} of {1} selections, {2}"
+            msg = msg.format(str(num_kept), str(self.sels_len), range_name)
 
-    # End of def control_clearing()
+        sublime.status_message(msg)
 
+    # End of def status_message_clear_to_selection_range()
 
-    def clear_to_selection_index(self, sel_index):
-        """
-        clear_to_selection_index() clears the selections and places a single cursor at the selection
-        specified by sel_index and scrolls the visible region to center on that selection.
-        """
+# End of class MultipleSelectionScrollerCommand()
 
-        # Get the cursor position of the chosen selection.
-        sel = self.sels[sel_index]
-        cursor_pos = sel.b
 
-        # Clear the selections.
-        self.sels.clear()
+class MultipleSelectionScrollerOutlineCommand(sublime_plugin.TextCommand):
+    """
+    The MultipleSelectionScrollerOutlineCommand class is a Sublime Text plugin command which opens a
+    quick panel listing every selection as "row: line preview". Highlighting an entry previews the
+    selection, and choosing an entry centers it, both by running the multiple_selection_scroller
+    command with the scroll_to index op. Cancelling the panel restores the original viewport.
+
+    So that opening the panel never freezes the UI, even with 100k+ selections, the entries are
+    built in bounded chunks on the async thread (with sublime.set_timeout_async(), or with
+    sublime.set_timeout() in Sublime Text v.2). The line text is fetched in batches; one
+    view.substr() call for all the lines spanned by a run of selections, rather than one
+    view.substr(view.line(...)) call per selection.
+    """
 
-        # Add a new selection at the cursor position.
-        self.sels.add(cursor_pos)
+    # Holds the number of selections processed per chunk.
+    CHUNK_SIZE                      = 2000
 
-        # Move the view to center on the cursor position.
-        self.view.show_at_center(cursor_pos)
+    # Holds the maximum number of characters fetched by a single batched view.substr() call.
+    MAX_BATCH_CHARS                 = 262144
 
-        # Give user feedback about the selection clearing position.
-        self.status_message_clear_to_selection_index(sel_index)
+    # Holds the maximum number of characters of a line shown in its preview.
+    MAX_PREVIEW_LEN                 = 120
 
-    # End of def clear_to_selection_index()
+    # Holds the generation number of the latest outline build of each view - keyed by view.id().
+    # A build stops if a newer one is started for the same view.
+    generations = {}
 
+    # Holds the function used to schedule the chunks - set_timeout_async() is not available in
+    # Sublime Text v.2.
+    set_timeout_chunk = getattr(sublime, "set_timeout_async", sublime.set_timeout)
 
-    def clear_to_visible_area(self):
+
+    def run(self, edit):
         """
-        clear_to_visible_area() clears the selections and places a single cursor at the end of the
-        middle line in the visible region. This ignores the position of selections and keeps the
-        current viewport position.
+        run() is called when the command is run - it starts building the outline.
         """
 
-        # Get the region of the middle line.
-        middle_line = self.get_middle_line()
+        view_id = self.view.id()
+        generation = MultipleSelectionScrollerOutlineCommand.generations.get(view_id, 0) + 1
+        MultipleSelectionScrollerOutlineCommand.generations[view_id] = generation
 
-        # Get the row number of the middle line. Note: view.rowcol() returns a tuple.
-        row_index = 0
-        middle_line_row = self.view.rowcol(middle_line.begin())[row_index]
+        MultipleSelectionScrollerOutlineCommand.set_timeout_chunk(
+            lambda: self.start_outline(generation), 0)
 
-        # Get the position at the end of the middle line (to use as the cursor position).
-        cursor_pos = middle_line.end()
+    # End of def run()
 
-        # Clear the selections.
-        self.sels.clear()
 
-        # Add a new selection at the end of the middle line.
-        self.sels.add(cursor_pos)
+    def start_outline(self, generation):
+        """
+        start_outline() takes the (possibly cached) snapshot of the selections and builds the
+        first chunk of the outline entries.
+        """
 
-        # Give user feedback about the selection clearing position.
-        self.status_message_clear_to_visible_area(middle_line_row)
+        sels = self.view.sel()
+        sels_len = len(sels)
 
-    # End of def clear_to_visible_area()
+        if sels_len == 0:
+            sublime.status_message("multiple_selection_scroller_outline: there are no selections")
+            return
 
+        selection_index = SelectionIndex.get(self.view, sels, sels_len)
 
-    def get_selection_index_nearest_middle_line(self):
+        self.build_chunk(generation, selection_index, [], 0)
+
+    # End of def start_outline()
+
+
+    def build_chunk(self, generation, selection_index, items, chunk_begin):
         """
-        get_selection_index_nearest_middle_line() returns the index of the selection which is
-        nearest to the middle line of the visible lines.
+        build_chunk() adds the entries of the chunk of selections starting at chunk_begin to items,
+        then schedules the next chunk, or shows the quick panel if all the entries are built.
         """
 
-        # Set the row index of the tuple returned by view.rowcol().
-        row_index = 0
+        # Stop if a newer outline has been started or if the selections have changed.
 
-        # Get the region of the middle line and get its row number.
-        middle_line = self.get_middle_line()
-        middle_line_row = self.view.rowcol(middle_line.begin())[row_index]
+        if MultipleSelectionScrollerOutlineCommand.generations.get(self.view.id()) != generation:
+            return
 
-        # Get the first selection to occur on or below the middle line, its index, and row number.
-        # Note: If no selection on/below the middle line this will be set to the last selection.
-        sel_index_first_below = self.get_selection_index_on_or_below_middle_line(middle_line)
-        sel_first_below = self.sels[sel_index_first_below]
-        sel_row_first_below = self.view.rowcol(sel_first_below.begin())[row_index]
-
-        # Get the first selection to occur on or above the middle line, its index, and row number.
-        # Note: If no selection on/above the middle line this will be set to the first selection.
-        sel_index_first_above = self.get_selection_index_on_or_above_middle_line(middle_line)
-        sel_first_above = self.sels[sel_index_first_above]
-        sel_row_first_above = self.view.rowcol(sel_first_above.begin())[row_index]
-
-        # Calculate the distances from the middle row to the row of the first selection below and
-        # to the first selection above.
-        distance_to_first_below = sel_row_first_below - middle_line_row
-        distance_to_first_above = middle_line_row - sel_row_first_above
-
-        # Convert negative distances to positive (no selection below or above).
-        if distance_to_first_below < 0: distance_to_first_below *= -1
-        if distance_to_first_above < 0: distance_to_first_above *= -1
-
-        # Establish which selection is nearest the middle line and return its index.
-        # Note: If the distances are equidistant the first above is returned.
-        if distance_to_first_above <= distance_to_first_below:
-            return sel_index_first_above
-        else:
-            return sel_index_first_below
+        if SelectionIndex.cache.get(self.view.id()) is not selection_index:
+            sublime.status_message("multiple_selection_scroller_outline: selections changed")
+            return
 
-    # End of def get_selection_index_nearest_middle_line()
+        sels_len = len(selection_index.sel_begins)
+        chunk_end = min(chunk_begin + MultipleSelectionScrollerOutlineCommand.CHUNK_SIZE, sels_len)
 
+        self.add_items(selection_index.sel_begins, chunk_begin, chunk_end, items)
 
-    def get_middle_line(self):
+        if chunk_end < sels_len:
+
+            msg = "multiple_selection_scroller_outline: building outline: {0} of {1}"
+            sublime.status_message(msg.format(str(chunk_end), str(sels_len)))
+
+            MultipleSelectionScrollerOutlineCommand.set_timeout_chunk(
+                lambda: self.build_chunk(generation, selection_index, items, chunk_end), 0)
+            return
+
+        # The quick panel is shown from the main thread.
+        sublime.set_timeout(lambda: self.show_outline(selection_index, items), 0)
+
+    # End of def build_chunk()
+
+
+    def add_items(self, sel_begins, sel_index_begin, sel_index_end, items):
         """
-        get_middle_line() returns the region of the middle line of the visible lines.
+        add_items() adds the entries of the selections from sel_index_begin up to (not including)
+        sel_index_end to items. The text of all the lines spanned by the selections is fetched with
+        a single view.substr() call, unless that would exceed MAX_BATCH_CHARS, in which case the
+        selections are split in two and each half is handled in the same way. A single selection on
+        a line longer than MAX_BATCH_CHARS is previewed from the selection rather than the line.
         """
 
-        # IMPORTANT NOTE: It is essential to the operation of this plugin that the middle line
-        # calculated below corresponds exactly, or at least very closely, with the position used by
-        # the Sublime View Class show_at_center() method when centering lines - if it does not then
-        # scrolling can get 'stuck' on a selection.
-        #
-        # It has been established that subtracting 1 from an odd number of visible lines, before the
-        # division by 2 to get the middle line number, works perfectly. When the number of visible
-        # lines is odd, there will be an equal number of lines above and below the middle line, when
-        # the number of visible lines is even there will be an extra line above. Consider the
-        # following (noting that visible_lines is 0 indexed):
-        #
-        # visible_lines_len = 10    ...    middle_line_index = 10 / 2 = 5
-        # Indexes 0 to 4 == 5 (lines above middle_line)
-        # Indexes 6 to 9 == 4 (lines below middle_line)
-        #
-        # visible_lines_len = 11    ...    middle_line_index = (11 - 1) / 2 = 5
-        # Indexes 0 to 4  == 5 (lines above middle_line)
-        # Indexes 6 to 10 == 5 (lines below middle_line)
-        #
-        # Regardless of this discrepancy it works flawlessly in both Sublime Text 2 and 3; however
-        # getting it right did cause a few minor problems (rounding failed dismally), and a proper
-        # explanation was thought worthy of inclusion to aid future development.
+        first_line = self.view.line(sel_begins[sel_index_begin])
+        last_line = self.view.line(sel_begins[sel_index_end - 1])
+        span_size = last_line.end() - first_line.begin()
 
-        # Get the visible region, the list of visible lines, and the number of visible lines.
+        # Split the selections in two if the span of lines is too long.
 
-        visible_region = self.view.visible_region()
-        visible_lines = self.view.lines(visible_region)
-        visible_lines_len = len(visible_lines)
+        if span_size > MultipleSelectionScrollerOutlineCommand.MAX_BATCH_CHARS:
 
-        # Calculate which line is in the middle of the visible lines.
+            if sel_index_end - sel_index_begin > 1:
+                sel_index_middle = (sel_index_begin + sel_index_end) // 2
+                self.add_items(sel_begins, sel_index_begin, sel_index_middle, items)
+                self.add_items(sel_begins, sel_index_middle, sel_index_end, items)
+                return
 
-        # Subtract 1 from odd numbers only.
-        if visible_lines_len % 2 == 1:
-            visible_lines_len -= 1
+            # A single, very long, line (e.g. of a minified file) - only the text at the selection
+            # is fetched for the preview, and its row is looked up directly.
 
-        middle_line_index = int(visible_lines_len / 2)
+            sel_begin = sel_begins[sel_index_begin]
+            preview_end = min(sel_begin + MultipleSelectionScrollerOutlineCommand.MAX_PREVIEW_LEN,
+                              last_line.end())
 
-        # Return the region of the middle line.
-        middle_line = visible_lines[middle_line_index]
+            line_text = self.view.substr(sublime.Region(sel_begin, preview_end)).strip()
 
-        return middle_line
+            row_index = 0
+            row = self.view.rowcol(sel_begin)[row_index]
 
-    # End of def get_middle_line()
+            # Rows are indexed from 0, add 1 to correspond to displayed line numbers.
+            items.append("{0}: {1}".format(str(row + 1), line_text))
+            return
 
+        # Fetch the text of the lines and the row of the first line, then find where each of the
+        # lines starts in the text.
 
-    def get_selection_index_on_or_below_middle_line(self, middle_line):
-        """
-        get_selection_index_on_or_below_middle_line() returns the index of the selection that is
-        either on or the first to occur below the middle line. If there is no selection on/below
-        the middle line then the index of the last selection is returned.
-        """
+        span_begin = first_line.begin()
+        text = self.view.substr(sublime.Region(span_begin, span_begin + span_size))
 
-        # Starting at the first selection, loop forwards through all the selections looking for the
-        # first selection to occur on or below the middle line.
+        row_index = 0
+        first_row = self.view.rowcol(span_begin)[row_index]
 
-        sel_index = 0
-        found = False
+        line_starts = [0]
+        newline_pos = text.find("\n")
 
-        while sel_index < self.sels_len and not found:
+        while newline_pos != -1:
+            line_starts.append(newline_pos + 1)
+            newline_pos = text.find("\n", newline_pos + 1)
 
-            sel_index_first_on_or_below_or_last = sel_index
+        line_starts.append(len(text) + 1)
 
-            sel = self.sels[sel_index]
+        # Add the entry of each selection.
 
-            # If a selection is found on or below the middle line, quit loop.
-            if sel.begin() >= middle_line.begin():
-                found = True
+        for sel_index in range(sel_index_begin, sel_index_end):
 
-            sel_index += 1
+            line_index = bisect.bisect_right(line_starts, sel_begins[sel_index] - span_begin) - 1
 
-        # The first selection to be found on or below the middle line is returned. If there is no
-        # such selection then the last selection is returned.
+            line_text = text[line_starts[line_index]:line_starts[line_index + 1] - 1]
+            line_text = line_text.strip()[:MultipleSelectionScrollerOutlineCommand.MAX_PREVIEW_LEN]
 
-        return sel_index_first_on_or_below_or_last
+            # Rows are indexed from 0, add 1 to correspond to displayed line numbers.
+            items.append("{0}: {1}".format(str(first_row + line_index + 1), line_text))
 
-    # End of def get_selection_index_on_or_below_middle_line()
+    # End of def add_items()
 
 
-    def get_selection_index_on_or_above_middle_line(self, middle_line):
+    def show_outline(self, selection_index, items):
         """
-        get_selection_index_on_or_above_middle_line() returns the index of the selection that is
-        either on or the first to occur above the middle line. If there is no selection on/above
-        the middle line then the index of the first selection is returned.
+        show_outline() shows the quick panel of the outline entries, initially highlighting the
+        first selection on the screen.
         """
 
-        # Starting at the last selection, loop backwards through all the selections looking for the
-        # first selection to occur on or above the middle line.
+        window = self.view.window()
 
-        sel_index = self.sels_len - 1
-        found = False
+        if window is None:
+            return
 
-        while sel_index >= 0 and not found:
+        view = self.view
+        viewport_pos = view.viewport_position()
 
-            sel_index_first_on_or_above_or_first = sel_index
+        visible_region = view.visible_region()
+        selected_index = bisect.bisect_left(selection_index.sel_begins, visible_region.begin())
+        selected_index = min(selected_index, len(items) - 1)
 
-            sel = self.sels[sel_index]
+        def scroll_to(sel_index):
+            # The index arg is counted from 1.
+            view.run_command("multiple_selection_scroller",
+                             {"scroll_to": "index", "index": sel_index + 1})
 
-            # If a selection is found on or above the middle line, quit loop.
-            if sel.begin() <= middle_line.end():
-                found = True
+        def on_done(sel_index):
+            if sel_index == -1:
+                view.set_viewport_position(viewport_pos, False)
+            else:
+                scroll_to(sel_index)
 
-            sel_index -= 1
+        def on_highlight(sel_index):
+            scroll_to(sel_index)
 
-        # The first selection to be found on or above the middle line is returned. If there is no
-        # such selection then the first selection is returned.
+        # Sublime Text v.2 does not support the selected_index and on_highlight args.
 
-        return sel_index_first_on_or_above_or_first
+        try:
+            window.show_quick_panel(items, on_done, 0, selected_index, on_highlight)
+        except TypeError:
+            window.show_quick_panel(items, on_done)
 
-    # End of def get_selection_index_on_or_above_middle_line()
+    # End of def show_outline()
 
+# End of class MultipleSelectionScrollerOutlineCommand()
 
-    def status_message_scroll_to_selection_index(self, sel_index):
+
+class MultipleSelectionScrollerStatsCommand(sublime_plugin.ApplicationCommand):
+    """
+    The MultipleSelectionScrollerStatsCommand class is a Sublime Text plugin command which prints
+    the aggregates of the recorded multiple_selection_scroller invocations to the console, grouped
+    by command args. The invocations are only recorded if the "MultipleSelectionScroller.instrument"
+    setting is true. Comparing the show_at_center phase with the others shows whether slowness on a
+    given file comes from the plugin or from the editor's repaint.
+    """
+
+    def run(self):
         """
-        status_message_scroll_to_selection_index() displays a status message showing the scrolled
-        to selection index number.
+        run() is called when the command is run - it prints the aggregates to the console.
         """
 
-        # Don't display the status message if the user doesn't want feedback.
-        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
+        records = list(CommandInstrument.records)
+
+        if not records:
+            msg = "multiple_selection_scroller_stats: no invocations recorded"
+            msg += " (is the MultipleSelectionScroller.instrument setting true?)"
+            print(msg)
+            sublime.status_message(msg)
             return
 
-        # sel_index is indexed from 0, add 1 for user readability.
-        sel_index += 1
+        # Group the records by command args, keeping the order in which they first occurred.
 
-        # Build and display the user feedback status message.
+        labels = []
+        records_by_label = {}
 
-        msg = "multiple_selection_scroller - scroll at selection: {0} of {1}"
-        msg = msg.format(str(sel_index), str(self.sels_len))
+        for record in records:
+            if record["command"] not in records_by_label:
+                labels.append(record["command"])
+                records_by_label[record["command"]] = []
+            records_by_label[record["command"]].append(record)
 
-        sublime.status_message(msg)
+        lines = ["multiple_selection_scroller_stats: {0} recent invocations (at most {1} kept)"
+                 .format(len(records), CommandInstrument.MAX_RECORDS)]
 
-    # End of def status_message_scroll_to_selection_index()
+        for label in labels:
+            lines.extend(self.get_label_lines(label, records_by_label[label]))
 
+        print("\n".join(lines))
+        sublime.status_message("multiple_selection_scroller_stats: see console")
 
-    def status_message_clear_to_selection_index(self, sel_index):
+    # End of def run()
+
+
+    def get_label_lines(self, label, records):
         """
-        status_message_clear_to_selection_index() displays a status message showing the cleared at
-        selection index number.
+        get_label_lines() returns the console lines of the aggregates of one group of records.
         """
 
-        # Don't display the status message if the user doesn't want feedback.
-        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
-            return
+        num_records = len(records)
+        sels_lens = [record["sels_len"] for record in records]
 
-        # sel_index is indexed from 0, add 1 for user readability.
-        sel_index += 1
+        lines = ["", "{0} - runs: {1}, selections: mean {2:.0f}, max {3}".format(
+                 label, num_records, sum(sels_lens) / float(num_records), max(sels_lens))]
 
-        # Build and display the user feedback status message.
+        lines.append("    {0:<16} {1:>10} {2:>10} {3:>10}".format(
+                     "phase", "mean ms", "p95 ms", "max ms"))
 
-        msg = "multiple_selection_scroller - cleared at selection: {0} of {1}"
-        msg = msg.format(str(sel_index), str(self.sels_len))
+        for phase in CommandInstrument.PHASES + ("total",):
 
-        sublime.status_message(msg)
+            if phase == "total":
+                times = [sum(record[name] for name in CommandInstrument.PHASES)
+                         for record in records]
+            else:
+                times = [record[phase] for record in records]
 
-    # End of def status_message_clear_to_selection_index()
+            times = sorted(time_taken * 1000.0 for time_taken in times)
+            p95_index = int(round(0.95 * (num_records - 1)))
 
+            lines.append("    {0:<16} {1:>10.3f} {2:>10.3f} {3:>10.3f}".format(
+                         phase, sum(times) / num_records, times[p95_index], times[-1]))
 
-    def status_message_clear_to_visible_area(self, middle_line_row):
-        """
-        status_message_clear_to_visible_area() displays a status message showing the cleared at
-        line number.
-        """
+        api_calls = ["{0}() {1:.1f}".format(api_call, sum(record[api_call] for record in records) /
+                     float(num_records)) for api_call in CommandInstrument.API_CALLS]
 
-        # Don't display the status message if the user doesn't want feedback.
-        if self.user_feedback == MultipleSelectionScrollerCommand.FEEDBACK_QUIET:
-            return
+        lines.append("    api calls per run (mean): " + ", ".join(api_calls))
 
-        # middle_line_row is indexed from 0, add 1 to correspond to displayed line numbers.
-        middle_line_row += 1
+        return lines
 
-        # Build and display the user feedback status message.
+    # End of def get_label_lines()
 
-        msg = "multiple_selection_scroller - cleared at visible area, line number: {0}"
-        msg = msg.format(str(middle_line_row))
+# End of class MultipleSelectionScrollerStatsCommand()
 
-        sublime.status_message(msg)
 
-    # End of def status_message_clear_to_visible_area()
+class MultipleSelectionScrollerListener(sublime_plugin.EventListener):
+    """
+    The MultipleSelectionScrollerListener class discards a view's cached SelectionIndex whenever its
+    selections are modified (other than by the plugin itself), or when the view is closed (when its
+    cached ScrollerSettings are also discarded). In Sublime Text v.3 the async event hooks schedule
+    a background build of the SelectionIndex, see the SelectionIndexBuilder class, and the cached
+    index of the bookmarks is discarded when they are toggled or cleared, see the RegionSetIndex
+    class. The marker of the selection last scrolled to is erased when the selections are modified,
+    see the SelectionMarker class.
+    """
 
-# End of class MultipleSelectionScrollerCommand()
+    def on_selection_modified(self, view):
+        SelectionIndexBuilder.cancel(view.id())
+        SelectionIndex.selection_modified(view)
+        SelectionMarker.selection_modified(view)
+
+    def on_modified(self, view):
+        SelectionIndexBuilder.cancel(view.id())
+
+    def on_selection_modified_async(self, view):
+        SelectionIndexBuilder.schedule(view)
+
+    def on_modified_async(self, view):
+        SelectionIndexBuilder.schedule(view)
+
+    def on_post_text_command(self, view, command_name, args):
+        regions_key = RegionSetIndex.REGION_COMMANDS.get(command_name)
+        if regions_key is not None:
+            RegionSetIndex.invalidate(view.id(), regions_key)
+
+    def on_close(self, view):
+        SelectionIndexBuilder.cancel(view.id())
+        SelectionIndexBuilder.generations.pop(view.id(), None)
+        SelectionIndex.invalidate(view.id())
+        ScrollerSettings.discard(view)
+        ScrollCoalescer.cache.pop(view.id(), None)
+        MatchCache.cache.pop(view.id(), None)
+        RegionSetIndex.invalidate(view.id())
+        SelectionMarker.marked.discard(view.id())
 
+# End of class MultipleSelectionScrollerListener()
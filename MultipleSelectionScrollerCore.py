@@ -0,0 +1,561 @@
+#
+# Name:           MultipleSelectionScrollerCore
+#
+# File:           MultipleSelectionScrollerCore.py
+#
+# Requirements:   Python 2.6+ or 3.3+ (the 'sublime' module is NOT needed)
+#
+# Purpose:        The editor independent navigation logic of the multiple_selection_scroller
+#                 command. MultipleSelectionScrollerCommand delegates its decisions (which selection
+#                 is next, previous, first, last, nearest the middle line, and which selections to
+#                 keep when clearing) to the NavigationCore class, so that the algorithms can be
+#                 profiled, tested, and optimised without Sublime Text.
+#
+#                 The core works on plain data: the sorted selection begin and end offsets, a line
+#                 start table (the LineTable class, or any object with the same get_row() and
+#                 get_line() methods), and a viewport given as a top row and a row count (the
+#                 Viewport class), from which the middle line and whether centering a selection
+#                 moves the viewport are found. Lines and regions are (begin, end) tuples of text
+#                 offsets.
+#
+# Example:        line_table = LineTable.from_text(text)
+#                 core = NavigationCore([10, 250], [12, 250], line_table)
+#                 viewport = Viewport(top_row=0, row_count=40, num_rows=line_table.get_num_rows())
+#                 middle_line = core.get_middle_line(viewport)
+#                 sel_index = core.get_next_index(middle_line, can_be_centered=lambda sel_index:
+#                                                 core.can_be_centered(sel_index, viewport))
+#
+
+
+import bisect
+
+
+class LineTable(object):
+    """
+    The LineTable class is a line start table; the text offset at which each line (row) begins.
+    """
+
+    def __init__(self, line_starts, text_len):
+        """
+        __init__() takes the ascending list of line start offsets (the first is always 0) and the
+        length of the text.
+        """
+
+        self.line_starts = line_starts
+        self.text_len = text_len
+
+    # End of def __init__()
+
+
+    @staticmethod
+    def from_text(text):
+        """
+        from_text() returns the LineTable of the text.
+        """
+
+        line_starts = [0]
+        line_start = text.find("\n")
+
+        while line_start != -1:
+            line_starts.append(line_start + 1)
+            line_start = text.find("\n", line_start + 1)
+
+        return LineTable(line_starts, len(text))
+
+    # End of def from_text()
+
+
+    def get_num_rows(self):
+        """
+        get_num_rows() returns the number of lines.
+        """
+
+        return len(self.line_starts)
+
+    # End of def get_num_rows()
+
+
+    def get_row(self, point):
+        """
+        get_row() returns the row of the line that the text point is on.
+        """
+
+        return bisect.bisect_right(self.line_starts, point) - 1
+
+    # End of def get_row()
+
+
+    def get_line(self, row):
+        """
+        get_line() returns the line at row as a (begin, end) tuple, not including the newline. Rows
+        beyond the first/last line are clamped to it.
+        """
+
+        row = max(0, min(row, len(self.line_starts) - 1))
+
+        line_begin = self.line_starts[row]
+
+        if row + 1 < len(self.line_starts):
+            line_end = self.line_starts[row + 1] - 1
+        else:
+            line_end = self.text_len
+
+        return (line_begin, line_end)
+
+    # End of def get_line()
+
+# End of class LineTable()
+
+
+class Viewport(object):
+    """
+    The Viewport class is the visible part of the text in rows; the (possibly fractional) row at
+    the top of the viewport, the number of rows which fit in it, and the number of rows of the
+    text. The viewport can be scrolled from the top of the text down to where the last row is at
+    the top of the viewport (scroll_past_end), or at its bottom.
+    """
+
+    def __init__(self, top_row, row_count, num_rows, scroll_past_end=True):
+        """
+        __init__() takes the top row, the row count, the number of rows of the text, and whether
+        the text can be scrolled past its end.
+        """
+
+        self.top_row = top_row
+        self.row_count = row_count
+        self.num_rows = num_rows
+        self.scroll_past_end = scroll_past_end
+
+    # End of def __init__()
+
+
+    @staticmethod
+    def from_layout(viewport_pos, viewport_height, layout_height, line_height, scroll_past_end):
+        """
+        from_layout() returns the Viewport of a vertical viewport position and height, and layout
+        height, given in layout units (e.g. pixels) of line_height per row.
+        """
+
+        return Viewport(viewport_pos / float(line_height), viewport_height / float(line_height),
+                        layout_height / float(line_height), scroll_past_end)
+
+    # End of def from_layout()
+
+
+    def get_middle_row(self):
+        """
+        get_middle_row() returns the row at the vertical center of the viewport, the row that
+        centering a line places it on.
+        """
+
+        return int(self.top_row + self.row_count / 2.0)
+
+    # End of def get_middle_row()
+
+
+    def get_middle_line(self, line_table):
+        """
+        get_middle_line() returns the line at the vertical center of the viewport as a (begin, end)
+        tuple, looked up in the line table.
+        """
+
+        return line_table.get_line(self.get_middle_row())
+
+    # End of def get_middle_line()
+
+
+    def get_centered_top_row(self, row):
+        """
+        get_centered_top_row() returns the top row of the viewport once the row has been centered;
+        the row straddles the vertical center, clamped between the top of the text and the lowest
+        position the viewport can be scrolled to.
+        """
+
+        if self.scroll_past_end:
+            max_top_row = self.num_rows - 1
+        else:
+            max_top_row = self.num_rows - self.row_count
+
+        centered_top_row = row + 0.5 - self.row_count / 2.0
+
+        return max(0, min(centered_top_row, max_top_row))
+
+    # End of def get_centered_top_row()
+
+
+    def can_be_centered(self, row):
+        """
+        can_be_centered() returns true if centering the row would move the viewport by at least
+        half a row. A smaller movement is not treated as centering, otherwise a row just below/above
+        the lowest/highest position would be 'nudged' repeatedly.
+        """
+
+        return abs(self.get_centered_top_row(row) - self.top_row) >= 0.5
+
+    # End of def can_be_centered()
+
+# End of class Viewport()
+
+
+class NavigationCore(object):
+    """
+    The NavigationCore class makes the navigation decisions of the multiple_selection_scroller
+    command from the sorted selection begin and end offsets. Selections never overlap, so both
+    lists are in ascending (row, column) order and every search is a binary search.
+
+    The methods which scroll take the middle line as a (begin, end) tuple, and return the index of
+    the selection to center, or None if there is nothing to do.
+
+    All searches of the offsets go through the bisect_*() methods.
+    """
+
+    def __init__(self, sel_begins, sel_ends, line_table, scroll_cycling=True):
+        """
+        __init__() takes the lists of the selection begin and end offsets (not copied, they may be
+        updated in place), the line table, and whether scroll cycling is on.
+        """
+
+        self.sel_begins = sel_begins
+        self.sel_ends = sel_ends
+        self.line_table = line_table
+        self.scroll_cycling = scroll_cycling
+
+    # End of def __init__()
+
+
+    def drop_selection(self, sel_index):
+        """
+        drop_selection() deletes the selection at sel_index from the offsets, after it has been
+        removed from the view. The lists are shared, so the caller's lists are updated too.
+        """
+
+        del self.sel_begins[sel_index]
+        del self.sel_ends[sel_index]
+
+    # End of def drop_selection()
+
+
+    def bisect_begins_left(self, point, lo=0, hi=None):
+        """
+        bisect_begins_left() returns the index of the first selection which begins at or after the
+        point, searching from lo up to (but not including) hi.
+        """
+
+        if hi is None:
+            hi = len(self.sel_begins)
+
+        return bisect.bisect_left(self.sel_begins, point, lo, hi)
+
+    # End of def bisect_begins_left()
+
+
+    def bisect_begins_right(self, point):
+        """
+        bisect_begins_right() returns the index of the first selection which begins after the point.
+        """
+
+        return bisect.bisect_right(self.sel_begins, point)
+
+    # End of def bisect_begins_right()
+
+
+    def bisect_ends_left(self, point):
+        """
+        bisect_ends_left() returns the index of the first selection which ends at or after the
+        point.
+        """
+
+        return bisect.bisect_left(self.sel_ends, point)
+
+    # End of def bisect_ends_left()
+
+
+    def get_sels_len(self):
+        """
+        get_sels_len() returns the number of selections.
+        """
+
+        return len(self.sel_begins)
+
+    # End of def get_sels_len()
+
+
+    def get_middle_line(self, viewport):
+        """
+        get_middle_line() returns the line at the vertical center of the viewport.
+        """
+
+        return viewport.get_middle_line(self.line_table)
+
+    # End of def get_middle_line()
+
+
+    def can_be_centered(self, sel_index, viewport):
+        """
+        can_be_centered() returns true if centering the selection specified by sel_index would move
+        the viewport by at least half a row, taking the row it begins on from the line table.
+        """
+
+        return viewport.can_be_centered(self.line_table.get_row(self.sel_begins[sel_index]))
+
+    # End of def can_be_centered()
+
+
+    def get_next_index(self, middle_line, count=1, can_be_centered=None):
+        """
+        get_next_index() returns the index of the first selection to occur below the middle line,
+        moved forwards by count. If there is no such selection, or it can not be centered, the
+        next selection is the first (cycling), or there is none (None) if scroll cycling is off.
+        can_be_centered is called with a selection index, if it is None every selection is taken
+        to be centerable.
+        """
+
+        sels_len = self.get_sels_len()
+
+        # The first selection which begins after the end of the middle line.
+        sel_index = self.bisect_begins_right(middle_line[1])
+        found = sel_index < sels_len
+
+        # Without scroll cycling move forwards by count, no further than the last selection.
+        if not self.scroll_cycling:
+            if not found:
+                return None
+            return min(sel_index + count - 1, sels_len - 1)
+
+        # Selections below the middle line on the last page may not be able to be centered, then
+        # cycle up to the first selection.
+        if not found or (can_be_centered is not None and not can_be_centered(sel_index)):
+            sel_index = sels_len
+
+        # Moving forwards by count, cycling as often as needed, is done arithmetically.
+        return (sel_index + count - 1) % sels_len
+
+    # End of def get_next_index()
+
+
+    def get_previous_index(self, middle_line, count=1, can_be_centered=None):
+        """
+        get_previous_index() returns the index of the first selection to occur above the middle
+        line, moved backwards by count. If there is no such selection, or it can not be centered,
+        the previous selection is the last (cycling), or there is none (None) if scroll cycling is
+        off. can_be_centered is as for get_next_index().
+        """
+
+        sels_len = self.get_sels_len()
+
+        # The last selection which ends before the beginning of the middle line.
+        sel_index = self.bisect_ends_left(middle_line[0]) - 1
+        found = sel_index >= 0
+
+        # Without scroll cycling move backwards by count, no further than the first selection.
+        if not self.scroll_cycling:
+            if not found:
+                return None
+            return max(sel_index - count + 1, 0)
+
+        # Selections above the middle line on the first page can not be centered, then cycle down
+        # to the last selection.
+        if not found or (can_be_centered is not None and not can_be_centered(sel_index)):
+            sel_index = -1
+
+        # Moving backwards by count, cycling as often as needed, is done arithmetically.
+        return (sel_index - count + 1) % sels_len
+
+    # End of def get_previous_index()
+
+
+    def get_first_index(self):
+        """
+        get_first_index() returns the index of the first selection.
+        """
+
+        return 0
+
+    # End of def get_first_index()
+
+
+    def get_last_index(self):
+        """
+        get_last_index() returns the index of the last selection.
+        """
+
+        return self.get_sels_len() - 1
+
+    # End of def get_last_index()
+
+
+    def get_next_page_index(self, visible_region):
+        """
+        get_next_page_index() returns the index of the first selection to occur below the visible
+        region, or the first selection (cycling) or None if there is no such selection.
+        """
+
+        sel_index = self.bisect_begins_right(visible_region[1])
+
+        if sel_index < self.get_sels_len():
+            return sel_index
+
+        return self.get_first_index() if self.scroll_cycling else None
+
+    # End of def get_next_page_index()
+
+
+    def get_previous_page_index(self, visible_region):
+        """
+        get_previous_page_index() returns the index of the first selection to occur above the
+        visible region, or the last selection (cycling) or None if there is no such selection.
+        """
+
+        sel_index = self.bisect_ends_left(visible_region[0]) - 1
+
+        if sel_index >= 0:
+            return sel_index
+
+        return self.get_last_index() if self.scroll_cycling else None
+
+    # End of def get_previous_page_index()
+
+
+    def get_stepped_index(self, sel_index, step):
+        """
+        get_stepped_index() returns the index step selections on from sel_index, cycling if scroll
+        cycling is on, otherwise no further than the first/last selection.
+        """
+
+        sels_len = self.get_sels_len()
+
+        if self.scroll_cycling:
+            return (sel_index + step) % sels_len
+
+        return max(0, min(sel_index + step, sels_len - 1))
+
+    # End of def get_stepped_index()
+
+
+    def get_index_on_or_below(self, middle_line):
+        """
+        get_index_on_or_below() returns the index of the first selection which begins on or below
+        the middle line, or the index of the last selection if there is none.
+        """
+
+        sel_index = self.bisect_begins_left(middle_line[0])
+
+        return min(sel_index, self.get_sels_len() - 1)
+
+    # End of def get_index_on_or_below()
+
+
+    def get_index_on_or_above(self, middle_line):
+        """
+        get_index_on_or_above() returns the index of the last selection which begins on or above
+        the middle line, or the index of the first selection if there is none.
+        """
+
+        sel_index = self.bisect_begins_right(middle_line[1]) - 1
+
+        return max(sel_index, 0)
+
+    # End of def get_index_on_or_above()
+
+
+    def get_nearest_index(self, middle_line, get_center_point):
+        """
+        get_nearest_index() returns the index of the selection nearest to the middle line. Of the
+        selections which begin on the middle line the one nearest to the horizontal center is
+        chosen, get_center_point is called (only then) to get the text point on the middle line at
+        the horizontal center. Otherwise the nearer by rows of the first selection below and the
+        last selection above is chosen, the one above if they are equidistant.
+        """
+
+        # The selections which begin on the middle line are a contiguous range.
+
+        sel_index_begin = self.bisect_begins_left(middle_line[0])
+        sel_index_end = self.bisect_begins_right(middle_line[1])
+
+        if sel_index_begin < sel_index_end:
+            return self.get_index_nearest_point(sel_index_begin, sel_index_end,
+                                                get_center_point())
+
+        get_row = self.line_table.get_row
+
+        middle_line_row = get_row(middle_line[0])
+
+        sel_index_first_below = self.get_index_on_or_below(middle_line)
+        sel_index_first_above = self.get_index_on_or_above(middle_line)
+
+        distance_to_first_below = abs(get_row(self.sel_begins[sel_index_first_below]) -
+                                      middle_line_row)
+        distance_to_first_above = abs(middle_line_row -
+                                      get_row(self.sel_begins[sel_index_first_above]))
+
+        if distance_to_first_above <= distance_to_first_below:
+            return sel_index_first_above
+        else:
+            return sel_index_first_below
+
+    # End of def get_nearest_index()
+
+
+    def get_index_nearest_point(self, sel_index_begin, sel_index_end, point):
+        """
+        get_index_nearest_point() returns the index of the selection, of the selections from
+        sel_index_begin up to (but not including) sel_index_end which all begin on the same line,
+        that begins nearest to the point. On the same line the distance between offsets is the
+        distance between columns. If equidistant the one on the left is chosen.
+        """
+
+        sel_index = self.bisect_begins_left(point, sel_index_begin, sel_index_end)
+
+        if sel_index == sel_index_end:
+            return sel_index_end - 1
+
+        if sel_index == sel_index_begin:
+            return sel_index_begin
+
+        distance_to_right = self.sel_begins[sel_index] - point
+        distance_to_left = point - self.sel_begins[sel_index - 1]
+
+        if distance_to_left <= distance_to_right:
+            return sel_index - 1
+        else:
+            return sel_index
+
+    # End of def get_index_nearest_point()
+
+
+    def get_visible_range(self, visible_region):
+        """
+        get_visible_range() returns the (begin, end) index range of the selections which are in,
+        or partly in, the visible region.
+        """
+
+        sel_index_begin = self.bisect_ends_left(visible_region[0])
+        sel_index_end = self.bisect_begins_right(visible_region[1])
+
+        return (sel_index_begin, max(sel_index_begin, sel_index_end))
+
+    # End of def get_visible_range()
+
+
+    def get_above_middle_range(self, middle_line):
+        """
+        get_above_middle_range() returns the (begin, end) index range of the selections which begin
+        on or above the middle line.
+        """
+
+        return (0, self.bisect_begins_right(middle_line[1]))
+
+    # End of def get_above_middle_range()
+
+
+    def get_below_middle_range(self, middle_line):
+        """
+        get_below_middle_range() returns the (begin, end) index range of the selections which end
+        on or below the middle line.
+        """
+
+        return (self.bisect_ends_left(middle_line[0]), self.get_sels_len())
+
+    # End of def get_below_middle_range()
+
+# End of class NavigationCore()
@@ -0,0 +1,230 @@
+#
+# Name:           bench_scroller
+#
+# File:           benchmarks/bench_scroller.py
+#
+# Requirements:   Python 2.7+ or 3.3+ (no Sublime Text needed)
+#
+# Purpose:        Headless benchmark of the multiple_selection_scroller command. It drives
+#                 MultipleSelectionScrollerCommand.run() against the stand-in 'sublime' module in
+#                 this directory, for every scroll_to and clear_to value, over a matrix of buffer
+#                 sizes and selection counts. For each command it reports latency percentiles and
+#                 the mean number of API calls made, so that regressions in the hot paths show up
+#                 as numbers.
+#
+# Usage:          python benchmarks/bench_scroller.py                  (full matrix)
+#                 python benchmarks/bench_scroller.py --quick          (small matrix)
+#                 python benchmarks/bench_scroller.py --lines 100000 --sels 1000 50000 --repeat 100
+#                 python benchmarks/bench_scroller.py --quick --profile-dir /tmp/profiles
+#                                         (also write a .pstats file per run, named as the plugin's
+#                                          profile setting names them, latencies include profiling)
+#                 python benchmarks/bench_scroller.py --quick --only-scroll-when-offscreen
+#                                         (turn the plugin's only_scroll_when_offscreen setting on,
+#                                          the show_at_center column shows the scrolls saved)
+#
+
+
+import argparse
+import os
+import random
+import sys
+import time
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+# The stand-in 'sublime' and 'sublime_plugin' modules must be found before the plugin is imported.
+sys.path.insert(0, PACKAGE_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import sublime                      # noqa: E402 (the stand-in)
+import MultipleSelectionScroller    # noqa: E402
+
+
+SCROLL_TO_VALUES = ["next_sel", "previous_sel", "first_sel", "last_sel", "next_page_sel",
+                    "previous_page_sel", "index", "drop_and_next", "drop_and_previous",
+                    "back", "next_match", "previous_match"]
+CLEAR_TO_VALUES = ["first_sel", "last_sel", "middle_sel", "visible_area", "visible_sels",
+                   "above_middle", "below_middle", "last_visited"]
+
+# Extra args for the scroll_to and clear_to values which need them.
+EXTRA_ARGS = {"index": {"index": "50%"},
+              "next_match": {"pattern": "lorem"},
+              "previous_match": {"pattern": "lorem"}}
+
+# The API calls which are shown individually in the report (all calls are in the total).
+REPORTED_CALLS = ["sel.__getitem__", "rowcol", "lines", "show_at_center"]
+
+FULL_LINES = [1000, 100000, 2000000]
+FULL_SELS = [1, 1000, 100000, 500000]
+QUICK_LINES = [1000, 20000]
+QUICK_SELS = [1, 1000, 10000]
+
+LINE_LENGTH = 40
+MAX_SELS_PER_LINE = 10
+
+
+def make_text(num_lines):
+    """
+    make_text() returns a buffer of num_lines lines, each LINE_LENGTH characters long.
+    """
+
+    line = "{0:<" + str(LINE_LENGTH) + "}"
+    return "\n".join(line.format("line {0} lorem ipsum dolor".format(row))
+                     for row in range(num_lines))
+
+
+def make_selections(view, num_sels):
+    """
+    make_selections() returns num_sels sorted, non overlapping regions spread evenly over the
+    lines of the view, up to MAX_SELS_PER_LINE regions on a line.
+    """
+
+    num_lines = len(view.line_starts)
+    regions = []
+
+    for sel_index in range(num_sels):
+        position = sel_index * num_lines * MAX_SELS_PER_LINE // num_sels
+        row = position // MAX_SELS_PER_LINE
+        col = (position % MAX_SELS_PER_LINE) * 3
+        begin = view.line_starts[row] + col
+        regions.append(sublime.Region(begin, begin + 2))
+
+    return regions
+
+
+def percentile(sorted_values, pct):
+    """
+    percentile() returns the nearest-rank percentile of a sorted list.
+    """
+
+    if not sorted_values:
+        return 0.0
+
+    rank = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+def bench_command(view, regions, args, repeat, rng):
+    """
+    bench_command() runs the command repeat times with args, restoring the selections before each
+    clear_to run, and returns the list of latencies (in ms) and the dict of total API calls.
+    """
+
+    latencies = []
+    calls = {}
+    max_viewport_pos = max(view._max_top(), 0.0)
+
+    for _ in range(repeat):
+
+        # Restoring the selections and the viewport is not timed.
+        if "clear_to" in args:
+            view.selection.set_regions_unchecked(regions)
+            view.viewport = (0.0, rng.uniform(0.0, max_viewport_pos))
+
+        view.reset_calls()
+        command = MultipleSelectionScroller.MultipleSelectionScrollerCommand(view)
+
+        start = time.perf_counter() if hasattr(time, "perf_counter") else time.time()
+        command.run(None, **args)
+        end = time.perf_counter() if hasattr(time, "perf_counter") else time.time()
+
+        latencies.append((end - start) * 1000.0)
+        for name, count in view.calls.items():
+            calls[name] = calls.get(name, 0) + count
+
+    return latencies, calls
+
+
+def run_matrix(lines_list, sels_list, repeat, seed, profile_dir=None, offscreen=False):
+    """
+    run_matrix() benchmarks every scroll_to and clear_to value for every buffer size and selection
+    count combination, printing one report row per command.
+    """
+
+    header = "{0:>8} {1:>7} {2:<28} {3:>8} {4:>8} {5:>8} {6:>8} {7:>8}"
+    row_fmt = "{0:>8} {1:>7} {2:<28} {3:>8.3f} {4:>8.3f} {5:>8.3f} {6:>8.3f} {7:>8.1f}"
+
+    names = ["lines", "sels", "command", "p50 ms", "p90 ms", "p99 ms", "max ms", "calls"]
+    names.extend(REPORTED_CALLS)
+    print((header + "".join(" {" + str(i) + ":>16}" for i in range(8, 8 + len(REPORTED_CALLS))))
+          .format(*names))
+
+    for num_lines in lines_list:
+
+        text = make_text(num_lines)
+
+        for num_sels in sels_list:
+
+            if num_sels > num_lines * MAX_SELS_PER_LINE:
+                continue
+
+            rng = random.Random(seed)
+            sublime.reset()
+            MultipleSelectionScroller.SelectionIndex.cache.clear()
+
+            settings = {}
+            if profile_dir:
+                settings["MultipleSelectionScroller.profile"] = "invocation"
+                settings["MultipleSelectionScroller.profile_dir"] = profile_dir
+            if offscreen:
+                settings["MultipleSelectionScroller.only_scroll_when_offscreen"] = True
+
+            MultipleSelectionScroller.ScrollerSettings.cache.clear()
+            view = sublime.View(text, settings=settings)
+            view.listeners.append(MultipleSelectionScroller.MultipleSelectionScrollerListener())
+            regions = make_selections(view, num_sels)
+            view.selection.set_regions_unchecked(regions)
+
+            commands = [("scroll_to", value) for value in SCROLL_TO_VALUES]
+            commands.extend(("clear_to", value) for value in CLEAR_TO_VALUES)
+
+            for arg_name, value in commands:
+
+                args = {arg_name: value}
+                args.update(EXTRA_ARGS.get(value, {}))
+
+                latencies, calls = bench_command(view, regions, args, repeat, rng)
+                latencies.sort()
+
+                label = "{0}: {1}".format(arg_name, value)
+                total_calls = sum(calls.values()) / float(repeat)
+                values = [num_lines, num_sels, label,
+                          percentile(latencies, 50), percentile(latencies, 90),
+                          percentile(latencies, 99), latencies[-1], total_calls]
+                values.extend(calls.get(name, 0) / float(repeat) for name in REPORTED_CALLS)
+
+                print((row_fmt + "".join(" {" + str(i) + ":>16.1f}"
+                                         for i in range(8, 8 + len(REPORTED_CALLS))))
+                      .format(*values))
+
+            # Scrolling also leaves the selections in place for the clear_to runs to restore.
+            view.selection.set_regions_unchecked(regions)
+
+            sys.stdout.flush()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark the multiple_selection_scroller "
+                                                 "command outside of Sublime Text.")
+    parser.add_argument("--quick", action="store_true", help="run a small matrix")
+    parser.add_argument("--lines", type=int, nargs="+", help="buffer sizes (lines)")
+    parser.add_argument("--sels", type=int, nargs="+", help="selection counts")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per command (default 50)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    parser.add_argument("--profile-dir", help="write a .pstats file per run to this directory")
+    parser.add_argument("--only-scroll-when-offscreen", action="store_true",
+                        help="turn the plugin's only_scroll_when_offscreen setting on")
+    args = parser.parse_args()
+
+    lines_list = args.lines or (QUICK_LINES if args.quick else FULL_LINES)
+    sels_list = args.sels or (QUICK_SELS if args.quick else FULL_SELS)
+
+    run_matrix(lines_list, sels_list, args.repeat, args.seed, args.profile_dir,
+               args.only_scroll_when_offscreen)
+
+
+if __name__ == "__main__":
+    main()
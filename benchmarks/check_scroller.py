@@ -0,0 +1,1002 @@
+#
+# Name:           check_scroller
+#
+# File:           benchmarks/check_scroller.py
+#
+# Requirements:   Python 2.7+ or 3.3+ (no Sublime Text needed)
+#
+# Purpose:        Differential check of the optimised multiple_selection_scroller command against
+#                 the preserved linear implementation in benchmarks/reference_scroller.py, and
+#                 against the expected behaviour of every op written out in
+#                 benchmarks/oracle_scroller.py, run against the stand-in 'sublime' module in this
+#                 directory. Random buffers, selection sets (several selections on a line, empty and
+#                 reversed regions, a single selection, selections placed exactly on the ends of the
+#                 middle line) and viewports (two in five on the last page, half of those
+#                 scrolled as far down as the buffer allows) are generated, and random commands are
+#                 run: every scroll_to and clear_to op, with the count, index, pattern, order, and
+#                 regions_key args. After every command the viewport position (the selection
+#                 scrolled to), the selections (the cursor left by clearing), and the last status
+#                 message (the selection index) must be the oracle's.
+#
+#                 The reference's ops are compared with the reference too, from the state the
+#                 optimised command left, where the implementations are meant to agree. Not when
+#                 the viewport is not filled with text: on the last page, where scroll_past_end
+#                 leaves the bottom of the viewport empty, the optimised middle line is the line
+#                 show_at_center() centers, not the line the reference counts down to (see
+#                 get_middle_line() in the plugin). Nor for a clear_to middle_sel with several
+#                 selections beginning on the middle line, the optimised command then keeps the one
+#                 nearest the horizontal center of the view rather than the first.
+#
+#                 The optimised command is checked along each of its lookup paths: with the
+#                 selection index built by the command (cold), cached from the previous command
+#                 (warm), built in the background (prebuilt), and navigating a region set of the
+#                 selections with the regions_key arg (regions). The navigation cursor is cleared
+#                 before each command in these modes. A longer sequence of commands is run without
+#                 clearing anything, mostly stepping, jumping, dropping, and going back, and some
+#                 navigating a region set of the initial selections (sequence). From the cursor it
+#                 deliberately visits every selection in turn rather than only those the middle
+#                 line search would find, stepping on is also checked on its own (cursor), and so
+#                 is the history of the scroll_to back op (back). The middle line and centering
+#                 predictions of the navigation core's Viewport are checked without the plugin,
+#                 against the stand-in's show_at_center() (viewport). The entries of the
+#                 multiple_selection_scroller_outline command are checked against ones found a
+#                 selection at a time (outline), on buffers with lines longer than its batch limit,
+#                 and on a single minified line of 300k characters.
+#
+#                 Finally the latency of each command is compared on large buffers, the check fails
+#                 if the optimised command is slower than the reference by more than the threshold.
+#
+# Usage:          python benchmarks/check_scroller.py                  (500 cases and the timings)
+#                 python benchmarks/check_scroller.py --cases 5000 --seed 7 --no-perf
+#                 python benchmarks/check_scroller.py --slowdown 1.1   (fail if 10% slower)
+#
+#                 The exit status is 1 if any check fails.
+#
+
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+# The stand-in 'sublime' and 'sublime_plugin' modules must be found before the plugin is imported.
+sys.path.insert(0, PACKAGE_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import sublime                      # noqa: E402 (the stand-in)
+import MultipleSelectionScroller    # noqa: E402
+import MultipleSelectionScrollerCore  # noqa: E402
+import reference_scroller           # noqa: E402 (after the plugin, see its header)
+import oracle_scroller              # noqa: E402
+import bench_scroller               # noqa: E402
+
+
+# The ops of the reference implementation.
+SCROLL_TO_VALUES = ["next_sel", "previous_sel", "first_sel", "last_sel"]
+CLEAR_TO_VALUES = ["first_sel", "last_sel", "middle_sel", "visible_area"]
+
+# The ops added since, which are only compared with the oracle.
+NEW_SCROLL_TO_VALUES = ["index", "back", "next_page_sel", "previous_page_sel", "drop_and_next",
+                        "drop_and_previous", "next_match", "previous_match"]
+NEW_CLEAR_TO_VALUES = ["visible_sels", "above_middle", "below_middle", "last_visited"]
+
+# The ops which can not be used with the regions_key arg.
+NO_REGIONS_VALUES = ["drop_and_next", "drop_and_previous", "next_match", "previous_match",
+                     "visible_sels", "above_middle", "below_middle"]
+
+# The ops which move the navigation cursor and use its history, often run by the sequence mode.
+CURSOR_VALUES = ["next_sel", "previous_sel", "index", "back", "back", "drop_and_next",
+                 "drop_and_previous"]
+
+# The ops which can be used with the count and order args.
+COUNT_VALUES = ["next_sel", "previous_sel", "next_match", "previous_match"]
+ORDER_VALUES = ["next_sel", "previous_sel", "first_sel", "last_sel", "index", "back"]
+
+ORDERS = ["column", "length", "text", "reverse"]
+
+# The buffers are lines of x characters, these patterns can only match in one place on a line,
+# whichever point a search starts from, and the last never matches.
+MATCH_PATTERNS = ["x\n", "xxxxx\n", "zz"]
+
+MODES = ["cold", "warm", "prebuilt", "regions", "sequence"]
+
+# The region key used by the regions and sequence modes.
+REGIONS_KEY = "check_scroller"
+
+STEPS_PER_CASE = 8
+SEQUENCE_STEPS_PER_CASE = 40
+
+# The buffer sizes and selection counts of the timings, and the runs of each command.
+PERF_MATRIX = [(20000, 2000), (200000, 100000)]
+PERF_REPEAT = 30
+
+# Latency differences below this (in ms) are noise, whatever the threshold.
+PERF_SLACK_MS = 0.05
+
+# The outline check's batch limit, low enough for its random buffers to have lines longer than it.
+OUTLINE_MAX_BATCH_CHARS = 2000
+
+STATUS_INDEX_RE = re.compile(r"scroll at (?:selection|region): (\d+) of (\d+)")
+
+timer = getattr(time, "perf_counter", time.time)
+
+
+class CheckFailure(Exception):
+    pass
+
+
+def make_view(text, visible_rows, settings, regions, viewport):
+    """
+    make_view() returns a stand-in View of the text with the regions selected and the viewport set.
+    """
+
+    view = sublime.View(text, visible_rows=visible_rows, settings=dict(settings))
+    view.listeners.append(MultipleSelectionScroller.MultipleSelectionScrollerListener())
+
+    for region in regions:
+        view.sel().add(sublime.Region(region.a, region.b))
+
+    view.viewport = viewport
+
+    return view
+
+
+def make_regions(rng, text, line_starts, shape):
+    """
+    make_regions() returns random, sorted, non overlapping regions of the text. The shape is one
+    of "one" (a single selection), "few", "many", or "dense" (many selections on few lines).
+    Regions may be empty or reversed.
+    """
+
+    text_len = len(text)
+
+    if shape == "one":
+        points = [rng.randint(0, text_len)]
+
+    elif shape == "dense":
+        points = []
+        for _ in range(rng.randint(1, 8)):
+            row = rng.randrange(len(line_starts))
+            line_begin = line_starts[row]
+            line_end = line_starts[row + 1] - 1 if row + 1 < len(line_starts) else text_len
+            points.extend(rng.randint(line_begin, line_end) for _ in range(rng.randint(1, 6)))
+
+    else:
+        num_points = rng.randint(2, 8) if shape == "few" else rng.randint(20, 400)
+        points = [rng.randint(0, text_len) for _ in range(num_points)]
+
+    points = sorted(set(points))
+    regions = []
+
+    for index, point in enumerate(points):
+
+        limit = points[index + 1] - 1 if index + 1 < len(points) else text_len
+        end = point if rng.random() < 0.5 else min(limit, point + rng.randint(1, 4))
+        end = max(end, point)
+
+        if rng.random() < 0.3:
+            regions.append(sublime.Region(end, point))
+        else:
+            regions.append(sublime.Region(point, end))
+
+    return regions
+
+
+def get_middle_line(view):
+    """
+    get_middle_line() returns the plugin's middle line of the view.
+    """
+
+    command = MultipleSelectionScroller.MultipleSelectionScrollerCommand(view)
+    command.middle_line = None
+    command.scroller_settings = MultipleSelectionScroller.ScrollerSettings.get(view)
+
+    return command.get_middle_line()
+
+
+def make_case(rng):
+    """
+    make_case() returns the random parameters of a case as a dict.
+    """
+
+    visible_rows = rng.choice([10, 11, 40])
+    num_lines = rng.randint(3 * visible_rows, 600)
+    lines = ["x" * rng.choice([0, 0, 1, 5, 30, 80]) for _ in range(num_lines)]
+    text = "\n".join(lines)
+
+    line_starts = [0]
+    for line in lines[:-1]:
+        line_starts.append(line_starts[-1] + len(line) + 1)
+
+    settings = {"scroll_past_end": rng.random() < 0.7}
+    if rng.random() < 0.2:
+        settings["MultipleSelectionScroller.scroll_cycling"] = False
+
+    regions = make_regions(rng, text, line_starts, rng.choice(["one", "few", "many", "dense"]))
+
+    # A viewport anywhere from the top to the last full page, or often on the last page, where
+    # selections below the middle line may not be able to be centered, and as often scrolled as
+    # far down as the buffer allows.
+    row_height = 20.0
+    if settings["scroll_past_end"]:
+        lowest_top = num_lines - 1
+    else:
+        lowest_top = num_lines - visible_rows
+    top_choice = rng.random()
+    if top_choice < 0.6:
+        top = rng.randint(0, max(0, num_lines - visible_rows - 2))
+    elif top_choice < 0.8:
+        top = rng.randint(num_lines - visible_rows - 2, lowest_top)
+    else:
+        top = lowest_top
+    viewport = (0.0, float(top) * row_height)
+
+    # Place selections exactly on the ends of the middle line, the edges of the lookups.
+    if rng.random() < 0.3:
+        view = make_view(text, visible_rows, settings, [], viewport)
+        middle_line = get_middle_line(view)
+        edges = [middle_line.begin(), middle_line.end(), middle_line.end() + 1]
+        points = set(region.begin() for region in regions)
+        for edge in edges:
+            if 0 <= edge <= len(text) and edge not in points and rng.random() < 0.7:
+                regions = [region for region in regions if not region.contains(edge)]
+                regions.append(sublime.Region(edge, edge))
+        regions.sort(key=lambda region: region.begin())
+
+    commands = [make_command(rng, len(regions)) for _ in range(STEPS_PER_CASE)]
+    sequence = [make_command(rng, len(regions), CURSOR_VALUES)
+                for _ in range(SEQUENCE_STEPS_PER_CASE)]
+
+    return {"text": text, "visible_rows": visible_rows, "settings": settings,
+            "regions": regions, "viewport": viewport, "commands": commands,
+            "sequence": sequence}
+
+
+def make_command(rng, sels_len, favoured_values=None):
+    """
+    make_command() returns the args of a random command: one of the reference's ops as often as
+    one of the ops added since, or half the time one of the favoured scroll_to ops if given,
+    sometimes with the count, order, or regions_key arg.
+    """
+
+    if favoured_values is not None and rng.random() < 0.5:
+        args = {"scroll_to": rng.choice(favoured_values)}
+        value = args["scroll_to"]
+    elif rng.random() < 0.2:
+        args = {"clear_to": rng.choice(rng.choice([CLEAR_TO_VALUES, NEW_CLEAR_TO_VALUES]))}
+        value = args["clear_to"]
+    else:
+        args = {"scroll_to": rng.choice(rng.choice([SCROLL_TO_VALUES, NEW_SCROLL_TO_VALUES]))}
+        value = args["scroll_to"]
+
+    if value == "index":
+        args["index"] = rng.choice([rng.randint(1, sels_len + 2), -rng.randint(1, sels_len + 2),
+                                    "{0}%".format(rng.randint(0, 100)), str(rng.randint(1, 3)),
+                                    0])
+
+    if value in ("next_match", "previous_match"):
+        args["pattern"] = rng.choice(MATCH_PATTERNS)
+
+    if value in COUNT_VALUES and rng.random() < 0.2:
+        args["count"] = rng.randint(2, 3)
+
+    if "scroll_to" in args and value in ORDER_VALUES and rng.random() < 0.15:
+        args["order"] = rng.choice(ORDERS)
+
+    # Only used by the sequence mode, the regions mode navigates the region set every time.
+    if value not in NO_REGIONS_VALUES and rng.random() < 0.3:
+        args["regions_key"] = REGIONS_KEY
+
+    return args
+
+
+def viewport_is_full(view):
+    """
+    viewport_is_full() returns true if the viewport of the view is filled with text (with a margin
+    of two lines), the reference's middle line is only correct then.
+    """
+
+    vertical_axis_index = 1
+    viewport_bottom = (view.viewport_position()[vertical_axis_index] +
+                       view.viewport_extent()[vertical_axis_index])
+
+    return viewport_bottom <= view.layout_extent()[vertical_axis_index] - 2 * view.line_height()
+
+
+def has_several_middle_line_sels(view):
+    """
+    has_several_middle_line_sels() returns true if more than one selection begins on the middle
+    line of the view.
+    """
+
+    middle_line = get_middle_line(view)
+    sel_begins = [region.begin() for region in view.sel()]
+
+    return sum(1 for sel_begin in sel_begins if middle_line.contains(sel_begin)) > 1
+
+
+def get_state(view):
+    """
+    get_state() returns what is compared after each command: the viewport position, the
+    selections, and the last status message.
+    """
+
+    regions = [(region.a, region.b) for region in view.sel()]
+
+    return (view.viewport_position(), regions, sublime.status_messages[-1:])
+
+
+def get_reference_state(state):
+    """
+    get_reference_state() returns the state as the reference would leave it, which names every
+    target a selection.
+    """
+
+    viewport, regions, messages = state
+    messages = [message.replace("at region:", "at selection:") for message in messages]
+
+    return (viewport, regions, messages)
+
+
+def is_reference_command(args, mode):
+    """
+    is_reference_command() returns true if the command is one the reference implements, in the
+    regions mode its region set is a copy of the selections, so it is navigated as they are.
+    """
+
+    arg_names = set(args) - set(["regions_key"] if mode == "regions" else [])
+
+    if arg_names == set(["scroll_to"]):
+        return args["scroll_to"] in SCROLL_TO_VALUES
+
+    # The regions mode navigates a region set, clearing the selections leaves a cursor at the
+    # region's begin, not at the selection's cursor.
+    if arg_names == set(["clear_to"]):
+        return args["clear_to"] in CLEAR_TO_VALUES and mode != "regions"
+
+    return False
+
+
+def prepare_optimised(view, mode):
+    """
+    prepare_optimised() readies the optimised command's lookup path of the mode before a command,
+    and returns the extra command args.
+    """
+
+    view_id = view.id()
+    selection_index = MultipleSelectionScroller.SelectionIndex.cache.get(view_id)
+
+    if mode == "warm":
+        if selection_index is not None:
+            selection_index.nav_cursor.sel_index = None
+
+    elif mode == "prebuilt":
+        MultipleSelectionScroller.SelectionIndex.invalidate(view_id)
+        MultipleSelectionScroller.SelectionIndexBuilder.schedule(view)
+        sublime.run_timeouts()
+
+    elif mode == "regions":
+        regions = [sublime.Region(region.a, region.b) for region in view.sel()]
+        MultipleSelectionScroller.RegionSetIndex.add_regions(view, REGIONS_KEY, regions)
+        return {"regions_key": REGIONS_KEY}
+
+    elif mode == "cold":
+        MultipleSelectionScroller.SelectionIndex.invalidate(view_id)
+
+    return {}
+
+
+def prepare_oracle(oracle, mode):
+    """
+    prepare_oracle() forgets what prepare_optimised() makes the optimised command forget.
+    """
+
+    if mode == "warm":
+        oracle.forget_cursor_selection()
+
+    elif mode == "prebuilt":
+        oracle.forget_selections()
+        oracle.index_selections()
+
+    elif mode == "regions":
+        oracle.forget_region_set(REGIONS_KEY)
+
+    elif mode == "cold":
+        oracle.forget_selections()
+
+
+def check_case(case, mode, seed):
+    """
+    check_case() runs the commands of the case on a view with the optimised command, raising
+    CheckFailure if the result of any differs from the oracle's, or from the reference's where the
+    two implementations are meant to agree. It returns the number of commands compared.
+
+    The sequence mode runs the longer sequence of the case on one view, nothing is cleared between
+    the commands, and some navigate a region set of the initial selections.
+    """
+
+    view_ref = make_view(case["text"], case["visible_rows"], case["settings"], case["regions"],
+                         case["viewport"])
+    view_opt = make_view(case["text"], case["visible_rows"], case["settings"], case["regions"],
+                         case["viewport"])
+
+    oracle = oracle_scroller.OracleScroller(case["text"], case["visible_rows"], case["settings"])
+
+    if mode == "sequence":
+        commands = case["sequence"]
+        regions = [sublime.Region(region.a, region.b) for region in case["regions"]]
+        MultipleSelectionScroller.RegionSetIndex.add_regions(view_opt, REGIONS_KEY, regions)
+    else:
+        commands = case["commands"]
+
+    num_compared = 0
+
+    for command_index, command in enumerate(commands):
+
+        args = dict(command)
+
+        if mode == "regions" and (args.get("scroll_to") or args.get("clear_to")) in \
+           NO_REGIONS_VALUES:
+            continue
+
+        if mode != "sequence":
+            args.pop("regions_key", None)
+
+        args.update(prepare_optimised(view_opt, mode))
+        prepare_oracle(oracle, mode)
+
+        # The reference's middle line is only correct when the viewport is filled with text, and
+        # its clear_to middle_sel keeps the first selection on the middle line, not the one nearest
+        # the horizontal center of the view. In the sequence mode the optimised command steps on
+        # from the navigation cursor, where the reference searches from the middle line.
+        use_reference = (mode != "sequence" and is_reference_command(args, mode) and
+                         viewport_is_full(view_opt) and
+                         not (args.get("clear_to") == "middle_sel" and
+                              has_several_middle_line_sels(view_opt)))
+
+        region_sets = {}
+        for key, regions in view_opt.region_sets.items():
+            region_sets[key] = [(region.begin(), region.end()) for region in regions]
+
+        viewport = view_opt.viewport
+        top, sels, message = oracle.run(viewport[1], [(region.a, region.b)
+                                                      for region in view_opt.sel()],
+                                        region_sets, args)
+        state_oracle = ((viewport[0], top), sels, [message] if message is not None else [])
+
+        # The reference starts from where the optimised command left the view.
+        if use_reference:
+            view_ref.viewport = viewport
+            view_ref.selection.set_regions_unchecked(
+                [sublime.Region(region.a, region.b) for region in view_opt.sel()])
+
+            del sublime.status_messages[:]
+            reference_args = dict((name, value) for name, value in args.items()
+                                  if name != "regions_key")
+            reference_scroller.MultipleSelectionScrollerCommand(view_ref).run(None,
+                                                                              **reference_args)
+            state_ref = get_state(view_ref)
+
+        del sublime.status_messages[:]
+        try:
+            MultipleSelectionScroller.MultipleSelectionScrollerCommand(view_opt).run(None, **args)
+            sublime.run_timeouts()
+        except Exception as error:
+            msg = "seed {0}, mode {1}, command {2} of {3}, {4}: {5!r}"
+            raise CheckFailure(msg.format(seed, mode, command_index + 1, len(commands), args,
+                                          error))
+        state_opt = get_state(view_opt)
+
+        if state_opt != state_oracle:
+            msg = ("seed {0}, mode {1}, command {2} of {3}, {4}\n"
+                   "    oracle:    {5}\n    optimised: {6}")
+            raise CheckFailure(msg.format(seed, mode, command_index + 1, len(commands), args,
+                                          state_oracle, state_opt))
+
+        if use_reference and state_ref != get_reference_state(state_opt):
+            msg = ("seed {0}, mode {1}, command {2} of {3}, {4}\n"
+                   "    reference: {5}\n    optimised: {6}")
+            raise CheckFailure(msg.format(seed, mode, command_index + 1, len(commands), args,
+                                          state_ref, get_reference_state(state_opt)))
+
+        num_compared += 1
+
+    return num_compared
+
+
+def get_status_index(default=None):
+    """
+    get_status_index() returns the selection number (from 1) of the last status message.
+    """
+
+    for message in reversed(sublime.status_messages):
+        match = STATUS_INDEX_RE.search(message)
+        if match:
+            return int(match.group(1))
+
+    return default
+
+
+def check_cursor(case, seed, rng):
+    """
+    check_cursor() checks stepping on from the navigation cursor: while the viewport is where the
+    last command left it next_sel/previous_sel move to the adjacent selection, cycling or stopping
+    at the first/last selection. Raises CheckFailure if not.
+    """
+
+    view = make_view(case["text"], case["visible_rows"], case["settings"], case["regions"],
+                     case["viewport"])
+    sels_len = len(view.sel())
+    cycling = case["settings"].get("MultipleSelectionScroller.scroll_cycling", True)
+
+    del sublime.status_messages[:]
+    MultipleSelectionScroller.MultipleSelectionScrollerCommand(view).run(None, scroll_to="next_sel")
+    sel_number = get_status_index()
+
+    if sel_number is None:
+        return
+
+    for _ in range(STEPS_PER_CASE):
+
+        step = rng.choice([1, -1])
+
+        if cycling:
+            expected = (sel_number - 1 + step) % sels_len + 1
+        else:
+            expected = max(1, min(sel_number + step, sels_len))
+
+        del sublime.status_messages[:]
+        value = "next_sel" if step == 1 else "previous_sel"
+        MultipleSelectionScroller.MultipleSelectionScrollerCommand(view).run(None, scroll_to=value)
+
+        # Without cycling nothing is done at the first/last selection, there is no message.
+        sel_number_after = get_status_index(sel_number)
+
+        if sel_number_after != expected:
+            msg = "seed {0}, mode cursor, {1} from selection {2} of {3}: expected {4}, got {5}"
+            raise CheckFailure(msg.format(seed, value, sel_number, sels_len, expected,
+                                          sel_number_after))
+
+        sel_number = sel_number_after
+
+
+def check_back(case, seed, rng):
+    """
+    check_back() checks the history of the scroll_to back op against a model of it: every
+    selection scrolled to by next_sel, previous_sel, or index (a jump, as made by the outline and
+    by the trailing edge of coalesced key repeats) is recorded, and back returns to the selections
+    in the reverse order they were left. Each case first runs the fixed sequences next_sel, index,
+    back and next_sel, next_sel, index, back. Raises CheckFailure if a command goes elsewhere.
+    """
+
+    view = make_view(case["text"], case["visible_rows"], case["settings"], case["regions"],
+                     case["viewport"])
+    sels_len = len(view.sel())
+    cycling = case["settings"].get("MultipleSelectionScroller.scroll_cycling", True)
+
+    commands = [("next_sel", None), ("index", 7), ("back", None),
+                ("next_sel", None), ("next_sel", None), ("index", 7), ("back", None)]
+
+    for _ in range(STEPS_PER_CASE):
+        value = rng.choice(["next_sel", "previous_sel", "index", "back", "back"])
+        commands.append((value, rng.randint(1, sels_len) if value == "index" else None))
+
+    # The model of the navigation cursor: the selection number last visited and the history.
+    sel_number = None
+    history = []
+
+    for command_index, (value, index_arg) in enumerate(commands):
+
+        if value == "back" and not history:
+            expected = None
+            going_back = True
+
+        elif value == "back":
+            expected = history.pop()
+            going_back = True
+
+        elif value == "index":
+            expected = min(index_arg, sels_len)
+            going_back = False
+
+        elif sel_number is None:
+            expected = "searched"
+            going_back = False
+
+        else:
+            step = 1 if value == "next_sel" else -1
+            if cycling:
+                expected = (sel_number - 1 + step) % sels_len + 1
+            else:
+                expected = max(1, min(sel_number + step, sels_len))
+            going_back = False
+
+        args = {"scroll_to": value}
+        if index_arg is not None:
+            args["index"] = index_arg
+
+        del sublime.status_messages[:]
+        MultipleSelectionScroller.MultipleSelectionScrollerCommand(view).run(None, **args)
+
+        # Without cycling nothing is done at the first/last selection, there is no message.
+        sel_number_after = get_status_index(sel_number)
+
+        # The first step searches from the middle line, the search is checked by check_case().
+        # Without cycling it may find no selection, then nothing is visited.
+        if expected == "searched":
+            expected = sel_number_after
+            if expected is None:
+                continue
+
+        if value == "back" and expected is None:
+            if not any("no previously visited" in message
+                       for message in sublime.status_messages):
+                msg = "seed {0}, mode back, command {1}: back with no history, got {2}"
+                raise CheckFailure(msg.format(seed, command_index + 1, sublime.status_messages))
+            continue
+
+        if sel_number_after != expected:
+            msg = "seed {0}, mode back, command {1}: {2} {3} from selection {4}: " \
+                  "expected {5}, got {6}"
+            raise CheckFailure(msg.format(seed, command_index + 1, value, index_arg or "",
+                                          sel_number, expected, sel_number_after))
+
+        if not going_back and sel_number is not None and sel_number != expected:
+            history.append(sel_number)
+
+        sel_number = expected
+
+
+def check_viewport(case, seed, rng):
+    """
+    check_viewport() checks the navigation core on its own, with a LineTable of the text and a
+    Viewport of the view in rows: its middle line must be the plugin's, and whether it predicts
+    that centering each selection moves the viewport must match what show_at_center() does to a
+    copy of the view. Raises CheckFailure if not.
+    """
+
+    view = make_view(case["text"], case["visible_rows"], case["settings"], case["regions"],
+                     case["viewport"])
+
+    line_table = MultipleSelectionScrollerCore.LineTable.from_text(case["text"])
+    sel_begins = [region.begin() for region in case["regions"]]
+    sel_ends = [region.end() for region in case["regions"]]
+    core = MultipleSelectionScrollerCore.NavigationCore(sel_begins, sel_ends, line_table)
+
+    vertical_axis_index = 1
+    line_height = view.line_height()
+    viewport_pos = view.viewport_position()[vertical_axis_index]
+
+    viewport = MultipleSelectionScrollerCore.Viewport(
+        top_row=viewport_pos / line_height, row_count=case["visible_rows"],
+        num_rows=line_table.get_num_rows(),
+        scroll_past_end=case["settings"]["scroll_past_end"])
+
+    middle_line = core.get_middle_line(viewport)
+    expected = get_middle_line(view)
+
+    if middle_line != (expected.begin(), expected.end()):
+        msg = "seed {0}, mode viewport, middle line: expected {1}, got {2}"
+        raise CheckFailure(msg.format(seed, expected, middle_line))
+
+    sel_indexes = list(range(len(sel_begins)))
+    rng.shuffle(sel_indexes)
+
+    for sel_index in sel_indexes[:STEPS_PER_CASE * 4]:
+
+        view.viewport = case["viewport"]
+        view.show_at_center(sel_begins[sel_index])
+        moved = view.viewport_position()[vertical_axis_index] - viewport_pos
+        expected = abs(moved) >= line_height / 2.0
+
+        if core.can_be_centered(sel_index, viewport) != expected:
+            msg = "seed {0}, mode viewport, can_be_centered selection {1} (row {2}): expected {3}"
+            raise CheckFailure(msg.format(seed, sel_index + 1,
+                                          line_table.get_row(sel_begins[sel_index]), expected))
+
+
+def get_outline_items(view):
+    """
+    get_outline_items() runs the multiple_selection_scroller_outline command on the view and returns
+    the entries of the quick panel it shows.
+    """
+
+    MultipleSelectionScroller.MultipleSelectionScrollerOutlineCommand(view).run(None)
+    sublime.run_timeouts()
+
+    quick_panels = view.window().quick_panels
+
+    return quick_panels[-1][0] if quick_panels else None
+
+
+def get_expected_outline_items(view):
+    """
+    get_expected_outline_items() returns the outline entries of the view's selections, found one
+    selection at a time: "row: line preview", or on a line longer than the batch limit (which is
+    not fetched whole) "row: preview from the selection".
+    """
+
+    outline_command = MultipleSelectionScroller.MultipleSelectionScrollerOutlineCommand
+    max_preview_len = outline_command.MAX_PREVIEW_LEN
+    items = []
+
+    for sel in view.sel():
+
+        line = view.line(sel.begin())
+
+        if line.size() > outline_command.MAX_BATCH_CHARS:
+            preview_end = min(sel.begin() + max_preview_len, line.end())
+            preview = view.substr(sublime.Region(sel.begin(), preview_end)).strip()
+        else:
+            preview = view.substr(line).strip()[:max_preview_len]
+
+        items.append("{0}: {1}".format(view.rowcol(sel.begin())[0] + 1, preview))
+
+    return items
+
+
+def check_outline(case, seed, rng):
+    """
+    check_outline() checks the outline entries of the case's selections on a copy of its buffer in
+    which some lines are longer than the batch limit, as the lines of minified files are. Raises
+    CheckFailure if an entry is wrong or the outline is not built.
+    """
+
+    lines = case["text"].split("\n")
+
+    for _ in range(rng.randint(0, 4)):
+        row = rng.randrange(len(lines))
+        lines[row] = " ".join("w{0}".format(index) for index in range(rng.randint(400, 1500)))
+
+    text = "\n".join(lines)
+
+    line_starts = [0]
+    for line in lines[:-1]:
+        line_starts.append(line_starts[-1] + len(line) + 1)
+
+    regions = make_regions(rng, text, line_starts, rng.choice(["one", "few", "many", "dense"]))
+    view = make_view(text, case["visible_rows"], case["settings"], regions, case["viewport"])
+
+    try:
+        items = get_outline_items(view)
+    except Exception as error:
+        raise CheckFailure("seed {0}, mode outline: {1!r}".format(seed, error))
+
+    expected = get_expected_outline_items(view)
+
+    if items != expected:
+        if items is None:
+            raise CheckFailure("seed {0}, mode outline: no outline shown".format(seed))
+        for index, (item, expected_item) in enumerate(zip(items, expected)):
+            if item != expected_item:
+                break
+        msg = "seed {0}, mode outline, selection {1}: expected {2!r}, got {3!r}"
+        raise CheckFailure(msg.format(seed, index + 1, expected[index:index + 1],
+                                      items[index:index + 1]))
+
+
+def check_outline_minified():
+    """
+    check_outline_minified() checks the outline of a selection far along a single line of 300k
+    characters, with the plugin's own batch limit. Raises CheckFailure if the entry is wrong.
+    """
+
+    text = "header\n" + "x" * 5000 + "target();" + "y" * 300000 + "\nfooter"
+    view = make_view(text, 40, {}, [sublime.Region(7 + 5000, 7 + 5000)], (0.0, 0.0))
+
+    try:
+        items = get_outline_items(view)
+    except Exception as error:
+        raise CheckFailure("mode outline, minified line: {0!r}".format(error))
+
+    expected = ["2: target();" + "y" * 111]
+
+    if items != expected:
+        msg = "mode outline, minified line: expected {0!r}, got {1!r}"
+        raise CheckFailure(msg.format(expected, items))
+
+
+def run_checks(num_cases, seed):
+    """
+    run_checks() checks num_cases random cases in every mode, printing a summary line per mode and
+    the details of each failure. It returns the number of failures.
+    """
+
+    builder_min_selections = MultipleSelectionScroller.SelectionIndexBuilder.MIN_NUM_SELECTIONS
+
+    num_failures = 0
+
+    outline_command = MultipleSelectionScroller.MultipleSelectionScrollerOutlineCommand
+    max_batch_chars = outline_command.MAX_BATCH_CHARS
+
+    for mode in MODES + ["cursor", "back", "viewport", "outline"]:
+
+        # Every snapshot may be built in the background.
+        MultipleSelectionScroller.SelectionIndexBuilder.MIN_NUM_SELECTIONS = (
+            1 if mode == "prebuilt" else builder_min_selections)
+
+        num_compared = 0
+        mode_failures = 0
+
+        # The full size minified line first, then lines longer than a lower batch limit.
+        if mode == "outline":
+            sublime.reset()
+            MultipleSelectionScroller.SelectionIndex.cache.clear()
+            try:
+                check_outline_minified()
+            except CheckFailure as failure:
+                mode_failures += 1
+                print("FAIL " + str(failure))
+            outline_command.MAX_BATCH_CHARS = OUTLINE_MAX_BATCH_CHARS
+
+        for case_index in range(num_cases):
+
+            case_seed = seed * 1000003 + case_index
+            rng = random.Random(case_seed)
+            case = make_case(rng)
+
+            sublime.reset()
+            MultipleSelectionScroller.SelectionIndex.cache.clear()
+            MultipleSelectionScroller.RegionSetIndex.cache.clear()
+            MultipleSelectionScroller.ScrollerSettings.cache.clear()
+
+            try:
+                if mode == "cursor":
+                    check_cursor(case, case_seed, rng)
+                elif mode == "back":
+                    check_back(case, case_seed, rng)
+                elif mode == "viewport":
+                    check_viewport(case, case_seed, rng)
+                elif mode == "outline":
+                    check_outline(case, case_seed, rng)
+                else:
+                    num_compared += check_case(case, mode, case_seed)
+
+            except CheckFailure as failure:
+                mode_failures += 1
+                if mode_failures <= 5:
+                    print("FAIL " + str(failure))
+
+        if mode in ("cursor", "back", "viewport", "outline"):
+            print("{0:<10} {1} cases, {2} failures".format(mode, num_cases, mode_failures))
+        else:
+            print("{0:<10} {1} cases, {2} commands compared, {3} failures".format(
+                mode, num_cases, num_compared, mode_failures))
+
+        num_failures += mode_failures
+        sys.stdout.flush()
+
+    MultipleSelectionScroller.SelectionIndexBuilder.MIN_NUM_SELECTIONS = builder_min_selections
+    outline_command.MAX_BATCH_CHARS = max_batch_chars
+
+    return num_failures
+
+
+def time_command(command_class, view, regions, args, viewports):
+    """
+    time_command() runs the command once per viewport, restoring the selections (untimed) before
+    each clear_to run, and returns the median latency in ms.
+    """
+
+    latencies = []
+
+    for viewport in viewports:
+
+        if "clear_to" in args:
+            view.selection.set_regions_unchecked(regions)
+
+        view.viewport = viewport
+
+        start = timer()
+        command_class(view).run(None, **args)
+        latencies.append((timer() - start) * 1000.0)
+
+    latencies.sort()
+
+    return latencies[len(latencies) // 2]
+
+
+def check_performance(slowdown, seed):
+    """
+    check_performance() compares the median latency of each command of each implementation on
+    large buffers, the optimised command being run with its index cached (as when a key is pressed
+    repeatedly). It prints a report and returns the number of commands slower than the reference
+    by more than the slowdown factor.
+    """
+
+    print("")
+    print("{0:>8} {1:>7} {2:<24} {3:>12} {4:>12} {5:>8}".format(
+        "lines", "sels", "command", "reference ms", "optimised ms", "ratio"))
+
+    num_failures = 0
+
+    for num_lines, num_sels in PERF_MATRIX:
+
+        rng = random.Random(seed)
+        text = bench_scroller.make_text(num_lines)
+
+        sublime.reset()
+        MultipleSelectionScroller.SelectionIndex.cache.clear()
+        MultipleSelectionScroller.ScrollerSettings.cache.clear()
+
+        view_ref = sublime.View(text)
+        view_opt = sublime.View(text)
+        view_opt.listeners.append(MultipleSelectionScroller.MultipleSelectionScrollerListener())
+
+        regions = bench_scroller.make_selections(view_ref, num_sels)
+        view_ref.selection.set_regions_unchecked(regions)
+        view_opt.selection.set_regions_unchecked(regions)
+
+        # Viewports filled with text, where the reference's middle line is correct.
+        max_top = max(view_ref.layout_extent()[1] - view_ref.viewport_extent()[1] -
+                      2 * view_ref.line_height(), 0.0)
+        viewports = [(0.0, float(int(rng.uniform(0.0, max_top)))) for _ in range(PERF_REPEAT)]
+
+        commands = [("scroll_to", value) for value in SCROLL_TO_VALUES]
+        commands.extend(("clear_to", value) for value in CLEAR_TO_VALUES)
+
+        for arg_name, value in commands:
+
+            args = {arg_name: value}
+
+            latency_ref = time_command(reference_scroller.MultipleSelectionScrollerCommand,
+                                       view_ref, regions, args, viewports)
+
+            # One untimed run caches the optimised command's selection index.
+            view_opt.selection.set_regions_unchecked(regions)
+            MultipleSelectionScroller.MultipleSelectionScrollerCommand(view_opt).run(None, **args)
+
+            latency_opt = time_command(MultipleSelectionScroller.MultipleSelectionScrollerCommand,
+                                       view_opt, regions, args, viewports)
+
+            ratio = latency_opt / latency_ref if latency_ref > 0.0 else 0.0
+            too_slow = latency_opt > latency_ref * slowdown + PERF_SLACK_MS
+
+            label = "{0}: {1}".format(arg_name, value)
+            print("{0:>8} {1:>7} {2:<24} {3:>12.3f} {4:>12.3f} {5:>8.2f}{6}".format(
+                num_lines, num_sels, label, latency_ref, latency_opt, ratio,
+                "  SLOWER" if too_slow else ""))
+
+            if too_slow:
+                num_failures += 1
+
+            # The selections are restored for the next command.
+            view_ref.selection.set_regions_unchecked(regions)
+            view_opt.selection.set_regions_unchecked(regions)
+
+        sys.stdout.flush()
+
+    return num_failures
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Check the optimised multiple_selection_scroller "
+                                                 "command against the reference implementation.")
+    parser.add_argument("--cases", type=int, default=500, help="random cases (default 500)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default 0)")
+    parser.add_argument("--slowdown", type=float, default=1.25,
+                        help="fail if the optimised command's median latency is more than this "
+                             "times the reference's (default 1.25, allowing for timing noise)")
+    parser.add_argument("--no-perf", action="store_true", help="skip the timings")
+    args = parser.parse_args()
+
+    num_failures = run_checks(args.cases, args.seed)
+
+    if not args.no_perf:
+        num_failures += check_performance(args.slowdown, args.seed)
+
+    print("")
+    print("{0} failures".format(num_failures))
+
+    sys.exit(1 if num_failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+#
+# Name:           oracle_scroller
+#
+# File:           benchmarks/oracle_scroller.py
+#
+# Requirements:   Python 2.6+ or 3.3+ (no Sublime Text needed)
+#
+# Purpose:        The expected behaviour of every op of the multiple_selection_scroller command,
+#                 written out plainly for benchmarks/check_scroller.py to compare the plugin
+#                 against where the preserved reference implementation can not be used: the ops and
+#                 args added since it (count, index, back, the page ops, drop, match, regions_key,
+#                 and order), stepping on from the navigation cursor, and the last page of the
+#                 buffer, where the reference's middle line is not the line show_at_center()
+#                 centers.
+#
+#                 The oracle knows nothing of the plugin's snapshots, binary searches, or the
+#                 navigation core. It scans lists of (begin, end) offsets linearly, and works out
+#                 the viewport from the geometry of the stand-in 'sublime' module's View: rows of
+#                 a fixed height, no word wrap, show_at_center() placing a row in the vertical
+#                 center of the viewport clamped to the top of the buffer and to the lowest
+#                 position, which is the last row at the top of the viewport with scroll_past_end
+#                 or at the bottom without it.
+#
+#                 It is given the state of the view before each command (the vertical viewport
+#                 position, the selections, and the region sets) and returns the state expected
+#                 after it. What the plugin remembers between commands the oracle remembers too:
+#                 the selection last visited in each target (the selections or a region set) and
+#                 the history of those visited before, whether the selections have been indexed
+#                 since they last changed (the scroll_to index op does not index them, so only
+#                 records its visit if they were), and the match last scrolled to.
+#
+# Usage:          oracle = OracleScroller(text, visible_rows, settings)
+#                 top, sels, message = oracle.run(top, sels, region_sets, {"scroll_to": "next_sel"})
+#
+
+
+import bisect
+import re
+
+
+MESSAGE_PREFIX = "multiple_selection_scroller - "
+
+# The number of visited selections the history keeps, the earliest are forgotten beyond it.
+MAX_HISTORY = 100
+
+# The scroll_to ops which step through the selections in a navigation order.
+ORDERED_OPS = ["next_sel", "previous_sel", "first_sel", "last_sel", "index", "back"]
+
+
+class Cursor(object):
+    """
+    Cursor is the selection last visited in a target, the viewport positions from before and after
+    centering it, and the selections visited before it.
+    """
+
+    def __init__(self):
+        self.sel_index = None
+        self.viewport_before = None
+        self.viewport_after = None
+        self.history = []
+
+
+class OracleScroller(object):
+    """
+    OracleScroller runs the commands of one view, see the header.
+    """
+
+    def __init__(self, text, visible_rows, settings, row_height=20.0, em_width=8.0,
+                 visible_cols=120):
+
+        self.text = text
+        self.line_starts = [0] + [match.end() for match in re.finditer("\n", text)]
+        self.num_rows = len(self.line_starts)
+
+        self.row_height = float(row_height)
+        self.viewport_height = visible_rows * self.row_height
+        self.viewport_width = visible_cols * float(em_width)
+        self.em_width = float(em_width)
+
+        self.scroll_past_end = settings.get("scroll_past_end", True)
+        self.scroll_cycling = settings.get("MultipleSelectionScroller.scroll_cycling", True)
+
+        # The cursors, keyed by the regions key, None for the selections.
+        self.cursors = {}
+        self.sels_indexed = False
+
+        self.match_pattern = None
+        self.match_cursor = None
+        self.match_viewport = None
+
+    # The harness clears parts of the plugin's state between commands, these do the same here.
+
+    def forget_selections(self):
+        """The selections' snapshot is discarded (the plugin's SelectionIndex.invalidate())."""
+        self.sels_indexed = False
+        self.cursors.pop(None, None)
+
+    def index_selections(self):
+        """The selections are indexed, with a cursor which has not visited any yet."""
+        if not self.sels_indexed:
+            self.sels_indexed = True
+            self.cursors[None] = Cursor()
+
+    def forget_cursor_selection(self):
+        """The selections' cursor forgets the selection last visited, keeping its history."""
+        cursor = self.cursors.get(None)
+        if cursor is not None:
+            cursor.sel_index = None
+
+    def forget_region_set(self, key):
+        """The region set is added again, its cursor is discarded."""
+        self.cursors.pop(key, None)
+
+    # The geometry of the view.
+
+    def get_row(self, point):
+        return bisect.bisect_right(self.line_starts, point) - 1
+
+    def get_line(self, row):
+        row = max(0, min(row, self.num_rows - 1))
+        if row + 1 < self.num_rows:
+            return (self.line_starts[row], self.line_starts[row + 1] - 1)
+        return (self.line_starts[row], len(self.text))
+
+    def get_lowest_top(self):
+        layout_height = self.num_rows * self.row_height
+        if self.scroll_past_end:
+            return max(0.0, layout_height - self.row_height)
+        return max(0.0, layout_height - self.viewport_height)
+
+    def get_centered_top(self, point):
+        top = (self.get_row(point) * self.row_height + self.row_height / 2.0 -
+               self.viewport_height / 2.0)
+        return max(0.0, min(top, self.get_lowest_top()))
+
+    def get_middle_row(self):
+        middle_row = int((self.top + self.viewport_height / 2.0) // self.row_height)
+        return min(middle_row, self.num_rows - 1)
+
+    def get_middle_line(self):
+        return self.get_line(self.get_middle_row())
+
+    def get_center_point(self):
+        line_begin, line_end = self.get_middle_line()
+        return min(line_begin + int((self.viewport_width / 2.0) // self.em_width), line_end)
+
+    def get_visible_region(self):
+        last_row = self.num_rows - 1
+        first_row = min(int(self.top // self.row_height), last_row)
+        end_row = min(int((self.top + self.viewport_height - 0.001) // self.row_height), last_row)
+        return (self.get_line(first_row)[0], self.get_line(end_row)[1])
+
+    # The commands.
+
+    def run(self, top, sels, region_sets, args):
+        """
+        run() runs the command with the args on a view with the viewport top (a vertical position),
+        the selections sels (a list of (a, b) tuples in document order), and the region sets
+        region_sets (a dict of lists of (begin, end) tuples in document order). It returns the
+        expected viewport top, selections, and last status message (None if there is none).
+        """
+
+        self.top = top
+        self.sels = list(sels)
+        self.message = None
+
+        self.regions_key = args.get("regions_key")
+        self.order = args.get("order", "document")
+        self.count = args.get("count", 1)
+
+        if self.regions_key is None:
+            self.targets = [(min(a, b), max(a, b)) for a, b in self.sels]
+            self.target_name = "selection"
+        else:
+            self.targets = sorted(region_sets.get(self.regions_key, []))
+            self.target_name = "region"
+
+        scroll_to = args.get("scroll_to")
+        clear_to = args.get("clear_to")
+
+        # The ops which index the selections, the scroll_to index op and the clear_to first_sel,
+        # last_sel, and visible_area ops access them without.
+        if self.regions_key is not None:
+            self.cursor = self.cursors.setdefault(self.regions_key, Cursor())
+        else:
+            if scroll_to is not None:
+                indexes = (scroll_to not in ("index", "next_match", "previous_match") or
+                           (scroll_to == "index" and self.order != "document"))
+            else:
+                indexes = clear_to not in ("first_sel", "last_sel", "visible_area")
+            if indexes:
+                self.index_selections()
+            self.cursor = self.cursors.get(None) if self.sels_indexed else None
+
+        self.set_order()
+
+        if scroll_to is not None:
+            self.run_scroll_to(scroll_to, args)
+        else:
+            self.run_clear_to(clear_to)
+
+        return (self.top, self.sels, self.message)
+
+    def set_order(self):
+        """set_order() sets the permutation of the target indexes in the order, and its ranks."""
+        num_targets = len(self.targets)
+        indexes = list(range(num_targets))
+
+        if self.order == "column":
+            keys = [begin - self.line_starts[self.get_row(begin)] for begin, _ in self.targets]
+        elif self.order == "length":
+            keys = [begin - end for begin, end in self.targets]
+        elif self.order == "text":
+            keys = [self.text[begin:end] for begin, end in self.targets]
+        else:
+            keys = indexes
+
+        # Equal keys keep document order.
+        self.permutation = sorted(indexes, key=lambda index: (keys[index], index))
+        if self.order == "reverse":
+            self.permutation.reverse()
+
+        self.ranks = [0] * num_targets
+        for rank, index in enumerate(self.permutation):
+            self.ranks[index] = rank
+
+    def run_scroll_to(self, scroll_to, args):
+
+        num_targets = len(self.targets)
+
+        if scroll_to in ("next_sel", "previous_sel"):
+            self.scroll_step(scroll_to == "next_sel")
+
+        elif scroll_to == "first_sel":
+            self.visit(self.permutation[0])
+
+        elif scroll_to == "last_sel":
+            self.visit(self.permutation[num_targets - 1])
+
+        elif scroll_to == "index":
+            rank = self.get_index_rank(args.get("index"))
+            if rank is None:
+                self.message = "multiple_selection_scroller: invalid index arg: {0}".format(
+                    str(args.get("index")))
+            else:
+                self.visit(self.permutation[rank])
+
+        elif scroll_to == "back":
+            if not self.cursor.history:
+                self.message = MESSAGE_PREFIX + "no previously visited selection to go back to"
+            else:
+                self.visit(self.cursor.history.pop(), going_back=True)
+
+        elif scroll_to == "next_page_sel":
+            visible_end = self.get_visible_region()[1]
+            below = [index for index, (begin, _) in enumerate(self.targets)
+                     if begin > visible_end]
+            if below:
+                self.visit(below[0])
+            elif self.scroll_cycling:
+                self.visit(0)
+
+        elif scroll_to == "previous_page_sel":
+            visible_begin = self.get_visible_region()[0]
+            above = [index for index, (_, end) in enumerate(self.targets) if end < visible_begin]
+            if above:
+                self.visit(above[-1])
+            elif self.scroll_cycling:
+                self.visit(num_targets - 1)
+
+        elif scroll_to in ("drop_and_next", "drop_and_previous"):
+            self.drop_and_scroll(scroll_to == "drop_and_next")
+
+        elif scroll_to in ("next_match", "previous_match"):
+            self.scroll_to_match(args["pattern"], scroll_to == "next_match")
+
+    def get_stepped(self, index, step, length):
+        if self.scroll_cycling:
+            return (index + step) % length
+        return max(0, min(index + step, length - 1))
+
+    def can_be_centered(self, index):
+        """can_be_centered() is true if centering the target moves the viewport (by half a row)."""
+        cursor = self.cursor
+        if cursor.sel_index == index and cursor.viewport_before == self.top:
+            return False
+        centered_top = self.get_centered_top(self.targets[index][0])
+        return abs(centered_top - self.top) >= self.row_height / 2.0
+
+    def scroll_step(self, forwards):
+        """
+        scroll_step() is the next_sel/previous_sel op: count targets on in the order, or from the
+        cursor while the viewport is where it left it, or else from the middle line, skipping to
+        the first/last target (cycling) if the one found would not move the viewport.
+        """
+
+        num_targets = len(self.targets)
+        step = self.count if forwards else -self.count
+        cursor = self.cursor
+
+        if self.order != "document":
+            if cursor.sel_index is None:
+                rank = -1 if forwards else num_targets
+            else:
+                rank = self.ranks[cursor.sel_index]
+                if not self.scroll_cycling and rank == (num_targets - 1 if forwards else 0):
+                    return
+            self.visit(self.permutation[self.get_stepped(rank, step, num_targets)])
+            return
+
+        if cursor.sel_index is not None and cursor.viewport_after == self.top:
+            edge = num_targets - 1 if forwards else 0
+            if not self.scroll_cycling and cursor.sel_index == edge:
+                return
+            self.visit(self.get_stepped(cursor.sel_index, step, num_targets))
+            return
+
+        line_begin, line_end = self.get_middle_line()
+
+        if forwards:
+            below = [index for index, (begin, _) in enumerate(self.targets) if begin > line_end]
+            found = below[0] if below else None
+            if not self.scroll_cycling:
+                if found is not None:
+                    self.visit(min(found + self.count - 1, num_targets - 1))
+                return
+            if found is None or not self.can_be_centered(found):
+                found = num_targets
+            self.visit((found + self.count - 1) % num_targets)
+
+        else:
+            above = [index for index, (_, end) in enumerate(self.targets) if end < line_begin]
+            found = above[-1] if above else None
+            if not self.scroll_cycling:
+                if found is not None:
+                    self.visit(max(found - self.count + 1, 0))
+                return
+            if found is None or not self.can_be_centered(found):
+                found = -1
+            self.visit((found - self.count + 1) % num_targets)
+
+    def get_index_rank(self, index_arg):
+        """get_index_rank() returns the rank given by the index arg (N, -N, or N%), or None."""
+        num_targets = len(self.targets)
+        index_arg = str(index_arg).strip()
+
+        if index_arg.endswith("%"):
+            try:
+                percentage = max(0.0, min(float(index_arg[:-1]), 100.0))
+            except ValueError:
+                return None
+            return int(round((num_targets - 1) * percentage / 100.0))
+
+        try:
+            number = int(index_arg)
+        except ValueError:
+            return None
+
+        if number > 0:
+            return min(number, num_targets) - 1
+        if number < 0:
+            return max(num_targets + number, 0)
+        return None
+
+    def get_nearest(self):
+        """
+        get_nearest() returns the index of the target nearest the middle line: of those beginning
+        on it the nearest the horizontal center (the first if two are as near), otherwise the nearer
+        by rows of the last above and the first below it (the one above if they are as near).
+        """
+
+        line_begin, line_end = self.get_middle_line()
+        on_line = [index for index, (begin, _) in enumerate(self.targets)
+                   if line_begin <= begin <= line_end]
+
+        if on_line:
+            center_point = self.get_center_point()
+            return min(on_line, key=lambda index: (abs(self.targets[index][0] - center_point),
+                                                   index))
+
+        above = [index for index, (begin, _) in enumerate(self.targets) if begin < line_begin]
+        below = [index for index, (begin, _) in enumerate(self.targets) if begin > line_end]
+
+        if not above:
+            return below[0]
+        if not below:
+            return above[-1]
+
+        middle_row = self.get_middle_row()
+        rows_above = middle_row - self.get_row(self.targets[above[-1]][0])
+        rows_below = self.get_row(self.targets[below[0]][0]) - middle_row
+
+        return above[-1] if rows_above <= rows_below else below[0]
+
+    def drop_and_scroll(self, forwards):
+        """
+        drop_and_scroll() drops the selection nearest the middle line and visits the one which
+        followed (or preceded) it, the history then refers to the selections' new indexes.
+        """
+
+        if len(self.targets) < 2:
+            self.visit(0)
+            return
+
+        dropped = self.get_nearest()
+
+        del self.sels[dropped]
+        del self.targets[dropped]
+
+        cursor = self.cursor
+        cursor.history = [index if index < dropped else index - 1
+                          for index in cursor.history if index != dropped]
+        cursor.sel_index = None
+        cursor.viewport_before = None
+        cursor.viewport_after = None
+
+        self.set_order()
+        self.visit(self.get_stepped(dropped, 0 if forwards else -1, len(self.targets)))
+
+    def scroll_to_match(self, pattern, forwards):
+        """
+        scroll_to_match() steps count matches of the pattern on from the match last scrolled to
+        while the viewport is where it left it, or else from the middle line, and makes the match
+        the only selection.
+        """
+
+        if pattern != self.match_pattern:
+            self.match_pattern = pattern
+            self.match_cursor = None
+
+        matches = [(found.start(), found.end()) for found in re.finditer(pattern, self.text)]
+
+        if self.match_cursor is not None and self.match_viewport == self.top:
+            match = self.match_cursor
+        else:
+            line_begin, line_end = self.get_middle_line()
+            match = (line_end, line_end) if forwards else (line_begin, line_begin)
+
+        found = False
+
+        for _ in range(self.count):
+
+            if forwards:
+                point = match[1] + 1 if match[0] == match[1] else match[1]
+                candidates = [each for each in matches if each[0] >= point]
+                if not candidates and self.scroll_cycling:
+                    candidates = matches
+                next_match = candidates[0] if candidates else None
+            else:
+                candidates = [each for each in matches if each[0] < match[0] and
+                              each[1] <= match[0]]
+                if not candidates and self.scroll_cycling:
+                    candidates = matches
+                next_match = candidates[-1] if candidates else None
+
+            if next_match is None:
+                break
+
+            match = next_match
+            found = True
+
+        if not found:
+            if self.scroll_cycling:
+                self.message = MESSAGE_PREFIX + "no match of: {0}".format(pattern)
+            else:
+                self.message = MESSAGE_PREFIX + "no match {0} of: {1}".format(
+                    "below" if forwards else "above", pattern)
+            return
+
+        self.sels = [match]
+        self.forget_selections()
+
+        self.top = self.get_centered_top(match[0])
+        self.match_cursor = match
+        self.match_viewport = self.top
+
+        self.message = MESSAGE_PREFIX + "scroll at match on line number: {0}".format(
+            self.get_row(match[0]) + 1)
+
+    def visit(self, index, going_back=False):
+        """
+        visit() centers the target, records the visit in the cursor (if there is one), and sets the
+        message.
+        """
+
+        viewport_before = self.top
+        self.top = self.get_centered_top(self.targets[index][0])
+
+        cursor = self.cursor
+
+        if cursor is not None:
+            if not going_back and cursor.sel_index is not None and cursor.sel_index != index:
+                cursor.history.append(cursor.sel_index)
+                del cursor.history[:-MAX_HISTORY]
+            cursor.sel_index = index
+            cursor.viewport_before = viewport_before
+            cursor.viewport_after = self.top
+
+        self.message = MESSAGE_PREFIX + "scroll at {0}: {1} of {2}".format(
+            self.target_name, self.ranks[index] + 1, len(self.targets))
+
+        if self.order != "document":
+            self.message += " ({0} order)".format(self.order)
+
+    def run_clear_to(self, clear_to):
+
+        num_targets = len(self.targets)
+
+        if clear_to == "first_sel":
+            self.clear_to_index(0)
+
+        elif clear_to == "last_sel":
+            self.clear_to_index(num_targets - 1)
+
+        elif clear_to == "middle_sel":
+            self.clear_to_index(self.get_nearest())
+
+        elif clear_to == "last_visited":
+            if self.cursor.sel_index is not None:
+                self.clear_to_index(self.cursor.sel_index)
+            else:
+                self.clear_to_index(self.get_nearest())
+
+        elif clear_to == "visible_area":
+            line_begin, line_end = self.get_middle_line()
+            self.sels = [(line_end, line_end)]
+            self.forget_selections()
+            self.message = MESSAGE_PREFIX + "cleared at visible area, line number: {0}".format(
+                self.get_row(line_begin) + 1)
+
+        elif clear_to == "visible_sels":
+            visible_begin, visible_end = self.get_visible_region()
+            self.clear_to_kept([end >= visible_begin and begin <= visible_end
+                                for begin, end in self.targets], "in visible region")
+
+        elif clear_to == "above_middle":
+            line_end = self.get_middle_line()[1]
+            self.clear_to_kept([begin <= line_end for begin, _ in self.targets],
+                               "on/above middle line")
+
+        elif clear_to == "below_middle":
+            line_begin = self.get_middle_line()[0]
+            self.clear_to_kept([end >= line_begin for _, end in self.targets],
+                               "on/below middle line")
+
+    def clear_to_index(self, index):
+        """clear_to_index() leaves a cursor at the selection (or the region's begin)."""
+        if self.regions_key is None:
+            point = self.sels[index][1]
+        else:
+            point = self.targets[index][0]
+
+        self.sels = [(point, point)]
+        self.forget_selections()
+        self.top = self.get_centered_top(point)
+
+        self.message = MESSAGE_PREFIX + "cleared at {0}: {1} of {2}".format(
+            self.target_name, index + 1, len(self.targets))
+
+    def clear_to_kept(self, kept, range_name):
+        """clear_to_kept() keeps the selections flagged in kept, unless that is none of them."""
+        num_kept = sum(1 for each in kept if each)
+
+        if num_kept == 0:
+            self.message = MESSAGE_PREFIX + "no selections {0}, none cleared".format(range_name)
+            return
+
+        if num_kept < len(self.sels):
+            self.sels = [sel for sel, keep in zip(self.sels, kept) if keep]
+            self.forget_selections()
+
+        self.message = MESSAGE_PREFIX + "kept {0} of {1} selections, {2}".format(
+            num_kept, len(kept), range_name)
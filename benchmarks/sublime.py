@@ -0,0 +1,569 @@
+#
+# Name:           sublime (stand-in)
+#
+# File:           benchmarks/sublime.py
+#
+# Requirements:   Python 2.6+ or 3.3+ (no Sublime Text needed)
+#
+# Purpose:        A minimal, headless stand-in for the Sublime Text 'sublime' module. It provides
+#                 just enough of the Region, Selection, Settings, View, and Window classes, and of
+#                 the module functions, to drive MultipleSelectionScroller outside of the editor.
+#
+#                 The View models a buffer of fixed height lines with a viewport measured in pixels,
+#                 show_at_center() moves the viewport the way Sublime Text does (clamped to the top
+#                 of the buffer and to the end of the buffer). Every API method call is counted in
+#                 View.calls so that benchmarks can report the number of round trips made.
+#
+
+
+import bisect
+import re
+
+
+# Flags and constants used by the plugin.
+
+LITERAL                    = 1
+IGNORECASE                 = 2
+
+DRAW_EMPTY                 = 1
+HIDE_ON_MINIMAP            = 2
+DRAW_EMPTY_AS_OVERWRITE    = 4
+DRAW_NO_FILL               = 32
+DRAW_NO_OUTLINE            = 256
+DRAW_SOLID_UNDERLINE       = 512
+DRAW_STIPPLED_UNDERLINE    = 1024
+DRAW_SQUIGGLY_UNDERLINE    = 2048
+PERSISTENT                 = 16
+HIDDEN                     = 128
+
+MONOSPACE_FONT             = 1
+KEEP_OPEN_ON_FOCUS_LOST    = 2
+
+
+# Module state which benchmarks can inspect or reset.
+
+status_messages = []
+pending_timeouts = []
+current_time = [0.0]
+
+
+def version():
+    return "3211"
+
+
+def platform():
+    return "linux"
+
+
+def status_message(msg):
+    status_messages.append(msg)
+
+
+def set_timeout(callback, delay=0):
+    pending_timeouts.append((current_time[0] + delay / 1000.0, callback))
+
+
+def set_timeout_async(callback, delay=0):
+    set_timeout(callback, delay)
+
+
+def run_timeouts(until=None):
+    """
+    run_timeouts() runs the callbacks queued with set_timeout() in time order. If until is given
+    only the callbacks due at or before that time (in seconds) are run and the clock is advanced to
+    it, otherwise all callbacks are run (including any queued by the callbacks themselves).
+    """
+
+    while pending_timeouts:
+        pending_timeouts.sort(key=lambda item: item[0])
+        due, callback = pending_timeouts[0]
+        if until is not None and due > until:
+            break
+        pending_timeouts.pop(0)
+        current_time[0] = max(current_time[0], due)
+        callback()
+
+    if until is not None:
+        current_time[0] = max(current_time[0], until)
+
+
+def reset():
+    del status_messages[:]
+    del pending_timeouts[:]
+    current_time[0] = 0.0
+    _settings_files.clear()
+
+
+_active_window = [None]
+_settings_files = {}
+
+
+def active_window():
+    return _active_window[0]
+
+
+def load_settings(base_name):
+    if base_name not in _settings_files:
+        _settings_files[base_name] = Settings()
+    return _settings_files[base_name]
+
+
+class Region(object):
+
+    __slots__ = ("a", "b", "xpos")
+
+    def __init__(self, a, b=None, xpos=-1):
+        if b is None:
+            b = a
+        self.a = a
+        self.b = b
+        self.xpos = xpos
+
+    def __repr__(self):
+        return "(" + str(self.a) + ", " + str(self.b) + ")"
+
+    def __len__(self):
+        return self.size()
+
+    def __eq__(self, rhs):
+        return isinstance(rhs, Region) and self.a == rhs.a and self.b == rhs.b
+
+    def __ne__(self, rhs):
+        return not self.__eq__(rhs)
+
+    def __hash__(self):
+        return hash((self.a, self.b))
+
+    def begin(self):
+        return self.a if self.a < self.b else self.b
+
+    def end(self):
+        return self.b if self.a < self.b else self.a
+
+    def size(self):
+        return abs(self.a - self.b)
+
+    def empty(self):
+        return self.a == self.b
+
+    def cover(self, rhs):
+        a = min(self.begin(), rhs.begin())
+        b = max(self.end(), rhs.end())
+        if self.a < self.b:
+            return Region(a, b)
+        return Region(b, a)
+
+    def intersects(self, rhs):
+        lb = self.begin()
+        le = self.end()
+        rb = rhs.begin()
+        re_ = rhs.end()
+        return ((lb == rb and le == re_) or
+                (rb > lb and rb < le) or (re_ > lb and re_ < le) or
+                (lb > rb and lb < re_) or (le > rb and le < re_))
+
+    def contains(self, x):
+        if isinstance(x, Region):
+            return x.begin() >= self.begin() and x.end() <= self.end()
+        return x >= self.begin() and x <= self.end()
+
+
+class Selection(object):
+    """
+    Selection keeps its regions sorted and merges any which overlap, as Sublime Text does. Each
+    indexed access is counted as an API call against the owning view.
+    """
+
+    def __init__(self, view):
+        self.view = view
+        self.regions = []
+
+    def _modified(self):
+        self.view._selection_modified()
+
+    def __len__(self):
+        self.view._count("sel.__len__")
+        return len(self.regions)
+
+    def __getitem__(self, index):
+        self.view._count("sel.__getitem__")
+        return Region(self.regions[index].a, self.regions[index].b)
+
+    def __iter__(self):
+        # Sublime Text 3 iterates through __getitem__(), one host call per region.
+        for index in range(len(self.regions)):
+            yield self[index]
+
+    def clear(self):
+        self.view._count("sel.clear")
+        self.regions = []
+        self._modified()
+
+    def _insert(self, region):
+        # Merge with any overlapping neighbours, then insert keeping the list sorted.
+        begin = region.begin()
+        end = region.end()
+        begins = [r.begin() for r in self.regions]
+        index = bisect.bisect_left(begins, begin)
+        lo = index
+        while lo > 0 and self.regions[lo - 1].end() >= begin and (
+                self.regions[lo - 1].end() > begin or region.empty() or
+                self.regions[lo - 1].empty()):
+            lo -= 1
+        hi = index
+        while hi < len(self.regions) and self.regions[hi].begin() <= end and (
+                self.regions[hi].begin() < end or region.empty() or
+                self.regions[hi].empty()):
+            hi += 1
+        if lo == hi:
+            self.regions.insert(index, region)
+            return
+        merged = region
+        for other in self.regions[lo:hi]:
+            merged = merged.cover(other)
+        self.regions[lo:hi] = [merged]
+
+    def _bisect_begins(self, point):
+        lo = 0
+        hi = len(self.regions)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.regions[mid].begin() < point:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def add(self, x):
+        self.view._count("sel.add")
+        if not isinstance(x, Region):
+            x = Region(x)
+        self._insert(Region(x.a, x.b))
+        self._modified()
+
+    def add_all(self, regions):
+        self.view._count("sel.add_all")
+        regions = [Region(r.a, r.b) if isinstance(r, Region) else Region(r) for r in regions]
+        if not self.regions and all(
+                regions[i].end() < regions[i + 1].begin() for i in range(len(regions) - 1)):
+            self.regions = regions
+        else:
+            for region in regions:
+                self._insert(region)
+        self._modified()
+
+    def set_regions_unchecked(self, regions):
+        """Benchmark helper: install already sorted, non overlapping regions in one step."""
+        self.regions = list(regions)
+        self._modified()
+
+    def subtract(self, region):
+        # A binary search of the regions, as Sublime Text's own, not a scan of them.
+        self.view._count("sel.subtract")
+        index = self._bisect_begins(region.begin())
+        for i in (index, index - 1):
+            if 0 <= i < len(self.regions) and self.regions[i] == region:
+                del self.regions[i]
+                break
+            if 0 <= i < len(self.regions) and region.contains(self.regions[i]):
+                del self.regions[i]
+                break
+        self._modified()
+
+    def contains(self, region):
+        return any(r.contains(region) for r in self.regions)
+
+
+class Settings(object):
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.callbacks = {}
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+    def has(self, name):
+        return name in self.values
+
+    def set(self, name, value):
+        self.values[name] = value
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def erase(self, name):
+        self.values.pop(name, None)
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def add_on_change(self, tag, callback):
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        self.callbacks.pop(tag, None)
+
+
+class Window(object):
+
+    _next_id = [1]
+
+    def __init__(self):
+        self.window_id = Window._next_id[0]
+        Window._next_id[0] += 1
+        self.views = []
+        self.input_panels = []
+        self.quick_panels = []
+        self.panel_views = {}
+        self.project = None
+        _active_window[0] = self
+
+    def id(self):
+        return self.window_id
+
+    def active_view(self):
+        return self.views[-1] if self.views else None
+
+    def project_data(self):
+        return self.project
+
+    def show_input_panel(self, caption, initial_text, on_done, on_change, on_cancel):
+        self.input_panels.append((caption, initial_text, on_done, on_change, on_cancel))
+
+    def show_quick_panel(self, items, on_select, flags=0, selected_index=-1, on_highlight=None):
+        self.quick_panels.append((items, on_select, flags, selected_index, on_highlight))
+
+    def run_command(self, cmd, args=None):
+        pass
+
+
+class View(object):
+    """
+    View models a buffer of text in a viewport. Every line is line_height pixels high and every
+    character is em_width pixels wide, the viewport shows visible_rows rows. show_at_center() places
+    the given point's line in the vertical middle of the viewport, clamped so that the viewport can
+    not scroll above the top of the buffer, nor further below the end than the 'scroll_past_end'
+    setting allows.
+    """
+
+    _next_id = [1]
+
+    def __init__(self, text, visible_rows=40, line_height=20.0, em_width=8.0, visible_cols=120,
+                 settings=None, window=None):
+        self.view_id = View._next_id[0]
+        View._next_id[0] += 1
+        self.text = text
+        self.line_starts = [0]
+        index = text.find("\n")
+        while index != -1:
+            self.line_starts.append(index + 1)
+            index = text.find("\n", index + 1)
+        self.row_height = float(line_height)
+        self.em = float(em_width)
+        self.visible_rows = visible_rows
+        self.visible_cols = visible_cols
+        self.viewport = (0.0, 0.0)
+        self.selection = Selection(self)
+        self.view_settings = Settings(settings)
+        self.changes = 0
+        self.region_sets = {}
+        self.calls = {}
+        self.listeners = []
+        self.attached_window = window or Window()
+        self.attached_window.views.append(self)
+
+    # Benchmark helpers.
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def reset_calls(self):
+        self.calls = {}
+
+    def _notify(self, event):
+        # The sync hook is called at once, the async hook is queued like the worker thread's.
+        for listener in self.listeners:
+            if hasattr(listener, event):
+                getattr(listener, event)(self)
+            if hasattr(listener, event + "_async"):
+                hook = getattr(listener, event + "_async")
+                set_timeout_async(lambda hook=hook: hook(self))
+
+    def _selection_modified(self):
+        self._notify("on_selection_modified")
+
+    def modify(self):
+        """Benchmark helper: simulate an edit to the buffer (bumps change_count)."""
+        self.changes += 1
+        self._notify("on_modified")
+
+    def _row(self, pt):
+        return bisect.bisect_right(self.line_starts, pt) - 1
+
+    def _line_end(self, row):
+        if row + 1 < len(self.line_starts):
+            return self.line_starts[row + 1] - 1
+        return len(self.text)
+
+    def _max_top(self):
+        layout_height = len(self.line_starts) * self.row_height
+        viewport_height = self.visible_rows * self.row_height
+        if self.view_settings.get("scroll_past_end", True):
+            # The last line may be scrolled up as far as the top of the viewport.
+            limit = layout_height - self.row_height
+        else:
+            limit = layout_height - viewport_height
+        return max(0.0, limit)
+
+    # API.
+
+    def id(self):
+        self._count("id")
+        return self.view_id
+
+    def buffer_id(self):
+        return self.view_id
+
+    def window(self):
+        return self.attached_window
+
+    def settings(self):
+        self._count("settings")
+        return self.view_settings
+
+    def change_count(self):
+        self._count("change_count")
+        return self.changes
+
+    def size(self):
+        self._count("size")
+        return len(self.text)
+
+    def sel(self):
+        self._count("sel")
+        return self.selection
+
+    def substr(self, x):
+        self._count("substr")
+        if isinstance(x, Region):
+            return self.text[x.begin():x.end()]
+        return self.text[x:x + 1]
+
+    def rowcol(self, pt):
+        self._count("rowcol")
+        row = self._row(pt)
+        return (row, pt - self.line_starts[row])
+
+    def text_point(self, row, col):
+        self._count("text_point")
+        row = max(0, min(row, len(self.line_starts) - 1))
+        return min(self.line_starts[row] + col, len(self.text))
+
+    def line(self, x):
+        self._count("line")
+        if isinstance(x, Region):
+            begin_row = self._row(x.begin())
+            end_row = self._row(x.end())
+            return Region(self.line_starts[begin_row], self._line_end(end_row))
+        row = self._row(x)
+        return Region(self.line_starts[row], self._line_end(row))
+
+    def lines(self, region):
+        self._count("lines")
+        first_row = self._row(region.begin())
+        last_row = self._row(region.end())
+        return [Region(self.line_starts[row], self._line_end(row))
+                for row in range(first_row, last_row + 1)]
+
+    def visible_region(self):
+        self._count("visible_region")
+        top = self.viewport[1]
+        bottom = top + self.visible_rows * self.row_height
+        last_row = len(self.line_starts) - 1
+        first_row = min(int(top // self.row_height), last_row)
+        end_row = min(int((bottom - 0.001) // self.row_height), last_row)
+        return Region(self.line_starts[first_row], self._line_end(end_row))
+
+    def viewport_position(self):
+        self._count("viewport_position")
+        return self.viewport
+
+    def set_viewport_position(self, xy, animate=True):
+        self._count("set_viewport_position")
+        self.viewport = (float(xy[0]), max(0.0, min(float(xy[1]), self._max_top())))
+
+    def viewport_extent(self):
+        self._count("viewport_extent")
+        return (self.visible_cols * self.em, self.visible_rows * self.row_height)
+
+    def layout_extent(self):
+        self._count("layout_extent")
+        return (self.visible_cols * self.em, len(self.line_starts) * self.row_height)
+
+    def line_height(self):
+        self._count("line_height")
+        return self.row_height
+
+    def em_width(self):
+        self._count("em_width")
+        return self.em
+
+    def layout_to_text(self, xy):
+        self._count("layout_to_text")
+        row = max(0, min(int(xy[1] // self.row_height), len(self.line_starts) - 1))
+        col = max(0, int(xy[0] // self.em))
+        return min(self.line_starts[row] + col, self._line_end(row))
+
+    def text_to_layout(self, pt):
+        self._count("text_to_layout")
+        row = self._row(pt)
+        return ((pt - self.line_starts[row]) * self.em, row * self.row_height)
+
+    def show_at_center(self, x):
+        self._count("show_at_center")
+        pt = x.begin() if isinstance(x, Region) else x
+        row = self._row(pt)
+        viewport_height = self.visible_rows * self.row_height
+        top = row * self.row_height + self.row_height / 2.0 - viewport_height / 2.0
+        self.viewport = (self.viewport[0], max(0.0, min(top, self._max_top())))
+
+    def find(self, pattern, start_pt, flags=0):
+        self._count("find")
+        if flags & LITERAL:
+            pattern = re.escape(pattern)
+        regex = re.compile(pattern, re.IGNORECASE if flags & IGNORECASE else 0)
+        match = regex.search(self.text, start_pt)
+        if match is None:
+            return Region(-1, -1)
+        return Region(match.start(), match.end())
+
+    def find_all(self, pattern, flags=0):
+        self._count("find_all")
+        if flags & LITERAL:
+            pattern = re.escape(pattern)
+        regex = re.compile(pattern, re.IGNORECASE if flags & IGNORECASE else 0)
+        return [Region(m.start(), m.end()) for m in regex.finditer(self.text)]
+
+    def add_regions(self, key, regions, scope="", icon="", flags=0):
+        self._count("add_regions")
+        self.region_sets[key] = sorted([Region(r.a, r.b) for r in regions],
+                                       key=lambda r: (r.begin(), r.end()))
+
+    def get_regions(self, key):
+        self._count("get_regions")
+        return [Region(r.a, r.b) for r in self.region_sets.get(key, [])]
+
+    def erase_regions(self, key):
+        self._count("erase_regions")
+        self.region_sets.pop(key, None)
+
+    def run_command(self, cmd, args=None):
+        self._count("run_command")
+        for command in _text_commands:
+            if command.name() == cmd:
+                command(self).run(None, **(args or {}))
+                return
+
+
+# Command classes registered by sublime_plugin, used by View.run_command().
+
+_text_commands = []
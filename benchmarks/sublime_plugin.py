@@ -0,0 +1,57 @@
+#
+# Name:           sublime_plugin (stand-in)
+#
+# File:           benchmarks/sublime_plugin.py
+#
+# Purpose:        A minimal, headless stand-in for the Sublime Text 'sublime_plugin' module. See
+#                 benchmarks/sublime.py for the rest of the stand-in API.
+#
+
+
+import re
+
+import sublime
+
+
+def _command_name(cls):
+    name = cls.__name__
+    if name.endswith("Command"):
+        name = name[:-len("Command")]
+    return re.sub(r"(?<!^)([A-Z])", r"_\1", name).lower()
+
+
+class _CommandMeta(type):
+
+    def __init__(cls, name, bases, attrs):
+        super(_CommandMeta, cls).__init__(name, bases, attrs)
+        if name not in ("Command", "TextCommand", "WindowCommand", "ApplicationCommand"):
+            if issubclass(cls, TextCommand):
+                sublime._text_commands.append(cls)
+
+
+Command = _CommandMeta("Command", (object,), {
+    "name": classmethod(lambda cls: _command_name(cls)),
+    "is_enabled": lambda self, *args, **kwargs: True,
+    "is_visible": lambda self, *args, **kwargs: True,
+    "description": lambda self, *args, **kwargs: None,
+})
+
+
+class TextCommand(Command):
+
+    def __init__(self, view):
+        self.view = view
+
+
+class WindowCommand(Command):
+
+    def __init__(self, window):
+        self.window = window
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class EventListener(object):
+    pass